@@ -1,13 +1,17 @@
-from fastapi import Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from core.db import SessionLocal
-from core.security.jwt import decode_access_token
+from core.config import get_settings
+from core.db import SessionLocal, AsyncSessionLocal
 from core.security.oauth import oauth2_scheme
-from repository.user_repo import UserRepo
+from core.security.token_cache import token_cache
+from repository.cache import CachedAsyncUserRepo
 from models.user import User
 
+settings = get_settings()
 
-def get_db():
+
+def get_sync_db():
     """
     This function manages the database session lifecycle. It creates a session for interaction
     with the database and ensures that the session is closed once the operations are completed.
@@ -22,13 +26,34 @@ def get_db():
         db.close()
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+async def get_async_db():
+    """
+    Same lifecycle as `get_sync_db`, but yields an AsyncSession bound to the async engine.
+    Used when `DATABASE_ASYNC` is enabled.
+
+    Yields:
+        db: The async database session.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if settings.DATABASE_ASYNC else get_sync_db
+
+
+async def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
 ) -> User:
     """
     Retrieves the current user based on the provided OAuth2 token.
 
+    The token verified by the middleware (request.state.token_entry) is reused, and
+    the user resolved for it stays in the token cache until the token expires.
+
     Args:
+        request (Request): The current request, carrying the verified token entry.
         token (str): The OAuth2 access token, retrieved from the Authorization header.
         db (Session): The current database session, provided by dependency injection.
 
@@ -38,21 +63,65 @@ def get_current_user(
     Raises:
         HTTPException: If the token is invalid, or if the user is not found.
     """
-    payload = decode_access_token(token)
+    entry = getattr(request.state, "token_entry", None) or token_cache.verify(token)
 
-    if not payload or "sub" not in payload:
+    if not entry or "sub" not in entry.claims:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
 
-    user_email = str(payload["sub"])
+    user = token_cache.cached_user(entry)
+    if user is not None:
+        return user
+
+    user_email = str(entry.claims["sub"])
 
-    userrepo = UserRepo(db)
-    user = userrepo.get_user_by_email(user_email)
+    userrepo = CachedAsyncUserRepo(db)
+    user = await userrepo.get_user_by_email(user_email)
 
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
         )
 
+    token_cache.remember_user(entry, user)
+
     return user
+
+
+def batch_ids(ids: List[int]) -> List[int]:
+    """
+    The distinct ids of a batch get, in their order.
+
+    Raises:
+        HTTPException: 422 past BATCH_GET_MAX_IDS ids.
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > settings.BATCH_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.BATCH_GET_MAX_IDS} ids",
+        )
+    return ids
+
+
+def get_batch_ids(
+    ids: Optional[str] = Query(
+        None, description="Comma separated ids of a batch get, e.g. `ids=1,2,3`"
+    ),
+) -> Optional[List[int]]:
+    """
+    The `ids` query parameter of a batch get, None when it isn't given.
+
+    Raises:
+        HTTPException: 422 if an id isn't an integer, see batch_ids.
+    """
+    if ids is None:
+        return None
+    try:
+        return batch_ids([int(value) for value in ids.split(",")])
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="ids must be comma separated integers",
+        )
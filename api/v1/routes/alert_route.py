@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends
+from schemas.alert import AlertResponse
+from services.alert_service import AsyncAlertService
+from api.v1.dependencies import get_db, get_current_user
+from models.user import User
+from sqlalchemy.orm import Session
+
+alert_route = APIRouter()
+
+
+def get_alert_service(db: Session = Depends(get_db)):
+    """
+    get the alert services
+
+    This function returns the alert services from services.
+    """
+    return AsyncAlertService(db)
+
+
+@alert_route.get("/alert", response_model=list[AlertResponse])
+async def get_alerts(
+    current_user: User = Depends(get_current_user),
+    alert_service: AsyncAlertService = Depends(get_alert_service),
+):
+    """
+    List the expiry alerts.
+
+    This endpoint retrieves the alerts of the authenticated user's products that
+    are close to expiring, written by the periodic expiry scan.
+
+    Parameters:
+    - current_user (User): The authenticated user.
+    - alert_service (AlertService): Dependency that provides the alert service instance.
+
+    Responses:
+    - 200 OK: A list of alerts in the `AlertResponse` format, soonest first.
+    - 401 Unauthorized: If the token is invalid.
+
+    Example usage:
+    - Request: GET /alert
+    - Response: List of alerts.
+    """
+    return await alert_service.list_alerts(current_user.id)
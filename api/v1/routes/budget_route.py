@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends
+from schemas.budget import BudgetPlanRequest, BudgetPlanResponse
+from services.budget_service import BudgetService
+from api.v1.dependencies import get_db, get_current_user
+from models.user import User
+from sqlalchemy.orm import Session
+
+budget_route = APIRouter()
+
+
+def get_budget_service(db: Session = Depends(get_db)):
+    """
+    get the budget services
+
+    This function returns the budget services from services.
+    """
+    return BudgetService(db)
+
+
+@budget_route.post("/budget/plan", response_model=BudgetPlanResponse)
+async def plan_budget(
+    body: BudgetPlanRequest,
+    current_user: User = Depends(get_current_user),
+    budget_service: BudgetService = Depends(get_budget_service),
+):
+    """
+    Plan what a budget can buy.
+
+    This endpoint picks the best affordable subset of the authenticated user's products.
+
+    Parameters:
+    - body (BudgetPlanRequest): The budget, the mode and optional priorities by product id (default 1).
+      - greedy: cheapest first, buys as many products as possible.
+      - priority: highest priority per price first.
+      - exact: knapsack maximizing the sum of priorities. Very large lists x budgets are solved
+        in coarser price units, then `optimal` is false.
+    - current_user (User): The authenticated user.
+    - budget_service (BudgetService): Dependency that provides the budget service instance.
+
+    Responses:
+    - 200 OK: The plan in the `BudgetPlanResponse` format, with the products bought and left out.
+    - 401 Unauthorized: If the token is invalid.
+
+    Example usage:
+    - Request: POST /budget/plan with JSON body { "budget": 150.0, "mode": "exact", "priorities": {"3": 2.0} }
+    - Response: The chosen products, the total spent and the remaining budget.
+    """
+    return await budget_service.plan(current_user.id, body)
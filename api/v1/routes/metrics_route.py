@@ -0,0 +1,69 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from core.db import pool_stats
+from core.http_cache import etag_cache
+from core.idempotency import idempotency_store
+from core.metrics import registry, render_requests, render_stats
+from core.ratelimit import rate_limiter
+from core.security.hashing import hashing_stats
+from core.security.token_cache import token_cache
+from repository.cache import cache_stats
+
+metrics_route = APIRouter()
+
+
+@metrics_route.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Metrics in the Prometheus text format.
+
+    This endpoint renders the request latency histograms, the in-flight gauges
+    and the queries per request recorded by the metrics middleware, with the
+    hashing pool, token cache, read-through cache, ETag cache, rate limiter,
+    idempotency store and connection pool counters. Every worker process has its own
+    counters, scrape each one.
+
+    Responses:
+    - 200 OK: The metrics, `text/plain; version=0.0.4`.
+
+    Example usage:
+    - Request: GET /metrics
+    - Response: `keeper_http_request_duration_seconds_bucket{route="/product",method="GET",status="200",le="0.005"} 12`
+    """
+    lines = render_requests(registry)
+    lines += render_stats(
+        "keeper_hashing",
+        [({}, hashing_stats())],
+        counters=("calls", "rejected"),
+    )
+    lines += render_stats(
+        "keeper_token_cache", [({}, token_cache.stats())], counters=("hits", "misses")
+    )
+    lines += render_stats(
+        "keeper_cache",
+        [({"table": table}, stats) for table, stats in cache_stats().items()],
+        counters=("hits", "shared_hits", "misses", "coalesced", "invalidations"),
+    )
+    lines += render_stats(
+        "keeper_etag",
+        [({}, etag_cache.stats())],
+        counters=("hits", "misses", "not_modified"),
+    )
+    lines += render_stats(
+        "keeper_rate_limit",
+        [({}, rate_limiter.stats())],
+        counters=("allowed", "rejected", "evictions"),
+    )
+    lines += render_stats(
+        "keeper_idempotency",
+        [({}, idempotency_store.stats())],
+        counters=("replays",),
+    )
+    lines += render_stats(
+        "keeper_db_pool",
+        [({"engine": kind}, stats) for kind, stats in pool_stats().items()],
+        counters=("checkouts", "timeouts"),
+    )
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4"
+    )
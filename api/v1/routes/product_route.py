@@ -1,9 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
-from schemas.product import ProductResponse, ProductCreate, ProductUpdate
-from services.product_service import ProductService
-from api.v1.dependencies import get_db, get_current_user
+from typing import Literal, Optional
+from datetime import date
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from core.config import get_settings
+from core.http_cache import etag_cache
+from core.idempotency import (
+    IdempotencyKeyReused,
+    idempotency_store,
+    request_fingerprint,
+)
+from schemas.product import (
+    BatchGet,
+    ProductBatch,
+    ProductBulkResult,
+    ProductResponse,
+    ProductCreate,
+    ProductFilters,
+    ProductUpdate,
+    ProductList,
+    ProductPage,
+    ProductSearchList,
+    ProductSearchPage,
+)
+from repository.product_repo import ProductExists
+from services.product_service import AsyncProductService
+from api.v1.dependencies import batch_ids, get_batch_ids, get_db, get_current_user
 from sqlalchemy.orm import Session
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from core.db import open_session
+from models.user import User
+from utils.bulk import (
+    EXPORT_MEDIA_TYPES,
+    InvalidImportBody,
+    UnsupportedImportFormat,
+    iter_records,
+)
+from utils.pagination import InvalidCursor
+from utils.serialization import dump_list, page_response
+
+settings = get_settings()
 
 product_route = APIRouter()
 
@@ -14,116 +48,414 @@ def get_product_service(db: Session = Depends(get_db)):
 
     This function returns all product services from services.
     """
-    return ProductService(db)
+    return AsyncProductService(db)
 
 
-@product_route.get("/product", response_model=list[ProductResponse])
-async def get_products(product_service: ProductService = Depends(get_product_service)):
+def get_product_filters(
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    expire_after: Optional[date] = None,
+    expire_before: Optional[date] = None,
+    name_prefix: Optional[str] = Query(None, min_length=1, max_length=50),
+):
+    """
+    get the product listing filters
+
+    Each filter is its own query parameter, gathered into ProductFilters.
+    """
+    return ProductFilters(
+        min_price=min_price,
+        max_price=max_price,
+        expire_after=expire_after,
+        expire_before=expire_before,
+        name_prefix=name_prefix,
+    )
+
+
+@product_route.get("/product", response_model=ProductPage)
+async def get_products(
+    request: Request,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    order_by: Literal["id", "date_expire", "price", "name"] = "id",
+    filters: ProductFilters = Depends(get_product_filters),
+    ids: Optional[list[int]] = Depends(get_batch_ids),
+    current_user: User = Depends(get_current_user),
+    product_service: AsyncProductService = Depends(get_product_service),
+):
     """
-    List all product.
+    List the user's products.
 
-    This endpoint retrieves a list of all product from the system.
+    This endpoint retrieves a page of the authenticated user's products using keyset pagination, optionally filtered by a price range, an expiry date range and a name prefix. The filters and the pages are read through the `(fk_user, <sort key>)` indexes and cached per user until one of the user's products changes. The response has a strong `ETag`: sent back in `If-None-Match` while the user's products are unchanged, it's answered 304 Not Modified without reading them. With `ids` it returns those products instead, in the order of `ids`, fetched with one `IN` query (see `POST /product/batch-get`).
 
     Parameters:
+    - limit (int): The page size, up to `PAGE_SIZE_MAX`.
+    - cursor (str): The `next_cursor` or `prev_cursor` of a previous page.
+    - order_by (str): Sort by `id`, `date_expire`, `price` or `name`.
+    - min_price, max_price (float): The price range, both inclusive.
+    - expire_after, expire_before (date): The expiry date range, both inclusive.
+    - name_prefix (str): The start of the product name, case-insensitive.
+    - ids (str): Comma separated product ids, up to `BATCH_GET_MAX_IDS`; the other parameters are ignored and the ids the user doesn't have are left out.
+    - current_user (User): The authenticated user.
     - product_service (ProductService): Dependency that provides the product service instance used to fetch product.
 
     Responses:
-    - 200 OK: A list of product in the `ProductResponse` format.
-    - 400 Bad Request: If no product are found, a `400` status is returned with the message "Any product!".
+    - 200 OK: A page of products in the `ProductPage` format, with its `ETag` and `Cache-Control` (`CACHE_CONTROL_PRODUCTS`).
+    - 304 Not Modified: If `If-None-Match` names the current `ETag`.
+    - 400 Bad Request: If the cursor is invalid.
+    - 401 Unauthorized: If the token is invalid.
+
+    Example usage:
+    - Request: GET /product?limit=20&order_by=date_expire
+    - Request: GET /product?limit=20&order_by=date_expire&cursor={next_cursor}
+    - Request: GET /product?order_by=price&min_price=5&max_price=20&name_prefix=mil
+    - Request: GET /product?ids=12,7,31
+    - Request: GET /product with `If-None-Match: {etag}`
+    - Response: Page of products, with empty `items` when there are none.
+    """
+
+    async def build():
+        if ids is not None:
+            products, _ = await product_service.get_user_products(current_user.id, ids)
+            return page_response(ProductList, products)
+
+        try:
+            products, next_cursor, prev_cursor = (
+                await product_service.list_product_page(
+                    current_user.id, limit, cursor, order_by, filters
+                )
+            )
+        except InvalidCursor as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        return page_response(ProductList, products, next_cursor, prev_cursor)
+
+    version = await product_service.products_version(current_user.id)
+    return await etag_cache.respond(
+        request,
+        ("products", current_user.id, version, limit, cursor, order_by, filters, ids),
+        build,
+        settings.CACHE_CONTROL_PRODUCTS,
+        vary="Authorization",
+    )
+
+
+@product_route.get("/product/export", response_class=StreamingResponse)
+async def export_products(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Export the user's products.
+
+    This endpoint streams every product of the authenticated user as NDJSON or CSV. The rows are read through a server-side cursor and written `EXPORT_BATCH_SIZE` at a time, so the memory used stays the same whatever the number of products.
+
+    Parameters:
+    - format (str): `ndjson` (a product per line) or `csv` (with a header line).
+    - current_user (User): The authenticated user.
+
+    Responses:
+    - 200 OK: The products with `id,name,fk_user,date_expire,price`, in id order.
+    - 401 Unauthorized: If the token is invalid.
+
+    Example usage:
+    - Request: GET /product/export?format=csv
+    - Response: The CSV file, as an attachment.
+    """
+    user_id = current_user.id
+
+    async def body():
+        # the request session is closed before the body is sent
+        async with open_session() as db:
+            async for chunk in AsyncProductService(db).export_products(user_id, format):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
+
+
+@product_route.get("/product/search", response_model=ProductSearchPage)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=50),
+    mode: Literal["prefix", "fulltext", "fuzzy"] = "fulltext",
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    offset: int = Query(0, ge=0, le=settings.SEARCH_MAX_OFFSET),
+    current_user: User = Depends(get_current_user),
+    product_service: AsyncProductService = Depends(get_product_service),
+):
+    """
+    Search the user's products by name.
+
+    This endpoint ranks the authenticated user's products matching `q`, best first. On PostgreSQL the search runs on the full-text (`to_tsvector('simple', name)`) and trigram (`pg_trgm`) GIN indexes; on SQLite through an in-process n-gram index of the user's product names, rebuilt after the user's writes.
+
+    Parameters:
+    - q (str): The searched text.
+    - mode (str): `prefix` (names starting with `q`, case-insensitive), `fulltext` (names with every word of `q`) or `fuzzy` (names similar to `q`, typos included).
+    - limit (int): The page size, up to `PAGE_SIZE_MAX`.
+    - offset (int): The `next_offset` of a previous page, up to `SEARCH_MAX_OFFSET`.
+    - current_user (User): The authenticated user.
+    - product_service (ProductService): Dependency that provides the product service instance used to search.
+
+    Responses:
+    - 200 OK: A page of products with their `score`, in the `ProductSearchPage` format.
+    - 401 Unauthorized: If the token is invalid.
+    - 422 Unprocessable Entity: If `q` is empty or the mode is unknown.
+
+    Example usage:
+    - Request: GET /product/search?q=mlik&mode=fuzzy
+    - Response: {"items": [{"id": 1, "name": "Milk", ..., "score": 0.5}], "next_offset": null}
+    """
+    hits, next_offset = await product_service.search_products(
+        current_user.id, q, mode, limit, offset
+    )
+    return ORJSONResponse(
+        {"items": dump_list(ProductSearchList, hits), "next_offset": next_offset}
+    )
+
+
+@product_route.post("/product/batch-get", response_model=ProductBatch)
+async def batch_get_products(
+    body: BatchGet,
+    current_user: User = Depends(get_current_user),
+    product_service: AsyncProductService = Depends(get_product_service),
+):
+    """
+    Get many products by ID.
+
+    This endpoint retrieves the authenticated user's products among the given IDs with one `IN` query, instead of a `GET /product/{product_id}` per product. The lookups are coalesced by a per request loader: an ID asked for twice is fetched once.
+
+    Parameters:
+    - body (BatchGet): The product IDs, up to `BATCH_GET_MAX_IDS`.
+    - current_user (User): The authenticated user.
+    - product_service (ProductService): Dependency that provides the product service instance used to fetch the products.
+
+    Responses:
+    - 200 OK: The products in the order of the IDs, and the `missing` IDs (not found or another user's), in the `ProductBatch` format.
+    - 401 Unauthorized: If the token is invalid.
+    - 422 Unprocessable Entity: If there are no IDs or more than `BATCH_GET_MAX_IDS`.
 
     Example usage:
-    - Request: GET /product
-    - Response: List of products or 400 if no products exist.
+    - Request: POST /product/batch-get with `{"ids": [12, 7, 31]}`
+    - Response: `{"items": [{"id": 12, ...}, {"id": 7, ...}], "missing": [31]}`
+    """
+    products, missing = await product_service.get_user_products(
+        current_user.id, batch_ids(body.ids)
+    )
+    return ORJSONResponse(
+        {"items": dump_list(ProductList, products), "missing": missing}
+    )
+
+
+@product_route.get("/product/{product_id}", response_model=ProductResponse)
+async def get_product(
+    request: Request,
+    product_id: int,
+    current_user: User = Depends(get_current_user),
+    product_service: AsyncProductService = Depends(get_product_service),
+):
     """
-    products = product_service.list_product()
-    if not products:
-        HTTPException(status_code=400, detail="Any Product!")
-    return products
+    Get a product by ID.
+
+    This endpoint retrieves one of the authenticated user's products, served through the product cache. Like `GET /product` it has a strong `ETag` and answers 304 to an `If-None-Match` naming it while the user's products are unchanged.
+
+    Parameters:
+    - product_id (int): The ID of the product.
+    - current_user (User): The authenticated user.
+    - product_service (ProductService): Dependency that provides the product service instance used to fetch the product.
+
+    Responses:
+    - 200 OK: The product in the `ProductResponse` format, with its `ETag` and `Cache-Control` (`CACHE_CONTROL_PRODUCTS`).
+    - 304 Not Modified: If `If-None-Match` names the current `ETag`.
+    - 401 Unauthorized: If the token is invalid.
+    - 404 Not Found: If the user has no product with this ID.
+
+    Example usage:
+    - Request: GET /product/{product_id}
+    - Response: The product or 404.
+    """
+
+    async def build():
+        product = await product_service.get_user_product(product_id, current_user.id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found!")
+        return ORJSONResponse(dump_list(ProductList, [product])[0])
+
+    version = await product_service.products_version(current_user.id)
+    return await etag_cache.respond(
+        request,
+        ("product", current_user.id, version, product_id),
+        build,
+        settings.CACHE_CONTROL_PRODUCTS,
+        vary="Authorization",
+    )
 
 
 @product_route.post("/product", response_model=ProductResponse)
 async def create_product(
-    body: ProductCreate, product_service: ProductService = Depends(get_product_service)
+    body: ProductCreate,
+    response: Response,
+    upsert: bool = False,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+    current_user: User = Depends(get_current_user),
+    product_service: AsyncProductService = Depends(get_product_service),
 ):
     """
     Create a new product.
 
-    This endpoint creates a new product in the system using the provided data.
+    This endpoint creates a new product of the authenticated user using the provided data. A user has one product per name and expiry date: the insert is an `INSERT ... ON CONFLICT`, so concurrent duplicates never create two rows. This changes the former behaviour, where every request added a row: a duplicate now answers 409. With `upsert=true` an existing product gets the new price and is returned instead of a 409. A request sent with an `Idempotency-Key` header runs once: its retries (and concurrent copies) get the first response back, with an `Idempotent-Replayed: true` header, for `IDEMPOTENCY_TTL_SECONDS`.
 
     Parameters:
-    - body (ProductCreate): The request body containing the information for creating a new product.
+    - body (ProductCreate): The request body containing the information for creating a new product, `fk_user` is the authenticated user.
+    - upsert (bool): Update the price of the existing product with the same name and expiry date instead of answering 409.
+    - idempotency_key (str): The `Idempotency-Key` header, a client generated key per product to create.
+    - current_user (User): The authenticated user.
     - product_service (ProductService): Dependency that provides the product service instance to handle product creation.
 
     Responses:
-    - 201 Created: The newly created product in the `ProductResponse` format.
-    - 400 Bad Request: If the product creation fails due to invalid credentials, a `400` status is returned with the message "Invalid credentials!".
+    - 200 OK: The created (or upserted) product in the `ProductResponse` format.
+    - 401 Unauthorized: If the token is invalid.
+    - 409 Conflict: If the user already has a product with this name and expiry date, without `upsert`.
+    - 422 Unprocessable Entity: If the `Idempotency-Key` was already used with another body.
+
+    Example usage:
+    - Request: POST /product?upsert=true with `Idempotency-Key: 6f1c...` and the product data in the body.
+    - Response: The product, the same one for every retry of the request.
+    """
+
+    async def create():
+        try:
+            product, created = await product_service.upsert_product(
+                body, current_user.id, update_price=upsert
+            )
+        except ProductExists as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        if not created and not upsert:
+            raise HTTPException(status_code=409, detail="Product already exists!")
+        return ProductResponse.model_validate(product)
+
+    if idempotency_key is None:
+        return await create()
+
+    try:
+        product, replayed = await idempotency_store.run(
+            f"{current_user.id}:{idempotency_key}",
+            request_fingerprint(upsert, body.model_dump_json()),
+            create,
+        )
+    except IdempotencyKeyReused as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return product
+
+
+@product_route.post("/product/bulk", response_model=ProductBulkResult)
+async def create_products_bulk(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    product_service: AsyncProductService = Depends(get_product_service),
+):
+    """
+    Create many products at once.
+
+    This endpoint imports a list of products for the authenticated user. The rows are validated like `POST /product` and inserted in chunks of `BULK_CHUNK_SIZE`, one multi-row insert and one transaction per chunk. NDJSON and CSV uploads are read while they stream in. A bad row doesn't abort the import, it's reported in `errors`. Like `POST /product`, the `fk_user` of the rows is ignored: every product belongs to the authenticated user.
+
+    Parameters:
+    - request (Request): The upload, as `application/json` (an array of products), `application/x-ndjson` (a product per line) or `text/csv` (a header line with `name,date_expire,price`).
+    - current_user (User): The authenticated user, the owner of the products.
+    - product_service (ProductService): Dependency that provides the product service instance to handle the import.
+
+    Responses:
+    - 200 OK: The import result in the `ProductBulkResult` format, with the new ids and the failed rows.
+    - 400 Bad Request: If the JSON body isn't an array.
+    - 401 Unauthorized: If the token is invalid.
+    - 415 Unsupported Media Type: If the content type isn't JSON, NDJSON or CSV.
 
     Example usage:
-    - Request: POST /product with product data in the body.
-    - Response: Newly created product or 400 if invalid credentials are provided.
+    - Request: POST /product/bulk with `Content-Type: text/csv` and the CSV file as body.
+    - Response: `{"created": 499, "failed": 1, "ids": [...], "errors": [{"row": 12, "errors": ["price: Input should be a valid number"]}]}`
     """
-    product_created = product_service.create_product(body)
-    if not product_created:
-        HTTPException(status_code=400, detail="Invalid credentials!")
-    return product_created
+    records = iter_records(request.stream(), request.headers.get("content-type"))
+    try:
+        return await product_service.bulk_create_products(records, current_user.id)
+    except UnsupportedImportFormat as exc:
+        raise HTTPException(status_code=415, detail=str(exc))
+    except InvalidImportBody as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
 
 @product_route.put("/product/update/{product_id}", response_model=ProductResponse)
 async def update_product(
     product_id: int,
     product_data: ProductUpdate,
-    product_service: ProductService = Depends(get_product_service),
+    current_user: User = Depends(get_current_user),
+    product_service: AsyncProductService = Depends(get_product_service),
 ):
     """
     Update an existing product.
 
-    This endpoint updates an existing product's data based on the provided product ID and new product data.
+    This endpoint updates one of the authenticated user's products based on the provided product ID and new product data, in one `UPDATE ... RETURNING` without reading the product first.
 
     Parameters:
     - product_id (int): The ID of the product to be updated.
     - product_data (ProductUpdate): The new data for the product.
+    - current_user (User): The authenticated user.
     - product_service (ProductService): Dependency that provides the productservice instance used to update the product.
 
     Responses:
     - 200 OK: The updated product information in the `ProductResponse` format.
-    - 400 Bad Request: If the update operation fails, a `400` status is returned with the message "Update error!".
+    - 401 Unauthorized: If the token is invalid.
+    - 404 Not Found: If the user has no product with this ID.
+    - 409 Conflict: If the user already has another product with the new name and expiry date.
 
     Example usage:
     - Request: PUT /product/update/{product_id} with updated product data.
-    - Response: Updated product or 400 if the update fails.
+    - Response: Updated product, 404 if the user has no such product or 409 on a duplicate name and expiry date.
     """
 
-    update_product = product_service.update_product(product_id, product_data)
+    try:
+        update_product = await product_service.update_product(
+            product_id, product_data, current_user.id
+        )
+    except ProductExists as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
 
     if not update_product:
-        HTTPException(status_code=400, detail="Update error!")
+        raise HTTPException(status_code=404, detail="Product not found!")
 
     return update_product
 
 
 @product_route.delete("/product/{id_product}")
 async def delete_user(
-    id_product: int, product_service: ProductService = Depends(get_product_service)
+    id_product: int,
+    current_user: User = Depends(get_current_user),
+    product_service: AsyncProductService = Depends(get_product_service),
 ):
     """
     Delete a product by ID.
 
-    This endpoint deletes the product identified by the given product ID.
+    This endpoint deletes the authenticated user's product identified by the given product ID, in one `DELETE ... RETURNING`.
 
     Parameters:
     - id_product (int): The ID of the product to be deleted.
+    - current_user (User): The authenticated user.
     - product_service (ProductService): Dependency that provides the product service instance to perform deletion.
 
     Responses:
     - 200 OK: Returns a success message when the product is deleted.
-    - 400 Bad Request: If the product deletion fails, a `400` status is returned with the message "product not deleted!".
+    - 401 Unauthorized: If the token is invalid.
+    - 404 Not Found: If the user has no product with this ID.
 
     Example usage:
     - Request: DELETE /product/{id_product}
-    - Response: Confirmation message or 400 if deletion fails.
+    - Response: Confirmation message or 404 if the user has no such product.
     """
-    delete_service = product_service.delete_product(id_product)
+    delete_service = await product_service.delete_product(id_product, current_user.id)
 
     if not delete_service:
-        HTTPException(status_code=400, detail="product not deleted!")
+        raise HTTPException(status_code=404, detail="Product not found!")
     return JSONResponse(content={"message": "Deleted successefuly!"}, status_code=200)
@@ -1,12 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import JSONResponse
-from schemas.user import UserCreate, UserLogin, UserResponse, UserUpdate
-from services.user_service import UserService
-from api.v1.dependencies import get_db, get_current_user
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
+from core.config import get_settings
+from core.http_cache import etag_cache
+from schemas.product import BatchGet
+from schemas.user import (
+    UserBatch,
+    UserCreate,
+    UserList,
+    UserLogin,
+    UserResponse,
+    UserUpdate,
+    UserPage,
+)
+from schemas.summary import UserSummary
+from services.summary_service import AsyncSummaryService
+from services.user_service import AsyncUserService
+from api.v1.dependencies import batch_ids, get_batch_ids, get_db, get_current_user
+from models.user import User
 from sqlalchemy.orm import Session
 from core.security.jwt import create_access_token
-from core.security.hashing import verify_password
+from core.ratelimit import LOGIN_EMAIL_LIMIT, LOGIN_IP_LIMIT, rate_limiter
+from core.security.hashing import (
+    verify_dummy_password_async,
+    verify_password_async,
+)
+from middlewares.ratelimit import client_ip
+from utils.pagination import InvalidCursor
+from utils.serialization import dump_list, page_response
 
+settings = get_settings()
 
 user_route = APIRouter()
 
@@ -17,36 +40,134 @@ def get_user_service(db: Session = Depends(get_db)):
 
     This function returns all user services from services.
     """
-    return UserService(db)
+    return AsyncUserService(db)
 
 
-@user_route.get("/user", response_model=list[UserResponse])
-async def get_users(user_service: UserService = Depends(get_user_service)):
+def get_summary_service(db: Session = Depends(get_db)):
+    """
+    get the summary services
+
+    This function returns the summary services from services.
+    """
+    return AsyncSummaryService(db)
+
+
+@user_route.get("/user", response_model=UserPage)
+async def get_users(
+    request: Request,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    ids: Optional[list[int]] = Depends(get_batch_ids),
+    user_service: AsyncUserService = Depends(get_user_service),
+):
     """
     List all users.
 
-    This endpoint retrieves a list of all users from the system.
+    This endpoint retrieves a page of users using keyset pagination on the id. The response has a strong `ETag`: sent back in `If-None-Match` while no user was written, it's answered 304 Not Modified without reading the users. With `ids` it returns those users instead, in the order of `ids`, fetched with one `IN` query (see `POST /user/batch-get`).
 
     Parameters:
+    - limit (int): The page size, up to `PAGE_SIZE_MAX`.
+    - cursor (str): The `next_cursor` or `prev_cursor` of a previous page.
+    - ids (str): Comma separated user ids, up to `BATCH_GET_MAX_IDS`; the other parameters are ignored and the missing ids are left out.
     - user_service (UserService): Dependency that provides the user service instance used to fetch users.
 
     Responses:
-    - 200 OK: A list of users in the `UserResponse` format.
-    - 400 Bad Request: If no users are found, a `400` status is returned with the message "Any Users!".
+    - 200 OK: A page of users in the `UserPage` format, with its `ETag` and `Cache-Control` (`CACHE_CONTROL_USERS`).
+    - 304 Not Modified: If `If-None-Match` names the current `ETag`.
+    - 400 Bad Request: If the cursor is invalid.
+
+    Example usage:
+    - Request: GET /user?limit=20
+    - Request: GET /user?limit=20&cursor={next_cursor}
+    - Request: GET /user?ids=3,1,8
+    - Request: GET /user with `If-None-Match: {etag}`
+    - Response: Page of users, with empty `items` when there are none.
+    """
+
+    async def build():
+        if ids is not None:
+            users, _ = await user_service.get_users_by_ids(ids)
+            return page_response(UserList, users)
+
+        try:
+            users, next_cursor, prev_cursor = await user_service.list_users_page(
+                limit, cursor
+            )
+        except InvalidCursor as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        return page_response(UserList, users, next_cursor, prev_cursor)
+
+    version = await user_service.users_version()
+    return await etag_cache.respond(
+        request,
+        ("users", version, limit, cursor, ids),
+        build,
+        settings.CACHE_CONTROL_USERS,
+    )
+
+
+@user_route.post("/user/batch-get", response_model=UserBatch)
+async def batch_get_users(
+    body: BatchGet,
+    user_service: AsyncUserService = Depends(get_user_service),
+):
+    """
+    Get many users by ID.
+
+    This endpoint retrieves the users among the given IDs with one `IN` query. The lookups are coalesced by a per request loader: an ID asked for twice is fetched once.
+
+    Parameters:
+    - body (BatchGet): The user IDs, up to `BATCH_GET_MAX_IDS`.
+    - user_service (UserService): Dependency that provides the user service instance used to fetch the users.
+
+    Responses:
+    - 200 OK: The users in the order of the IDs, and the `missing` IDs, in the `UserBatch` format.
+    - 422 Unprocessable Entity: If there are no IDs or more than `BATCH_GET_MAX_IDS`.
+
+    Example usage:
+    - Request: POST /user/batch-get with `{"ids": [3, 1, 8]}`
+    - Response: `{"items": [{"id": 3, ...}, {"id": 1, ...}], "missing": [8]}`
+    """
+    users, missing = await user_service.get_users_by_ids(batch_ids(body.ids))
+    return ORJSONResponse({"items": dump_list(UserList, users), "missing": missing})
+
+
+@user_route.get("/user/{user_id}/summary", response_model=UserSummary)
+async def get_user_summary(
+    user_id: int,
+    days: int = Query(settings.SUMMARY_HORIZON_DAYS, ge=0, le=365),
+    current_user: User = Depends(get_current_user),
+    summary_service: AsyncSummaryService = Depends(get_summary_service),
+):
+    """
+    Get the summary of a user's products.
+
+    This endpoint returns the totals of the authenticated user's products without reading them: the aggregates are updated in the transaction of every product write, and the value expiring soon is a sum over one row per day.
+
+    Parameters:
+    - user_id (int): The ID of the user, only the authenticated user's summary is readable.
+    - days (int): The expiry window, from today to today + `days` (`SUMMARY_HORIZON_DAYS` by default).
+    - current_user (User): The authenticated user.
+    - summary_service (SummaryService): Dependency that provides the summary service instance.
+
+    Responses:
+    - 200 OK: The summary in the `UserSummary` format: the product count, the total price, the soonest expiry from today, and the count and value expiring within the window.
+    - 401 Unauthorized: If the token is invalid.
+    - 403 Forbidden: If the user isn't the authenticated user.
 
     Example usage:
-    - Request: GET /user
-    - Response: List of users or 400 if no users exist.
+    - Request: GET /user/{user_id}/summary?days=7
+    - Response: {"user_id": 1, "product_count": 12, "total_price": 148.3, "soonest_expiry": "2026-10-20", "horizon_days": 7, "expiring_count": 3, "expiring_value": 21.5}
     """
-    users = user_service.list_users()
-    if not users:
-        HTTPException(status_code=400, detail="Any Users!")
-    return users
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not allowed!")
+    return await summary_service.get_summary(user_id, days)
 
 
 @user_route.post("/user", response_model=UserResponse)
 async def create_user(
-    body: UserCreate, user_service: UserService = Depends(get_user_service)
+    body: UserCreate, user_service: AsyncUserService = Depends(get_user_service)
 ):
     """
     Create a new user.
@@ -65,7 +186,7 @@ async def create_user(
     - Request: POST /user with user data in the body.
     - Response: Newly created user or 400 if invalid credentials are provided.
     """
-    user_created = user_service.create_user(body)
+    user_created = await user_service.create_user(body)
     if not user_created:
         HTTPException(status_code=400, detail="Invalid credentials!")
     return user_created
@@ -75,7 +196,7 @@ async def create_user(
 async def update_user(
     user_id: int,
     user_data: UserUpdate,
-    user_service: UserService = Depends(get_user_service),
+    user_service: AsyncUserService = Depends(get_user_service),
 ):
     """
     Update an existing user.
@@ -88,25 +209,25 @@ async def update_user(
     - user_service (UserService): Dependency that provides the user service instance used to update the user.
 
     Responses:
-    - 200 OK: The updated user information in the `UserResponse` format.
-    - 400 Bad Request: If the update operation fails, a `400` status is returned with the message "Update error!".
+    - 200 OK: The updated user information in the `UserResponse` format, written and read back by one `UPDATE ... RETURNING`.
+    - 404 Not Found: If there's no user with this ID.
 
     Example usage:
     - Request: PUT /user/update/{user_id} with updated user data.
-    - Response: Updated user or 400 if the update fails.
+    - Response: Updated user or 404 if the user doesn't exist.
     """
 
-    update_user = user_service.update_user(user_id, user_data)
+    update_user = await user_service.update_user(user_id, user_data)
 
     if not update_user:
-        HTTPException(status_code=400, detail="Update error!")
+        raise HTTPException(status_code=404, detail="User not found!")
 
     return update_user
 
 
 @user_route.delete("/user/{id_user}")
 async def delete_user(
-    id_user: int, user_service: UserService = Depends(get_user_service)
+    id_user: int, user_service: AsyncUserService = Depends(get_user_service)
 ):
     """
     Delete a user by ID.
@@ -118,30 +239,34 @@ async def delete_user(
     - user_service (UserService): Dependency that provides the user service instance to perform deletion.
 
     Responses:
-    - 200 OK: Returns a success message when the user is deleted.
-    - 400 Bad Request: If the user deletion fails, a `400` status is returned with the message "User not deleted!".
+    - 200 OK: Returns a success message when the user is deleted, with its products (one `DELETE ... RETURNING` per table).
+    - 404 Not Found: If there's no user with this ID.
 
     Example usage:
     - Request: DELETE /user/{id_user}
-    - Response: Confirmation message or 400 if deletion fails.
+    - Response: Confirmation message or 404 if the user doesn't exist.
     """
-    delete_service = user_service.delete_user(id_user)
+    delete_service = await user_service.delete_user(id_user)
 
     if not delete_service:
-        HTTPException(status_code=400, detail="User not deleted!")
+        raise HTTPException(status_code=404, detail="User not found!")
     return JSONResponse(content={"message": "Deleted successefuly!"}, status_code=200)
 
 
 @user_route.post("/login")
 async def login(
+    request: Request,
     body: UserLogin,
-    user_service: UserService = Depends(get_user_service),
+    user_service: AsyncUserService = Depends(get_user_service),
 ):
     """
     Authenticate a user and generate an access token.
 
     This endpoint allows a user to log in by verifying their email and password.
     If the credentials are valid, it returns a JWT access token for authentication.
+    The attempts are throttled per client IP and per email before the user lookup
+    and the password check, and an unknown email costs a password check too, so
+    the response time doesn't tell whether it has an account.
 
     Parameters:
     - body (UserLogin): The request body containing the user's email and password.
@@ -150,15 +275,19 @@ async def login(
     Responses:
     - 200 OK: Returns an access token and token type in the response body and an Authorization header.
     - 400 Bad Request: If the email does not exist or the password is incorrect, a 400 status with "Invalid credentials!" is returned.
+    - 429 Too Many Requests: If the IP or the email made too many attempts, with Retry-After.
+    - 503 Service Unavailable: If the password hashing pool is saturated.
 
     Example usage:
     - Request: POST /login with JSON body { "email": "user@example.com", "password": "password123" }
     - Response: JSON with access token and bearer token type or 400 if invalid credentials.
     """
+    await rate_limiter.check_async(LOGIN_IP_LIMIT, client_ip(request.scope))
+    await rate_limiter.check_async(LOGIN_EMAIL_LIMIT, body.email.strip().lower())
 
-    user = user_service.get_user_by_email(body.email)
+    user = await user_service.get_user_by_email(body.email)
     if user:
-        if verify_password(body.password, user.hashed_password):
+        if await verify_password_async(body.password, user.hashed_password):
             access_token = create_access_token(data={"sub": body.email})
             return JSONResponse(
                 content={"access_token": access_token, "token_type": "bearer"},
@@ -167,4 +296,5 @@ async def login(
         else:
             raise HTTPException(status_code=400, detail="Invalid credentials!")
     else:
+        await verify_dummy_password_async(body.password)
         raise HTTPException(status_code=400, detail="Invalid credentials!")
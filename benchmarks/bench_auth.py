@@ -0,0 +1,69 @@
+"""
+Auth overhead per request.
+
+Compares the old path (the middleware decodes the JWT, get_current_user decodes
+it again and queries the user) with the token cache path (one cache lookup and
+the cached user):
+
+    python -m benchmarks.bench_auth --iterations 5000
+"""
+
+import argparse
+import time
+import uuid
+
+from core.db import SessionLocal
+from core.security.jwt import create_access_token, decode_access_token
+from core.security.token_cache import TokenCache
+from models.user import User
+from models.product import Product  # noqa: F401  maps User.products
+from repository.user_repo import UserRepo
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main(iterations: int) -> None:
+    db = SessionLocal()
+    email = f"bench_{uuid.uuid4().hex[:8]}@example.com"
+    db.add(User(name="Bench", email=email, hashed_password="x"))
+    db.commit()
+
+    token = create_access_token({"sub": email})
+    cache = TokenCache(max_entries=1000)
+
+    def uncached():
+        decode_access_token(token)  # middleware
+        payload = decode_access_token(token)  # get_current_user
+        UserRepo(db).get_user_by_email(payload["sub"])
+
+    def cached():
+        entry = cache.verify(token)
+        if entry.user is None:
+            cache.remember_user(entry, UserRepo(db).get_user_by_email(email))
+        return entry.user
+
+    decode_only = per_call_us(lambda: decode_access_token(token), iterations)
+    before = per_call_us(uncached, iterations)
+    after = per_call_us(cached, iterations)
+
+    print(f"jwt decode:             {decode_only:8.1f} us")
+    print(f"decode x2 + user query: {before:8.1f} us/request")
+    print(f"token cache:            {after:8.1f} us/request")
+    print(f"cache stats: {cache.stats()}")
+
+    db.query(User).filter(User.email == email).delete()
+    db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    main(args.iterations)
@@ -0,0 +1,133 @@
+"""
+Auth middleware throughput, before and after the pure ASGI rewrite.
+
+Calls a small app directly through ASGI (no HTTP, so only the app work is
+measured) with the previous call_next middleware and with AuthStateMiddleware,
+on a JSON route and on a streamed one, and reports the requests per second:
+
+    python -m benchmarks.bench_auth_middleware --requests 5000
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from core.security.jwt import create_access_token
+from core.security.token_cache import token_cache
+from middlewares.middleware import AuthStateMiddleware
+
+
+async def call_next_middleware(request: Request, call_next):
+    """
+    the middleware as it was before, kept here for the comparison
+    """
+    token = request.headers.get("Authorization")
+    request.state.token_entry = None
+
+    if token:
+        try:
+            token = token.split(" ")[1]
+
+            entry = token_cache.verify(token)
+            request.state.token_entry = entry
+            request.state.user = entry.claims if entry else None
+        except Exception:
+
+            request.state.user = None
+    else:
+
+        request.state.user = None
+
+    return await call_next(request)
+
+
+def build_app(asgi: bool) -> FastAPI:
+    app = FastAPI()
+    if asgi:
+        app.add_middleware(AuthStateMiddleware)
+    else:
+        app.middleware("http")(call_next_middleware)
+
+    @app.get("/me")
+    async def me(request: Request):
+        return {"sub": request.state.user["sub"]}
+
+    @app.get("/stream")
+    async def stream(request: Request):
+        async def chunks():
+            for _ in range(10):
+                yield b"x" * 1024
+
+        return StreamingResponse(chunks())
+
+    return app
+
+
+def receiver():
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # the client stays connected, streamed responses listen for this
+        await asyncio.Future()
+
+    return receive
+
+
+async def requests_per_second(app, path: str, headers: list, requests: int) -> float:
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 1234),
+            "server": ("bench", 80),
+        }
+        await app(scope, receiver(), send)
+    return requests / (time.perf_counter() - start)
+
+
+async def main(requests: int, rounds: int) -> None:
+    token = create_access_token({"sub": "bench@example.com"})
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    apps = {"call_next": build_app(asgi=False), "asgi": build_app(asgi=True)}
+
+    for path in ("/me", "/stream"):
+        results = {}
+        for name, app in apps.items():
+            await requests_per_second(app, path, headers, 500)
+            results[name] = max(
+                [
+                    await requests_per_second(app, path, headers, requests)
+                    for _ in range(rounds)
+                ]
+            )
+
+        before, after = results["call_next"], results["asgi"]
+        print(f"{path}")
+        print(f"  call_next middleware: {before:9.0f} req/s")
+        print(f"  ASGI middleware:      {after:9.0f} req/s ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.rounds))
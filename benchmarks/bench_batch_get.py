@@ -0,0 +1,91 @@
+"""
+Batch reads against one read per id.
+
+Creates `--products` products for a new user and reads `--ids` of them (200
+by default) with one GET /product/{id} per id, with one GET /product?ids=...
+and with one POST /product/batch-get, reporting the time and the database
+statements of each. Run against a migrated database with the same .env as the
+app, CACHE_ENABLED=False to time the database and RATE_LIMIT_ENABLED=False
+so the single reads aren't throttled:
+
+    CACHE_ENABLED=False RATE_LIMIT_ENABLED=False python -m benchmarks.bench_batch_get --products 1000 --ids 200
+"""
+
+from datetime import date, timedelta
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import httpx
+
+from core.db import async_engine
+from core.security import hashing
+from main import app
+from core.profiler import capture_queries
+
+
+async def timed(read) -> tuple[float, int]:
+    with capture_queries() as log:
+        start = time.perf_counter()
+        await read()
+        elapsed = time.perf_counter() - start
+    return elapsed, log.count
+
+
+async def main(products: int, ids: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        email = f"bench_{uuid.uuid4().hex[:8]}@example.com"
+        await client.post(
+            "/user", json={"name": "Bench", "email": email, "password": "bench123"}
+        )
+        token = await client.post(
+            "/login", json={"email": email, "password": "bench123"}
+        )
+        client.headers["Authorization"] = f"Bearer {token.json()['access_token']}"
+
+        expire = (date.today() + timedelta(days=30)).isoformat()
+        created = []
+        for i in range(products):
+            response = await client.post(
+                "/product",
+                json={"name": f"Item {i}", "price": 1 + i % 50, "date_expire": expire},
+            )
+            created.append(response.json()["id"])
+        wanted = random.Random(7).sample(created, min(ids, len(created)))
+
+        async def one_by_one():
+            for product_id in wanted:
+                await client.get(f"/product/{product_id}")
+
+        async def query_string():
+            await client.get("/product", params={"ids": ",".join(map(str, wanted))})
+
+        async def batch_get():
+            await client.post("/product/batch-get", json={"ids": wanted})
+
+        print(f"{len(wanted)} ids out of {products} products")
+        for name, read in (
+            ("GET /product/{id} x N", one_by_one),
+            ("GET /product?ids=", query_string),
+            ("POST /product/batch-get", batch_get),
+        ):
+            elapsed, statements = await timed(read)
+            print(f"  {name:<24} {elapsed * 1000:9.1f} ms  {statements:>4} statements")
+
+    hashing.hashing_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--ids", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.products, args.ids))
@@ -0,0 +1,54 @@
+"""
+Budget planner benchmark across list sizes.
+
+Times each planner mode on random product lists, the budget being a third of
+the list total. Exact mode stays bounded by BUDGET_DP_MAX_CELLS:
+
+    python -m benchmarks.bench_budget --sizes 100,1000,10000,50000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from core.config import get_settings
+from services.budget_service import greedy_plan, knapsack_plan, priority_plan
+
+
+def main(sizes: list[int], seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    max_cells = get_settings().BUDGET_DP_MAX_CELLS
+
+    print(f"max_cells={max_cells}")
+    print(f"{'items':>8} {'greedy':>10} {'priority':>10} {'exact':>10} {'optimal':>8}")
+    for size in sizes:
+        prices = rng.integers(50, 5000, size=size)
+        priorities = rng.random(size) * 10
+        budget = int(prices.sum() // 3)
+
+        start = time.perf_counter()
+        greedy_plan(prices, budget)
+        greedy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        priority_plan(prices, priorities, budget)
+        priority = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, optimal = knapsack_plan(prices, priorities, budget, max_cells)
+        exact = time.perf_counter() - start
+
+        print(
+            f"{size:>8} {greedy * 1000:>8.2f}ms {priority * 1000:>8.2f}ms "
+            f"{exact * 1000:>8.2f}ms {str(optimal):>8}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    main([int(size) for size in args.sizes.split(",")], args.seed)
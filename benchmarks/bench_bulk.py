@@ -0,0 +1,112 @@
+"""
+Bulk import throughput benchmark.
+
+Imports the same shopping list through POST /product/bulk as a JSON array,
+NDJSON and CSV, and through one POST /product per item, reporting rows per
+second for each. Run against a migrated database with the same .env as the
+app, tuning BULK_CHUNK_SIZE in the environment (RATE_LIMIT_ENABLED=False so the
+single POSTs aren't throttled):
+
+    python -m benchmarks.bench_bulk --rows 5000
+    BULK_CHUNK_SIZE=1000 python -m benchmarks.bench_bulk --rows 20000 --single 200
+"""
+
+from datetime import date, timedelta
+import argparse
+import asyncio
+import csv
+import io
+import json
+import time
+import uuid
+
+import httpx
+
+from core.config import get_settings
+from core.db import async_engine
+from core.security import hashing
+from main import app
+
+
+def build_rows(rows: int, fk_user: int, prefix: str) -> list[dict]:
+    # a user has one product per name and expiry date, every upload has its own
+    today = date.today()
+    return [
+        {
+            "name": f"{prefix} {i}",
+            "fk_user": fk_user,
+            "date_expire": (today + timedelta(days=1 + i % 365)).isoformat(),
+            "price": round(1 + i % 500 * 0.37, 2),
+        }
+        for i in range(rows)
+    ]
+
+
+def as_csv(rows: list[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def main(rows: int, single: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        email = f"bench_{uuid.uuid4().hex[:8]}@example.com"
+        response = await client.post(
+            "/user", json={"name": "Bench", "email": email, "password": "bench123"}
+        )
+        token = await client.post(
+            "/login", json={"email": email, "password": "bench123"}
+        )
+        client.headers["Authorization"] = f"Bearer {token.json()['access_token']}"
+        fk_user = response.json()["id"]
+
+        uploads = {
+            "json": (
+                json.dumps(build_rows(rows, fk_user, "Json")).encode(),
+                "application/json",
+            ),
+            "ndjson": (
+                "\n".join(
+                    json.dumps(row) for row in build_rows(rows, fk_user, "Ndjson")
+                ).encode(),
+                "application/x-ndjson",
+            ),
+            "csv": (as_csv(build_rows(rows, fk_user, "Csv")), "text/csv"),
+        }
+
+        print(f"rows={rows} chunk_size={get_settings().BULK_CHUNK_SIZE}")
+        for name, (body, content_type) in uploads.items():
+            start = time.perf_counter()
+            response = await client.post(
+                "/product/bulk", content=body, headers={"Content-Type": content_type}
+            )
+            elapsed = time.perf_counter() - start
+            result = response.json()
+            print(
+                f"bulk {name:<7} {result['created'] / elapsed:>10.0f} rows/s  "
+                f"created={result['created']} failed={result['failed']}"
+            )
+
+        start = time.perf_counter()
+        for row in build_rows(single, fk_user, "Single"):
+            await client.post("/product", json=row)
+        elapsed = time.perf_counter() - start
+        print(f"single POST   {single / elapsed:>10.0f} rows/s  created={single}")
+
+    hashing.hashing_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--single", type=int, default=500, help="rows sent one by one")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.rows, args.single))
@@ -0,0 +1,88 @@
+"""
+ORM entities vs column rows for the read-only lists.
+
+Reads the same products as Product entities (identity map, instrumentation)
+and as PRODUCT_COLUMNS rows (the columns of the read-only lists), then serializes
+them like GET /product does. Reports the time, the rows per second and the
+peak memory allocated by each path:
+
+    python -m benchmarks.bench_column_reads --rows 100000 --database-url sqlite:///./bench_pagination.db
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_pagination import seed
+from core.db import Base
+from models.product import Product
+from repository.product_repo import PRODUCT_COLUMNS
+from schemas.product import ProductList
+from utils.serialization import page_response
+
+
+def orm_read(db, rows: int) -> list:
+    return db.query(Product).limit(rows).all()
+
+
+def column_read(db, rows: int) -> list:
+    return db.query(*PRODUCT_COLUMNS).limit(rows).all()
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def peak_mb(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main(database_url: str, rows: int, repeat: int) -> None:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    seed(sessionmaker(bind=engine)(), rows)
+    Session = sessionmaker(bind=engine)
+
+    def run(read, serialize: bool):
+        # a new session per run, the ORM path starts with an empty identity map
+        with Session() as db:
+            result = read(db, rows)
+            if serialize:
+                page_response(ProductList, result)
+
+    print(f"rows={rows}")
+    print(f"{'path':>8} {'step':>16} {'time':>10} {'rows/s':>12} {'peak':>10}")
+    for name, read in (("orm", orm_read), ("columns", column_read)):
+        for step, serialize in (("read", False), ("read + serialize", True)):
+            seconds = timed(lambda: run(read, serialize), repeat)
+            memory = peak_mb(lambda: run(read, serialize))
+            print(
+                f"{name:>8} {step:>16} {seconds * 1000:>8.1f}ms "
+                f"{rows / seconds:>12.0f} {memory:>8.1f}MB"
+            )
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="sqlite:///./bench_pagination.db")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    main(args.database_url, args.rows, args.repeat)
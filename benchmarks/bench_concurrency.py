@@ -0,0 +1,110 @@
+"""
+Concurrency benchmark for the database stack.
+
+Floods GET /product with N parallel clients while a probe keeps calling GET /.
+When the queries block the event loop the probe latency grows with N; with the
+threadpool/AsyncSession stack its p99 stays flat.
+
+Run with the same .env as the app, toggling DATABASE_ASYNC to compare:
+
+    python -m benchmarks.bench_concurrency --levels 1,8,32,64
+    DATABASE_ASYNC=True python -m benchmarks.bench_concurrency --levels 1,8,32,64
+"""
+
+from datetime import date, timedelta
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from core.config import get_settings
+from core.db import SessionLocal, async_engine
+from main import app
+from models.product import Product
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed_products(count: int) -> None:
+    db = SessionLocal()
+    try:
+        if db.query(Product).count() >= count:
+            return
+        expire = date.today() + timedelta(days=30)
+        db.add_all(
+            Product(name=f"bench {i}", fk_user=1, date_expire=expire, price=1.0)
+            for i in range(count)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests: int):
+    product_latency: list[float] = []
+    probe_latency: list[float] = []
+    done = asyncio.Event()
+
+    async def worker():
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.get("/product")
+            product_latency.append(time.perf_counter() - start)
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/")
+            probe_latency.append(time.perf_counter() - start)
+            await asyncio.sleep(0.001)
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    done.set()
+    await probe_task
+
+    return product_latency, probe_latency
+
+
+async def main(levels: list[int], requests: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        await client.get("/product")  # warm up pools and caches
+
+        mode = "async" if get_settings().DATABASE_ASYNC else "sync+threadpool"
+        print(f"mode={mode}")
+        print(
+            f"{'clients':>8} {'product p50':>12} {'product p99':>12} "
+            f"{'probe p50':>10} {'probe p99':>10}"
+        )
+        for concurrency in levels:
+            product, probe = await run_level(client, concurrency, requests)
+            print(
+                f"{concurrency:>8} "
+                f"{statistics.median(product) * 1000:>10.2f}ms "
+                f"{percentile(product, 99) * 1000:>10.2f}ms "
+                f"{statistics.median(probe) * 1000:>8.2f}ms "
+                f"{percentile(probe, 99) * 1000:>8.2f}ms"
+            )
+
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--levels", default="1,8,32,64")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=100)
+    args = parser.parse_args()
+
+    seed_products(args.seed)
+    asyncio.run(main([int(level) for level in args.levels.split(",")], args.requests))
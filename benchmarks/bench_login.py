@@ -0,0 +1,91 @@
+"""
+Login throughput benchmark.
+
+Fires concurrent POST /login calls and reports logins per second, the latency
+of a GET / probe running next to them (the event loop health) and the hashing
+pool timings. Tune HASH_POOL_KIND / HASH_POOL_WORKERS / HASH_POOL_MAX_QUEUE in
+the environment to compare pool setups:
+
+    python -m benchmarks.bench_login --logins 200 --concurrency 32
+    HASH_POOL_KIND=process HASH_POOL_WORKERS=8 python -m benchmarks.bench_login
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from core.config import get_settings
+from core.db import async_engine
+from core.security import hashing
+from main import app
+
+
+async def main(logins: int, concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        email = f"bench_{uuid.uuid4().hex[:8]}@example.com"
+        credentials = {"email": email, "password": "benchmark123"}
+        await client.post("/user", json={"name": "Bench", **credentials})
+
+        statuses: dict[int, int] = {}
+        probe_latency: list[float] = []
+        remaining = iter(range(logins))
+        done = asyncio.Event()
+
+        async def worker():
+            for _ in remaining:
+                response = await client.post("/login", json=credentials)
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/")
+                probe_latency.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    stats = hashing.hashing_stats()
+    settings = get_settings()
+    print(
+        f"pool={settings.HASH_POOL_KIND} workers={settings.HASH_POOL_WORKERS} "
+        f"max_queue={settings.HASH_POOL_MAX_QUEUE} concurrency={concurrency}"
+    )
+    print(f"logins/s: {logins / elapsed:.1f}  statuses: {statuses}")
+    print(
+        f"probe GET / p50: {statistics.median(probe_latency) * 1000:.2f}ms "
+        f"max: {max(probe_latency) * 1000:.2f}ms"
+    )
+    if stats["calls"]:
+        print(
+            f"bcrypt avg run: {stats['total_run'] / stats['calls'] * 1000:.1f}ms "
+            f"avg wait: {stats['total_wait'] / stats['calls'] * 1000:.1f}ms "
+            f"rejected: {stats['rejected']}"
+        )
+
+    hashing.hashing_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.logins, args.concurrency))
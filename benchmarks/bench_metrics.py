@@ -0,0 +1,82 @@
+"""
+Metrics middleware overhead.
+
+Calls a one-route app directly through ASGI (no HTTP, so only the app work
+is measured) with and without MetricsMiddleware, and reports the added time
+per request. The budget is 50 us per request:
+
+    python -m benchmarks.bench_metrics --requests 20000
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from core.metrics import Registry
+from middlewares.metrics import MetricsMiddleware
+
+BUDGET_US = 50
+
+bare = FastAPI()
+
+
+@bare.get("/product/{product_id}")
+async def product(product_id: int):
+    return {"id": product_id}
+
+
+async def per_request_us(app, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for i in range(requests):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/product/{i}",
+            "raw_path": f"/product/{i}".encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [],
+            "client": ("127.0.0.1", 1234),
+            "server": ("bench", 80),
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / requests * 1_000_000
+
+
+async def main(requests: int, rounds: int) -> None:
+    # a built FastAPI app with its own middleware stack, wrapped by the metrics
+    instrumented = MetricsMiddleware(bare, Registry())
+    await per_request_us(bare, 1000)
+
+    without, with_metrics = [], []
+    for _ in range(rounds):
+        without.append(await per_request_us(bare, requests))
+        with_metrics.append(await per_request_us(instrumented, requests))
+
+    overhead = min(with_metrics) - min(without)
+    print(f"without metrics: {min(without):7.1f} us/request")
+    print(f"with metrics:    {min(with_metrics):7.1f} us/request")
+    print(
+        f"overhead:        {overhead:7.1f} us/request "
+        f"({'ok' if overhead < BUDGET_US else 'OVER'} budget {BUDGET_US} us)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.rounds))
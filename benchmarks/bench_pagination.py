@@ -0,0 +1,118 @@
+"""
+Keyset vs OFFSET pagination benchmark.
+
+Seeds a products table (1M rows by default) and times page 1 and page 1000 with
+both strategies. Keyset pages read through the (date_expire, id) / id index,
+so page 1000 costs the same as page 1; OFFSET has to walk every earlier row.
+
+    python -m benchmarks.bench_pagination --rows 1000000 --database-url sqlite:///./bench.db
+"""
+
+from datetime import date, timedelta
+import argparse
+import statistics
+import time
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base
+from models.user import User
+from models.product import Product
+from repository.product_repo import PRODUCT_COLUMNS, PRODUCT_ORDERS, ProductRepo
+from utils.pagination import encode_cursor
+
+
+def seed(db, rows: int, chunk: int = 50_000) -> None:
+    existing = db.query(func.count(Product.id)).scalar()
+    if existing >= rows:
+        return
+    if not db.get(User, 1):
+        db.add(User(id=1, name="Bench", email="bench@example.com", hashed_password="x"))
+        db.commit()
+
+    today = date.today()
+    for start in range(existing, rows, chunk):
+        db.execute(
+            insert(Product),
+            [
+                {
+                    "name": f"product {i}",
+                    "fk_user": 1,
+                    "date_expire": today + timedelta(days=i % 365),
+                    "price": i % 1000,
+                }
+                for i in range(start, min(start + chunk, rows))
+            ],
+        )
+        db.commit()
+
+
+def timed_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(database_url: str, rows: int, page: int, limit: int, repeat: int) -> None:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, rows)
+    repo = ProductRepo(db)
+
+    print(f"rows={rows} limit={limit}")
+    print(f"{'order_by':>12} {'strategy':>8} {'page 1':>10} {f'page {page}':>12}")
+    for order_by, columns in PRODUCT_ORDERS.items():
+        # cursor of the last row before the requested page, built outside the timing
+        boundary = (
+            db.query(*columns)
+            .order_by(*columns)
+            .offset((page - 1) * limit - 1)
+            .limit(1)
+            .one()
+        )
+        cursor = encode_cursor(list(boundary), order_by, "next")
+
+        keyset_first = timed_ms(
+            lambda: repo.list_products_page(limit, None, order_by), repeat
+        )
+        keyset_deep = timed_ms(
+            lambda: repo.list_products_page(limit, cursor, order_by), repeat
+        )
+        offset_first = timed_ms(
+            lambda: db.query(*PRODUCT_COLUMNS).order_by(*columns).limit(limit).all(),
+            repeat,
+        )
+        offset_deep = timed_ms(
+            lambda: db.query(*PRODUCT_COLUMNS)
+            .order_by(*columns)
+            .offset((page - 1) * limit)
+            .limit(limit)
+            .all(),
+            repeat,
+        )
+        print(
+            f"{order_by:>12} {'keyset':>8} {keyset_first:>8.2f}ms {keyset_deep:>10.2f}ms"
+        )
+        print(
+            f"{order_by:>12} {'offset':>8} {offset_first:>8.2f}ms {offset_deep:>10.2f}ms"
+        )
+
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="sqlite:///./bench_pagination.db")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    main(args.database_url, args.rows, args.page, args.limit, args.repeat)
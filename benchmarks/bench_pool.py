@@ -0,0 +1,95 @@
+"""
+Connection pool load test.
+
+Floods an endpoint that holds a pooled connection for --hold ms with more
+clients than the pool has connections. A saturated pool makes the requests
+wait up to DB_POOL_TIMEOUT_SECONDS and then answer 503 with Retry-After,
+instead of piling up or opening connections past the limit. Tune the pool in
+the environment:
+
+    DB_POOL_SIZE=4 DB_POOL_MAX_OVERFLOW=0 DB_POOL_TIMEOUT_SECONDS=0.5 \\
+        python -m benchmarks.bench_pool --clients 64 --hold 50
+    DATABASE_ASYNC=True DB_POOL_SIZE=4 python -m benchmarks.bench_pool
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import text
+
+from api.v1.dependencies import get_db
+from core.config import get_settings
+from core.db import async_engine, pool_stats, run_in_session
+from main import app
+
+
+def mount_slow_route(hold: float) -> None:
+    @app.get("/bench/hold")
+    async def hold_connection(db=Depends(get_db)):
+        # the session keeps its connection until the request ends
+        await run_in_session(db, lambda session: session.execute(text("SELECT 1")))
+        await asyncio.sleep(hold)
+        return {"ok": True}
+
+
+async def main(clients: int, duration: float, hold: float) -> None:
+    mount_slow_route(hold)
+    transport = httpx.ASGITransport(app=app)
+    statuses: dict[int, int] = {}
+    latency: dict[int, list[float]] = {}
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get("/bench/hold")
+                status = response.status_code
+                statuses[status] = statuses.get(status, 0) + 1
+                latency.setdefault(status, []).append(time.perf_counter() - start)
+                if status == 503:
+                    await asyncio.sleep(float(response.headers["Retry-After"]) / 10)
+
+        await asyncio.gather(*(worker() for _ in range(clients)))
+
+    settings = get_settings()
+    print(
+        f"pool_size={settings.DB_POOL_SIZE} max_overflow={settings.DB_POOL_MAX_OVERFLOW} "
+        f"timeout={settings.DB_POOL_TIMEOUT_SECONDS}s clients={clients} "
+        f"hold={hold * 1000:.0f}ms async={settings.DATABASE_ASYNC}"
+    )
+    print(f"ok/s: {statuses.get(200, 0) / duration:.1f}  statuses: {statuses}")
+    for status, values in sorted(latency.items()):
+        values.sort()
+        print(
+            f"  {status}: p50 {statistics.median(values) * 1000:.1f}ms "
+            f"p99 {values[int(len(values) * 0.99)] * 1000:.1f}ms "
+            f"max {values[-1] * 1000:.1f}ms"
+        )
+    stats = pool_stats()["async" if settings.DATABASE_ASYNC else "sync"]
+    if stats:
+        print(
+            f"pool: checkouts={stats['checkouts']} timeouts={stats['timeouts']} "
+            f"avg wait={stats['total_wait'] / max(1, stats['checkouts'] + stats['timeouts']) * 1000:.1f}ms "
+            f"max wait={stats['max_wait'] * 1000:.1f}ms"
+        )
+
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--hold", type=float, default=50, help="ms per request")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.clients, args.duration, args.hold / 1000))
@@ -0,0 +1,78 @@
+"""
+Rate limiter overhead.
+
+Times `RateLimiter.check` over `--keys` distinct client keys (10k by default)
+with the in-process sharded store and the in-memory shared store, from
+`--threads` threads at once, and reports the cost per check next to the
+number of keys held. A check on a key never seen is one dict miss, the same
+cost as a known key:
+
+    python -m benchmarks.bench_rate_limit --keys 10000 --checks 1000000 --threads 8
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from core.ratelimit import (
+    FakeSharedBucketStore,
+    RateLimit,
+    RateLimitExceeded,
+    RateLimiter,
+    ShardedBucketStore,
+)
+
+# generous enough that the checks are allowed, the rejections are timed apart
+LIMIT = RateLimit("bench", rate=1_000_000, burst=1_000_000)
+TIGHT = RateLimit("bench_tight", rate=0.001, burst=1)
+
+
+def run(limiter: RateLimiter, limit: RateLimit, keys: list[str], threads: int):
+    def worker(chunk: list[str]):
+        for key in chunk:
+            try:
+                limiter.check(limit, key)
+            except RateLimitExceeded:
+                pass
+
+    chunks = [keys[i::threads] for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main(keys: int, checks: int, threads: int) -> None:
+    rng = random.Random(7)
+    clients = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(keys)]
+    stream = [rng.choice(clients) for _ in range(checks)]
+
+    for name, store in (
+        ("sharded", ShardedBucketStore(shards=64, max_keys=max(keys * 2, 100_000))),
+        ("shared (fake)", FakeSharedBucketStore()),
+    ):
+        limiter = RateLimiter(store)
+        elapsed = run(limiter, LIMIT, clients, threads)
+        print(f"{name:14} new keys   {elapsed / keys * 1e9:8.0f}ns/check")
+
+        elapsed = run(limiter, LIMIT, stream, threads)
+        print(f"{name:14} known keys {elapsed / checks * 1e9:8.0f}ns/check")
+
+        run(limiter, TIGHT, clients, threads)
+        elapsed = run(limiter, TIGHT, clients, threads)
+        print(f"{name:14} rejected   {elapsed / keys * 1e9:8.0f}ns/check")
+        print(f"{'':14} {limiter.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    main(args.keys, args.checks, args.threads)
@@ -0,0 +1,137 @@
+"""
+Product name search latency.
+
+Builds `--names` product names (1M by default) out of a vocabulary of made-up
+words and times the prefix, full-text and fuzzy searches through the
+in-process NgramIndex (the SQLite search), with the index build time. With a
+PostgreSQL `--database-url` the names are also seeded as one user's products
+and the same searches are timed through the full-text and pg_trgm indexes:
+
+    python -m benchmarks.bench_search --names 1000000
+    python -m benchmarks.bench_search --names 1000000 --database-url postgresql://keeper@localhost/keeper_bench
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base
+from core.search import SEARCH_MODES, NgramIndex
+from models.product import Product
+from models.user import User
+from repository.product_repo import SQL_SEARCH_DIALECTS, ProductRepo
+
+CONSONANTS = "bcdfghjklmnprstvz"
+VOWELS = "aeiou"
+
+
+def build_names(count: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    syllables = [c + v for c in CONSONANTS for v in VOWELS]
+    vocabulary = sorted(
+        {"".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(20_000)}
+    )
+    return [
+        " ".join(rng.choices(vocabulary, k=rng.randint(1, 3))).capitalize()
+        for _ in range(count)
+    ]
+
+
+def build_queries(names: list[str], count: int, seed: int = 11) -> dict:
+    rng = random.Random(seed)
+    picked = rng.sample(names, count)
+
+    def typo(name: str) -> str:
+        word = max(name.split(), key=len)
+        i = rng.randrange(len(word))
+        return word[:i] + word[i + 1 :]
+
+    return {
+        "prefix": [name[:4] for name in picked],
+        "fulltext": [rng.choice(name.split()) for name in picked],
+        "fuzzy": [typo(name) for name in picked],
+    }
+
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {statistics.median(samples):8.3f}ms  p99 {p99:8.3f}ms"
+
+
+def timed(search, queries: list[str]) -> list[float]:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def seed(db, names: list[str]) -> None:
+    if db.query(func.count(Product.id)).scalar() >= len(names):
+        return
+    db.execute(
+        insert(User).values(
+            id=1, name="Bench", email="bench@example.com", hashed_password="x"
+        )
+    )
+    expire = date.today() + timedelta(days=30)
+    for start in range(0, len(names), 10_000):
+        db.execute(
+            insert(Product),
+            [
+                {"name": name, "fk_user": 1, "date_expire": expire, "price": 1}
+                for name in names[start : start + 10_000]
+            ],
+        )
+    db.commit()
+
+
+def main(count: int, queries: int, limit: int, database_url: str | None) -> None:
+    names = build_names(count)
+    searches = build_queries(names, queries)
+
+    start = time.perf_counter()
+    index = NgramIndex(enumerate(names, start=1))
+    print(f"{len(index)} names, NgramIndex built in {time.perf_counter() - start:.1f}s")
+    for mode in SEARCH_MODES:
+        samples = timed(lambda q: index.search(q, mode, limit), searches[mode])
+        print(f"  ngram   {mode:>8}  {percentiles(samples)}")
+
+    if database_url is None:
+        return
+
+    engine = create_engine(database_url)
+    if engine.dialect.name not in SQL_SEARCH_DIALECTS:
+        print(f"{engine.dialect.name} searches through the NgramIndex, skipped")
+        return
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, names)
+    db.execute(select(func.count()).select_from(Product)).scalar()
+
+    repo = ProductRepo(db)
+    for mode in SEARCH_MODES:
+        samples = timed(
+            lambda q: repo.search_products(1, q, mode, limit), searches[mode]
+        )
+        print(f"  {engine.dialect.name} {mode:>8}  {percentiles(samples)}")
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    main(args.names, args.queries, args.limit, args.database_url)
@@ -0,0 +1,89 @@
+"""
+List response serialization.
+
+Serializes pages of detached products (no database, only the response work)
+the way FastAPI does for a `response_model` route (a page model validated from
+the ORM rows, validated again and encoded with json.dumps) and through
+utils.serialization.page_response (the rows validated in bulk and encoded with
+orjson), for 100, 10k and 100k items:
+
+    python -m benchmarks.bench_serialization --sizes 100 10000 100000
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date
+from decimal import Decimal
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy.orm import configure_mappers
+
+from core.cache import load_entity
+from models import Product
+from schemas.product import ProductList, ProductPage
+from utils.serialization import page_response
+
+page_field = create_model_field("Response_get_products", ProductPage)
+
+
+async def default_path(products) -> bytes:
+    page = ProductPage(items=products, next_cursor="next", prev_cursor=None)
+    content = await serialize_response(field=page_field, response_content=page)
+    return JSONResponse(content).body
+
+
+async def bulk_path(products) -> bytes:
+    return page_response(ProductList, products, "next", None).body
+
+
+def build_products(size: int) -> list:
+    configure_mappers()
+    return [
+        load_entity(
+            Product,
+            {
+                "id": i,
+                "name": f"product {i}",
+                "fk_user": 1 + i % 100,
+                "date_expire": date(2030, 1, 1 + i % 28),
+                "price": Decimal("9.90"),
+            },
+        )
+        for i in range(1, size + 1)
+    ]
+
+
+async def best_of(path, products, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await path(products)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+async def main(sizes: list[int], rounds: int) -> None:
+    for size in sizes:
+        products = build_products(size)
+        assert await default_path(products[:10]) == await bulk_path(products[:10])
+
+        default = await best_of(default_path, products, rounds)
+        bulk = await best_of(bulk_path, products, rounds)
+        print(f"{size} items")
+        print(f"  response_model + json:    {default * 1000:9.1f} ms")
+        print(
+            f"  bulk validation + orjson: {bulk * 1000:9.1f} ms "
+            f"({default / bulk:.1f}x faster)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 100000])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.sizes, args.rounds))
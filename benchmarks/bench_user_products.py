@@ -0,0 +1,138 @@
+"""
+Per user product pages on a large table.
+
+Seeds `--users` users with `--products` products each (100k x 100 = 10M rows
+by default, spread over the table the way they'd be inserted over time) and
+times the pages of random users by id and by expiry date: the first page and
+the page after it, read through the (fk_user, <sort key>) indexes, then the
+same pages served by the per user list cache. The query plans are printed so
+a sequential scan shows up:
+
+    python -m benchmarks.bench_user_products --users 100000 --products 100 --database-url sqlite:///./bench_users.db
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from core.db import Base
+from models.product import Product
+from models.user import User
+from repository.cache import CachedAsyncProductRepo, product_list_cache
+from repository.product_repo import PRODUCT_COLUMNS, PRODUCT_ORDERS, ProductRepo
+from utils.sql import query_plan
+
+# the n-th product belongs to user n % users + 1 and expires within a year
+SEED_DATES = {
+    "sqlite": "date(:start, '+' || (n % 365) || ' days')",
+    "postgresql": "CAST(:start AS date) + (n % 365)",
+}
+
+
+def seed(db, users: int, products: int) -> None:
+    if db.query(func.count(User.id)).scalar() >= users:
+        return
+
+    expire = SEED_DATES[db.get_bind().dialect.name]
+    db.execute(
+        text(
+            "WITH RECURSIVE seq(n) AS "
+            "(SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :users) "
+            "INSERT INTO users (id, name, email, hashed_password) "
+            "SELECT n, 'User ' || n, 'user' || n || '@example.com', 'x' FROM seq"
+        ),
+        {"users": users},
+    )
+    db.execute(
+        text(
+            "WITH RECURSIVE seq(n) AS "
+            "(SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < :rows - 1) "
+            "INSERT INTO products (name, fk_user, date_expire, price) "
+            f"SELECT 'Product ' || n, n % :users + 1, {expire}, n % 1000 FROM seq"
+        ),
+        {"rows": users * products, "users": users, "start": date.today().isoformat()},
+    )
+    db.commit()
+
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50 {statistics.median(samples):7.3f}ms  p99 {p99:7.3f}ms"
+
+
+def timed_pages(read, owners: list[int], order_by: str, limit: int):
+    first, second = [], []
+    for owner in owners:
+        start = time.perf_counter()
+        _, next_cursor, _ = read(owner, limit, None, order_by)
+        first.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        read(owner, limit, next_cursor, order_by)
+        second.append((time.perf_counter() - start) * 1000)
+    return first, second
+
+
+def main(
+    database_url: str, users: int, products: int, samples: int, limit: int
+) -> None:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    start = time.perf_counter()
+    seed(db, users, products)
+    total = db.query(func.count(Product.id)).scalar()
+    print(f"{total} products, seeded in {time.perf_counter() - start:.1f}s")
+
+    owners = random.Random(7).sample(range(1, users + 1), min(samples, users))
+    repo = ProductRepo(db)
+    cached = CachedAsyncProductRepo(db)
+    loop = asyncio.new_event_loop()
+
+    def read_cached(owner, page_size, cursor, order_by):
+        return loop.run_until_complete(
+            cached.list_products_page(owner, page_size, cursor, order_by)
+        )
+
+    for order_by, columns in PRODUCT_ORDERS.items():
+        statement = (
+            select(*PRODUCT_COLUMNS)
+            .where(Product.fk_user == owners[0])
+            .order_by(*columns)
+            .limit(limit + 1)
+        )
+        print(f"\norder_by={order_by}: {' / '.join(query_plan(db, statement))}")
+
+        first, second = timed_pages(repo.list_products_page, owners, order_by, limit)
+        print(f"  database  page 1  {percentiles(first)}")
+        print(f"  database  page 2  {percentiles(second)}")
+
+        timed_pages(read_cached, owners, order_by, limit)
+        first, second = timed_pages(read_cached, owners, order_by, limit)
+        print(f"  cached    page 1  {percentiles(first)}")
+        print(f"  cached    page 2  {percentiles(second)}")
+
+    print(f"\nlist cache: {product_list_cache.stats()}")
+    loop.close()
+    db.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="sqlite:///./bench_users.db")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    main(args.database_url, args.users, args.products, args.samples, args.limit)
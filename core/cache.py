@@ -0,0 +1,623 @@
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Iterable, Optional, Union
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+import secrets
+import threading
+import time
+
+
+def dump_entity(entity) -> dict:
+    """
+    The loaded column values of an entity, what the caches keep
+    """
+    return {
+        attr.key: getattr(entity, attr.key) for attr in entity.__mapper__.column_attrs
+    }
+
+
+def load_entity(model, columns: dict):
+    """
+    load_entity
+
+    Rebuild a detached entity from its column values. The instance is created
+    without calling the model __init__ (Product rejects past dates there) and the
+    values are set as committed, so the copy looks freshly loaded.
+
+    parameters:
+    - model: the mapped class
+    - columns (dict): the values given by dump_entity
+
+    return:
+    - the detached entity
+    """
+    entity = model.__mapper__.class_manager.new_instance()
+    for key, value in columns.items():
+        set_committed_value(entity, key, value)
+    make_transient_to_detached(entity)
+    return entity
+
+
+def encode_columns(columns: dict) -> bytes:
+    """
+    JSON of the column values, for the shared backend
+    """
+
+    def default(value):
+        if isinstance(value, Decimal):
+            return str(value)
+        return value.isoformat()
+
+    return json.dumps(columns, default=default, separators=(",", ":")).encode()
+
+
+def decode_columns(model, raw: bytes) -> dict:
+    """
+    Column values read from the shared backend, parsed back with the column types
+    """
+    columns = json.loads(raw)
+    for attr in model.__mapper__.column_attrs:
+        value = columns.get(attr.key)
+        if value is None:
+            continue
+        python_type = attr.columns[0].type.python_type
+        if python_type is Decimal:
+            columns[attr.key] = Decimal(value)
+        elif hasattr(python_type, "fromisoformat"):
+            columns[attr.key] = python_type.fromisoformat(value)
+    return columns
+
+
+class LRUCache:
+    """
+    Bounded in-process LRU, every entry expires `ttl` seconds after it's set
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedCacheBackend:
+    """
+    A cache shared by every process of the app, values are bytes. `blocking`
+    backends do network IO, so the async reads go through the threadpool and
+    the deletes on the event loop through SharedDeletes.
+    """
+
+    blocking = True
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, keys: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class FakeSharedBackend(SharedCacheBackend):
+    """
+    In-memory stand-in for the shared backend, used by the tests and with
+    CACHE_SHARED_URL=memory://
+    """
+
+    blocking = False
+
+    def __init__(self):
+        self._entries: dict[str, tuple[float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend(SharedCacheBackend):
+    """
+    Shared backend on Redis, the `redis` package is only needed when it's used
+    """
+
+    def __init__(self, url: str, prefix: str = "keeper:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "A redis:// CACHE_SHARED_URL needs `pip install redis`"
+            ) from exc
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        keys = [self.prefix + key for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+def shared_backend_for(url: Optional[str]) -> Optional[SharedCacheBackend]:
+    """
+    The shared backend configured by CACHE_SHARED_URL, None without one
+    """
+    if not url:
+        return None
+    if url == "memory://":
+        return FakeSharedBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CACHE_SHARED_URL '{url}'")
+
+
+class SharedDeletes:
+    """
+    The deletes of a blocking shared backend asked for on the event loop, like
+    the invalidations of the after_commit hook of an AsyncSession: they run in
+    the threadpool instead of blocking the loop. The response of the request
+    waits for them (SharedDeletesMiddleware), so its client never reads the
+    entries its write replaced. Off the loop they're done in place.
+    """
+
+    def __init__(self):
+        self._pending: set[asyncio.Task] = set()
+
+    def delete(self, shared: SharedCacheBackend, keys: list[str]) -> None:
+        if not shared.blocking:
+            shared.delete(keys)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            shared.delete(keys)
+            return
+        task = loop.create_task(run_in_threadpool(shared.delete, keys))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def wait(self) -> None:
+        """
+        wait for the deletes queued on the running loop
+        """
+        loop = asyncio.get_running_loop()
+        pending = [task for task in self._pending if task.get_loop() is loop]
+        if pending:
+            await asyncio.gather(*pending)
+
+
+shared_deletes = SharedDeletes()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent loads of the same key: the first caller runs the load,
+    the others wait for its result instead of hitting the database too.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls: dict[tuple[int, str], asyncio.Future] = {}
+
+    async def do(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+
+        future = self._calls.get(call_key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        self._calls[call_key] = future
+        try:
+            result = await load()
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # retrieved, even without waiters
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[call_key]
+
+
+class EntityCache:
+    """
+    Read-through cache of one model, in two levels: the in-process LRU and an
+    optional shared backend. The column values are cached, every read returns
+    its own detached copy.
+    """
+
+    def __init__(
+        self,
+        model,
+        keys: tuple[str, ...],
+        local: Optional[LRUCache] = None,
+        shared: Optional[SharedCacheBackend] = None,
+        shared_ttl: int = 300,
+        enabled: bool = True,
+    ):
+        self.model = model
+        self.keys = keys
+        self.name = model.__tablename__
+        self.local = local or LRUCache()
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.enabled = enabled
+        self.flight = SingleFlight()
+        # bumped by every invalidation, a load that started before one isn't cached
+        self.generation = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def key(self, attr: str, value: Any) -> str:
+        return f"{self.name}:{attr}:{value}"
+
+    def entity_keys(self, entity) -> set[str]:
+        """
+        the cache keys of an entity, with the previous values of changed keys
+        """
+        state = inspect(entity)
+        keys = set()
+        for attr in self.keys:
+            history = state.attrs[attr].history
+            for value in (*history.deleted, *history.unchanged, *history.added):
+                if value is not None:
+                    keys.add(self.key(attr, value))
+        return keys
+
+    async def read_through(
+        self, attr: str, value: Any, load: Callable[[], Awaitable[Any]]
+    ):
+        """
+        read_through
+
+        Return the cached entity, or load it once for all the concurrent callers
+        and cache it under every key.
+
+        parameters:
+        - attr (str): the key attribute, one of `keys`
+        - value: the looked up value
+        - load (Callable): coroutine function loading the entity from the database
+
+        return:
+        - a detached entity, None if it doesn't exist
+        """
+        if not self.enabled:
+            return await load()
+
+        key = self.key(attr, value)
+        columns = self.local.get(key)
+        if columns is not None:
+            self.hits += 1
+            return load_entity(self.model, columns)
+
+        if self.shared is not None:
+            if self.shared.blocking:
+                raw = await run_in_threadpool(self.shared.get, key)
+            else:
+                raw = self.shared.get(key)
+            if raw is not None:
+                self.shared_hits += 1
+                columns = decode_columns(self.model, raw)
+                self.local.set(key, columns)
+                return load_entity(self.model, columns)
+
+        self.misses += 1
+        columns = await self.flight.do(key, lambda: self._load(load))
+        return None if columns is None else load_entity(self.model, columns)
+
+    async def _load(self, load: Callable[[], Awaitable[Any]]) -> Optional[dict]:
+        generation = self.generation
+        entity = await load()
+        if entity is None:
+            return None
+
+        columns = dump_entity(entity)
+        keys = [self.key(attr, columns[attr]) for attr in self.keys]
+        with self._lock:
+            if generation != self.generation:
+                return columns
+            for key in keys:
+                self.local.set(key, columns)
+
+        if self.shared is not None:
+            raw = encode_columns(columns)
+            for key in keys:
+                if self.shared.blocking:
+                    await run_in_threadpool(self.shared.set, key, raw, self.shared_ttl)
+                else:
+                    self.shared.set(key, raw, self.shared_ttl)
+        return columns
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        """
+        drop keys from both levels, called once the write is committed
+        """
+        keys = list(keys)
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(keys)
+        self.local.delete(keys)
+        if self.shared is not None and keys:
+            shared_deletes.delete(self.shared, keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> dict:
+        reads = self.hits + self.shared_hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.flight.coalesced,
+            "invalidations": self.invalidations,
+            "size": len(self.local),
+            "hit_rate": (self.hits + self.shared_hits) / reads if reads else 0.0,
+        }
+
+
+def record_collection_writes(session, model, owners: Iterable[Any]) -> None:
+    """
+    record_collection_writes
+
+    Remember the owners whose collections of `model` a Core statement changed
+    (the session events only see the ORM unit of work). Their versions are
+    bumped once the session commits, and forgotten if it rolls back.
+
+    parameters:
+    - session (Session): the session running the statement
+    - model: the mapped class written to
+    - owners: the owners of the written rows
+    """
+    writes = session.info.setdefault("collection_writes", {})
+    writes.setdefault(model, set()).update(owners)
+
+
+class CollectionVersions:
+    """
+    The version of per-owner collections (the products of a user), changed
+    once a write to the collection is committed. Each owner has its own version
+    and the whole collection another one, changed by the writes to every owner.
+    Anything keyed on a version (the list cache pages, the ETags) is left
+    behind by the next write.
+
+    Without a shared backend the versions are counters of the process. With one
+    they're random tokens kept in the backend, so every process sees the writes
+    of the others: a write deletes the tokens and the next read sets new ones,
+    never reusing an older version.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        scope: str,
+        shared: Optional[SharedCacheBackend] = None,
+        shared_ttl: int = 300,
+    ):
+        self.name = name
+        self.scope = scope
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.owners: dict[Any, int] = {}
+        self.version = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def key(self, owner: Any = None) -> str:
+        if owner is None:
+            return f"{self.name}:version"
+        return f"{self.name}:version:{owner}"
+
+    async def get(self, owner: Any = None) -> Union[int, str]:
+        """
+        the version of an owner's collection, of the whole collection without one
+        """
+        if self.shared is None:
+            return self.version if owner is None else self.owners.get(owner, 0)
+        if self.shared.blocking:
+            return await run_in_threadpool(self._shared_version, self.key(owner))
+        return self._shared_version(self.key(owner))
+
+    def _shared_version(self, key: str) -> str:
+        raw = self.shared.get(key)
+        if raw is not None:
+            return raw.decode()
+        version = secrets.token_hex(8)
+        self.shared.set(key, version.encode(), self.shared_ttl)
+        return version
+
+    def entity_keys(self, entity) -> set:
+        """
+        the owners whose collections an entity belongs to, the previous owner
+        included when it changed
+        """
+        history = inspect(entity).attrs[self.scope].history
+        return {
+            value
+            for value in (*history.deleted, *history.unchanged, *history.added)
+            if value is not None
+        }
+
+    def invalidate(self, owners: Iterable[Any]) -> None:
+        """
+        bump the version of the owners, called once the write is committed
+        """
+        owners = list(owners)
+        with self._lock:
+            for owner in owners:
+                self.owners[owner] = self.owners.get(owner, 0) + 1
+                self.version += 1
+                self.invalidations += 1
+        if self.shared is not None and owners:
+            keys = [self.key(), *(self.key(owner) for owner in owners)]
+            shared_deletes.delete(self.shared, keys)
+
+    def stats(self) -> dict:
+        return {"invalidations": self.invalidations, "owners": len(self.owners)}
+
+
+class ListCache:
+    """
+    Read-through cache of the pages of per-owner collections (the products of a
+    user), in the in-process LRU. The version of the owner is part of the page
+    keys (CollectionVersions): a write bumps it, and the pages of the older
+    version are never read again and age out of the LRU. Without a shared
+    backend for the versions, other processes see the write once their copy
+    expires (CACHE_TTL_SECONDS).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        scope: str,
+        local: Optional[LRUCache] = None,
+        shared: Optional[SharedCacheBackend] = None,
+        shared_ttl: int = 300,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.scope = scope
+        self.local = local or LRUCache()
+        self.enabled = enabled
+        self.flight = SingleFlight()
+        self.versions = CollectionVersions(name, scope, shared, shared_ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, owner: Any, version: Union[int, str], params: tuple) -> str:
+        return f"{self.name}:{owner}:{version}:{params!r}"
+
+    def entity_keys(self, entity) -> set:
+        return self.versions.entity_keys(entity)
+
+    async def read_through(
+        self, owner: Any, params: tuple, load: Callable[[], Awaitable[Any]]
+    ):
+        """
+        read_through
+
+        Return the cached page, or load it once for all the concurrent callers.
+        A load racing a write is cached under the version it started with, which
+        the write made unreachable.
+
+        parameters:
+        - owner: the owner of the collection
+        - params (tuple): what selects the page (size, cursor, order)
+        - load (Callable): coroutine function loading the page from the database
+
+        return:
+        - the page, shared by the callers, so it must not be changed
+        """
+        if not self.enabled:
+            return await load()
+
+        key = self.key(owner, await self.versions.get(owner), params)
+        page = self.local.get(key)
+        if page is not None:
+            self.hits += 1
+            return page
+
+        self.misses += 1
+        return await self.flight.do(key, lambda: self._load(key, load))
+
+    async def _load(self, key: str, load: Callable[[], Awaitable[Any]]):
+        page = await load()
+        self.local.set(key, page)
+        return page
+
+    def invalidate(self, owners: Iterable[Any]) -> None:
+        """
+        bump the version of the owners, called once the write is committed
+        """
+        self.versions.invalidate(owners)
+
+    def clear(self) -> None:
+        # the versions are kept: what was keyed on them must stay unreachable
+        self.local.clear()
+
+    def stats(self) -> dict:
+        reads = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.flight.coalesced,
+            "invalidations": self.versions.invalidations,
+            "size": len(self.local),
+            "hit_rate": self.hits / reads if reads else 0.0,
+        }
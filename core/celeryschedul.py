@@ -0,0 +1,22 @@
+from celery import Celery
+from core.config import get_settings
+
+settings = get_settings()
+
+celery_app = Celery(
+    "keeper",
+    broker=settings.CELERY_BROKER_URL,
+    include=["tasks.alert", "tasks.summary"],
+)
+
+celery_app.conf.update(
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    task_ignore_result=True,
+    timezone="UTC",
+    beat_schedule={
+        "scan-expiring-products": {
+            "task": "tasks.alert.scan_expiring_products",
+            "schedule": settings.ALERT_SCAN_INTERVAL_SECONDS,
+        },
+    },
+)
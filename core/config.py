@@ -1,5 +1,7 @@
+from pydantic import field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -16,21 +18,143 @@ class Settings(BaseSettings):
     HOST: str
     PORT: int
     RELOAD: bool  # Remove this if you deploy
+    WORKERS: int = 1  # uvicorn worker processes, each one has its own pools
 
     # Database config
     DATABASE_URL: str
+    DATABASE_ASYNC: bool = False  # AsyncSession over asyncpg/aiosqlite
+
+    # Connection pool config, per worker process
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30  # checkout wait before answering 503
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # -1 keeps connections forever
+    DB_POOL_PRE_PING: bool = True  # a round trip on every checkout
+    DB_MAX_CONNECTIONS: Optional[int] = None  # budget split between the WORKERS
+    DB_EXTERNAL_POOLER: bool = False  # PgBouncer: NullPool, no statement cache
 
     # Database for tests
     DATABASE_URL_TEST: str
 
+    # Pagination config
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 100
+    BATCH_GET_MAX_IDS: int = 500  # ids per batch get, fetched with one IN query
+
+    # Read-through cache config
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 10000  # entities kept per process and per table
+    CACHE_TTL_SECONDS: int = 30  # bounds the staleness left by other processes
+    CACHE_SHARED_URL: Optional[str] = None  # redis://... or memory:// for the fake
+    CACHE_SHARED_TTL_SECONDS: int = 300
+
+    # HTTP caching config, ETags and Cache-Control of the GET responses
+    ETAG_ENABLED: bool = True
+    CACHE_CONTROL_PRODUCTS: str = "private, no-cache"  # revalidate every time
+    CACHE_CONTROL_USERS: str = "no-cache"
+
+    # Product search config
+    SEARCH_FUZZY_THRESHOLD: float = 0.3  # minimum trigram similarity
+    SEARCH_MAX_OFFSET: int = 1000  # ranked results can't be keyset paginated
+
+    # User summary config
+    SUMMARY_HORIZON_DAYS: int = 7  # default window of the value expiring soon
+
+    # Bulk import config
+    BULK_CHUNK_SIZE: int = 500  # rows per INSERT and per transaction
+    BULK_MAX_REPORTED_ERRORS: int = 1000  # failed rows listed in the response
+    EXPORT_BATCH_SIZE: int = 1000  # rows fetched and written per batch
+
+    # Idempotency-Key config, the responses kept per process for the retries
+    IDEMPOTENCY_MAX_KEYS: int = 10_000
+    IDEMPOTENCY_TTL_SECONDS: int = 86_400
+
+    # Budget planner config
+    BUDGET_DP_MAX_CELLS: int = 20_000_000  # items x budget cents in exact mode
+
+    # Expiry alerts config
+    ALERT_HORIZON_DAYS: int = 3  # products expiring up to N days ahead
+    ALERT_BATCH_SIZE: int = 1000
+    ALERT_WATERMARK_OVERLAP_SECONDS: int = 60  # rescan in-flight updates
+    ALERT_SCAN_INTERVAL_SECONDS: int = 3600
+
+    # Celery config, memory:// runs without a broker
+    CELERY_BROKER_URL: str = "memory://"
+    CELERY_TASK_ALWAYS_EAGER: bool = False
+
     # JWT config
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_SIZE: int = 10000  # verified tokens kept in memory
+
+    # Password hashing pool config
+    HASH_POOL_KIND: str = "thread"  # "thread" or "process"
+    HASH_POOL_WORKERS: int = 4
+    HASH_POOL_MAX_QUEUE: int = 32  # waiting calls before answering 503
+
+    # Rate limiting config, token buckets per client IP and per login email
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_URL: Optional[str] = None  # redis://... or memory:// to share them
+    RATE_LIMIT_SHARDS: int = 64  # in-process buckets, one lock per shard
+    RATE_LIMIT_MAX_KEYS: int = 100_000  # in-process buckets kept, LRU first out
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # client IP from X-Forwarded-For
+    RATE_LIMIT_TRUSTED_PROXIES: int = 1  # X-Forwarded-For addresses appended by them
+    RATE_LIMIT_IP_PER_SECOND: float = 50  # every request
+    RATE_LIMIT_IP_BURST: int = 200
+    LOGIN_LIMIT_IP_PER_MINUTE: float = 30  # login attempts
+    LOGIN_LIMIT_IP_BURST: int = 20
+    LOGIN_LIMIT_EMAIL_PER_MINUTE: float = 5
+    LOGIN_LIMIT_EMAIL_BURST: int = 5
+
+    # Metrics config
+    METRICS_ENABLED: bool = True  # request metrics middleware and /metrics
+
+    # SQL profiler config
+    SQL_PROFILE: bool = False  # X-DB-Queries/Server-Timing headers, N+1 warnings
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5  # same statement this many times per request
+    SQL_SLOW_QUERY_MS: float = 0  # log slower queries with their params, 0 is off
 
     # CORS config
     ALLOWED_ORIGINS: list[str] = ["*"]
 
+    @field_validator("WORKERS")
+    @classmethod
+    def at_least_one_worker(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("must be at least 1")
+        return value
+
+    @model_validator(mode="after")
+    def connection_budget_per_worker(self) -> "Settings":
+        # every worker needs a connection, a smaller budget can't be kept
+        if (
+            self.DB_MAX_CONNECTIONS is not None
+            and self.DB_MAX_CONNECTIONS < self.WORKERS
+        ):
+            raise ValueError("DB_MAX_CONNECTIONS must be at least WORKERS")
+        return self
+
+    @field_validator("RATE_LIMIT_TRUSTED_PROXIES")
+    @classmethod
+    def at_least_one_proxy(cls, value: int) -> int:
+        # with 0 the client would pick the address it's limited on
+        if value < 1:
+            raise ValueError("must be at least 1, set RATE_LIMIT_TRUST_FORWARDED=False")
+        return value
+
+    @field_validator(
+        "RATE_LIMIT_IP_PER_SECOND",
+        "LOGIN_LIMIT_IP_PER_MINUTE",
+        "LOGIN_LIMIT_EMAIL_PER_MINUTE",
+    )
+    @classmethod
+    def positive_rate(cls, value: float) -> float:
+        # a bucket never refilled would wait forever, turn the limiter off instead
+        if value <= 0:
+            raise ValueError("must be positive, set RATE_LIMIT_ENABLED=False instead")
+        return value
+
 
 @lru_cache
 def get_settings():
@@ -0,0 +1,84 @@
+from typing import Any, Awaitable, Callable, Hashable, Iterable, List, Mapping
+import asyncio
+
+
+class DataLoader:
+    """
+    Coalesce the lookups by key of one request. The keys asked for while the
+    event loop runs the other lookups (e.g. under asyncio.gather) are fetched
+    together by one `batch_load` call, and a key asked for twice is fetched
+    once: a list of N references costs one IN query instead of N.
+
+    A loader belongs to one request and one event loop, its results are kept
+    until it's dropped. The batches run one after the other, so a loader never
+    uses its session concurrently.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[List[Hashable]], Awaitable[Mapping[Hashable, Any]]],
+        max_batch_size: int = 500,
+    ):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self._futures: dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        self._lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    def load(self, key: Hashable) -> Awaitable[Any]:
+        """
+        load
+
+        The value of a key, fetched with the other keys asked for in the same
+        iteration of the event loop.
+
+        parameters:
+        - key: the key, e.g. a primary key
+
+        return:
+        - awaitable of the value, None when batch_load didn't return the key
+        """
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        """
+        the values of the keys in their order, fetched together
+        """
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._run(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, keys: List[Hashable]) -> None:
+        async with self._lock:
+            await self._run_batches(keys)
+
+    async def _run_batches(self, keys: List[Hashable]) -> None:
+        for start in range(0, len(keys), self.max_batch_size):
+            batch = keys[start : start + self.max_batch_size]
+            self.batches += 1
+            try:
+                values = await self.batch_load(batch)
+            except Exception as exc:
+                for key in batch:
+                    future = self._futures.pop(key)
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            for key in batch:
+                future = self._futures[key]
+                if not future.done():
+                    future.set_result(values.get(key))
@@ -1,12 +1,299 @@
-from sqlalchemy import create_engine
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Callable, Optional, Union
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from core.config import get_settings
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from core.config import Settings, get_settings
+import threading
+import time
 
 settings = get_settings()
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+# async drivers used when DATABASE_ASYNC is enabled
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(database_url: str) -> str:
+    """
+    to_async_url
+
+    Translate a sync database url to the matching async driver url.
+
+    parameters:
+    - database_url (str): the url used by the sync engine
+
+    return:
+    - the url with the async driver, unchanged if it already has one
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if url.drivername in ASYNC_DRIVERS.values():
+        return database_url
+
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}'")
+
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(
+        hide_password=False
+    )
+
+
+def connect_args_for(database_url: str) -> dict:
+    """
+    SQLite connections are used by the threadpool, so they can't be bound
+    to the thread that opened them.
+    """
+    return {"check_same_thread": False} if "sqlite" in database_url else {}
+
+
+def is_memory_database(database_url: str) -> bool:
+    """
+    An SQLite in-memory database lives as long as its connection, it can't be
+    pooled like a file.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        return False
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+@dataclass
+class PoolStats:
+    """
+    Checkout counters of a connection pool, all the times are in seconds
+    """
+
+    checkouts: int = 0
+    timeouts: int = 0
+    waiting: int = 0
+    in_use: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class TimedPoolMixin:
+    """
+    Measures how long every checkout waits for a connection. It wraps `_do_get`,
+    the pool method that blocks when all the connections are in use, since the
+    pool events only fire once a connection is given.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        with self._stats_lock:
+            self.stats.waiting += 1
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.stats.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            with self._stats_lock:
+                self.stats.waiting -= 1
+                self.stats.total_wait += wait
+                self.stats.max_wait = max(self.stats.max_wait, wait)
+
+        with self._stats_lock:
+            self.stats.checkouts += 1
+            self.stats.in_use = self.checkedout()
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        with self._stats_lock:
+            self.stats.in_use = self.checkedout()
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_sizing(config: Settings) -> tuple[int, int]:
+    """
+    pool_sizing
+
+    The pool size and overflow of one worker. With DB_MAX_CONNECTIONS the
+    connection budget is split between the WORKERS processes, so they can't
+    open more connections than the database accepts together (the settings
+    reject a budget smaller than WORKERS).
+
+    parameters:
+    - config (Settings): the settings
+
+    return:
+    - (pool_size, max_overflow)
+    """
+    size, overflow = config.DB_POOL_SIZE, config.DB_POOL_MAX_OVERFLOW
+    if config.DB_MAX_CONNECTIONS is not None:
+        per_worker = config.DB_MAX_CONNECTIONS // config.WORKERS
+        size = min(size, per_worker)
+        overflow = min(overflow, per_worker - size)
+    return size, overflow
+
+
+def engine_options(database_url: str, config: Settings, is_async: bool = False) -> dict:
+    """
+    engine_options
+
+    The create_engine arguments for the pool settings. An SQLite in-memory
+    database keeps the pool of its dialect (SingletonThreadPool, StaticPool
+    with aiosqlite), a queue pool would open a new empty database per
+    connection.
+
+    parameters:
+    - database_url (str): the url of the engine
+    - config (Settings): the settings
+    - is_async (bool): options for create_async_engine
+
+    return:
+    - dict of engine keyword arguments
+    """
+    connect_args = connect_args_for(database_url)
+
+    if config.DB_EXTERNAL_POOLER:
+        # PgBouncer in transaction mode pools the connections and a server
+        # connection can change between statements, so no prepared statements
+        if is_async and make_url(database_url).get_backend_name() == "postgresql":
+            connect_args = {
+                **connect_args,
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+            }
+        return {
+            "poolclass": NullPool,
+            "connect_args": connect_args,
+            "pool_pre_ping": False,
+        }
+
+    if is_memory_database(database_url):
+        return {"connect_args": connect_args}
+
+    size, overflow = pool_sizing(config)
+    return {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": size,
+        "max_overflow": overflow,
+        "pool_timeout": config.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": config.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+engine = create_engine(
+    settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, settings)
+)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.DATABASE_ASYNC:
+    async_url = to_async_url(settings.DATABASE_URL)
+    async_engine = create_async_engine(
+        async_url, **engine_options(async_url, settings, is_async=True)
+    )
+
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
 Base = declarative_base()
+
+
+async def run_in_session(
+    db: Union[Session, AsyncSession], fn: Callable[..., Any], *args: Any
+) -> Any:
+    """
+    run_in_session
+
+    Run a sync function that receives a Session without blocking the event loop.
+    With an AsyncSession the function runs through run_sync, so the IO is awaited
+    by the async driver. With a sync Session the function runs in the threadpool.
+
+    parameters:
+    - db (Session | AsyncSession): the session given by get_db
+    - fn (Callable): function called as fn(session, *args)
+
+    return:
+    - the fn result
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+
+@asynccontextmanager
+async def open_session() -> AsyncIterator[Union[Session, AsyncSession]]:
+    """
+    open_session
+
+    A session of the configured kind for work that outlives the request
+    dependencies, like a streamed response body: the `get_db` session is
+    closed before the body is sent.
+
+    return:
+    - AsyncSession when DATABASE_ASYNC is enabled, a sync Session otherwise
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        await run_in_threadpool(session.close)
+
+
+def engine_pool_stats(bind) -> Optional[dict]:
+    """
+    The checkout counters of an engine pool, with its current size. None for
+    a pool without counters (NullPool).
+    """
+    if bind is None:
+        return None
+    pool = bind.sync_engine.pool if hasattr(bind, "sync_engine") else bind.pool
+    if not isinstance(pool, TimedPoolMixin):
+        return None
+    with pool._stats_lock:
+        stats = asdict(pool.stats)
+    stats["in_use"] = pool.checkedout()
+    stats["size"] = pool.size()
+    stats["overflow"] = max(0, pool.overflow())
+    return stats
+
+
+def pool_stats() -> dict:
+    """
+    The pool counters of the sync and the async engines
+    """
+    return {
+        "sync": engine_pool_stats(engine),
+        "async": engine_pool_stats(async_engine),
+    }
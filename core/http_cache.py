@@ -0,0 +1,137 @@
+from typing import Awaitable, Callable, Optional
+from fastapi import Request, Response
+from core.cache import LRUCache
+from core.config import Settings, get_settings
+import hashlib
+
+settings = get_settings()
+
+
+def strong_etag(body: bytes) -> str:
+    """
+    the ETag of a response body, the same bytes give the same tag in every
+    process
+    """
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    etag_matches
+
+    Whether an If-None-Match header names the ETag. The comparison is the weak
+    one of RFC 9110, a W/ tag matches its strong twin.
+
+    parameters:
+    - if_none_match (str): the header value, a list of tags or `*`
+    - etag (str): the ETag of the current response
+
+    return:
+    - True when the client's copy is the current one
+    """
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class ETagCache:
+    """
+    The ETags of the GET responses, by the collection versions they were built
+    from. A conditional GET whose version has a known ETag answers 304 without
+    loading or serializing anything; a write bumps the version and leaves the
+    tag behind. The tags are kept in the in-process LRU, so the versions must
+    see the writes of every process: without shared versions the cache is
+    disabled (etag_memo_enabled), and every response is built and hashed.
+    """
+
+    def __init__(self, local: Optional[LRUCache] = None, enabled: bool = True):
+        self.local = local or LRUCache()
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    async def respond(
+        self,
+        request: Request,
+        key: tuple,
+        build: Callable[[], Awaitable[Response]],
+        cache_control: str,
+        vary: Optional[str] = None,
+    ) -> Response:
+        """
+        respond
+
+        The response of a GET, or 304 Not Modified when the If-None-Match of
+        the request names its ETag. `key` must hold the versions of what the
+        response is built from, read before building it: a response racing a
+        write is then tagged under the version the write left behind.
+
+        parameters:
+        - request (Request): the request
+        - key (tuple): what selects the response, its collection versions included
+        - build (Callable): coroutine function building the response, with a body
+        - cache_control (str): the Cache-Control of the response
+        - vary (str): the request headers the response depends on
+
+        return:
+        - the response with its ETag, or an empty 304
+        """
+        headers = {"Cache-Control": cache_control}
+        if vary:
+            headers["Vary"] = vary
+        if not settings.ETAG_ENABLED:
+            response = await build()
+            response.headers.update(headers)
+            return response
+
+        if_none_match = request.headers.get("if-none-match")
+        cache_key = repr(key)
+        etag = self.local.get(cache_key) if self.enabled else None
+        if etag is not None:
+            self.hits += 1
+            if etag_matches(if_none_match, etag):
+                return self._not_modified(etag, headers)
+        else:
+            self.misses += 1
+
+        response = await build()
+        etag = strong_etag(response.body)
+        if self.enabled:
+            self.local.set(cache_key, etag)
+        if etag_matches(if_none_match, etag):
+            return self._not_modified(etag, headers)
+        response.headers.update({**headers, "ETag": etag})
+        return response
+
+    def _not_modified(self, etag: str, headers: dict) -> Response:
+        self.not_modified += 1
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "size": len(self.local),
+        }
+
+
+def etag_memo_enabled(config: Settings) -> bool:
+    """
+    Whether the ETags can be remembered: only the versions kept in the shared
+    backend see the writes of every worker. The number of processes isn't
+    known here (WORKERS doesn't follow `uvicorn --workers`), a single process
+    sets CACHE_SHARED_URL=memory:// to keep its tags.
+    """
+    return config.CACHE_ENABLED and bool(config.CACHE_SHARED_URL)
+
+
+etag_cache = ETagCache(
+    LRUCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS),
+    enabled=etag_memo_enabled(settings),
+)
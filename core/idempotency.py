@@ -0,0 +1,92 @@
+from typing import Any, Awaitable, Callable, Tuple
+from core.cache import LRUCache, SingleFlight
+from core.config import get_settings
+import hashlib
+
+settings = get_settings()
+
+
+class IdempotencyKeyReused(Exception):
+    """
+    Raised when an Idempotency-Key comes back with another request body
+    """
+
+    def __init__(self):
+        super().__init__("Idempotency-Key already used with another request")
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """
+    the digest of what identifies a request, e.g. its path and its body
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """
+    The responses of the requests sent with an Idempotency-Key, so a retried
+    request gets the first response back without running again. The store is
+    a bounded LRU (`max_entries` keys, each kept `ttl` seconds); concurrent
+    requests with the same key wait for the first one instead of running
+    too. Failed requests aren't kept, their retry runs again.
+
+    It lives in each process: a retry reaching another worker runs again, the
+    unique (fk_user, name, date_expire) index keeps it from duplicating data.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 86_400):
+        self.responses = LRUCache(max_entries, ttl)
+        self.flight = SingleFlight()
+        self.replays = 0
+
+    async def run(
+        self, key: str, fingerprint: str, respond: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        run
+
+        The response of the request with `key`, produced once.
+
+        parameters:
+        - key (str): the Idempotency-Key, scoped to its user
+        - fingerprint (str): the request_fingerprint of the request
+        - respond (Callable): produces the response when it isn't stored
+
+        return:
+        - (the response, True if it's a replay of a stored response)
+
+        raises:
+        - IdempotencyKeyReused: if the key was used by another request
+        """
+        produced = False
+
+        async def load():
+            nonlocal produced
+            stored = self.responses.get(key)
+            if stored is None:
+                produced = True
+                stored = (fingerprint, await respond())
+                self.responses.set(key, stored)
+            return stored
+
+        stored_fingerprint, response = await self.flight.do(key, load)
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyKeyReused()
+        if not produced:
+            self.replays += 1
+        return response, not produced
+
+    def clear(self) -> None:
+        self.responses.clear()
+
+    def stats(self) -> dict:
+        return {"keys": len(self.responses), "replays": self.replays}
+
+
+idempotency_store = IdempotencyStore(
+    settings.IDEMPOTENCY_MAX_KEYS, settings.IDEMPOTENCY_TTL_SECONDS
+)
@@ -0,0 +1,228 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Iterable, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import time
+
+# request latency buckets, in seconds
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# queries per request buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """
+    Cumulative histogram in Prometheus buckets. It's only updated from the event
+    loop thread, so the counters need no lock.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """
+        the (le, count) bucket lines, +Inf last
+        """
+        lines, total = [], 0
+        for bound, count in zip((*self.bounds, "+Inf"), self.counts):
+            total += count
+            lines.append((str(bound), total))
+        return lines
+
+
+class RequestDBStats:
+    """
+    Queries run while serving one request
+    """
+
+    __slots__ = ("queries", "duration")
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+
+# set by the metrics middleware for the request being served, the threadpool
+# and the AsyncSession greenlets inherit it
+request_db_stats: ContextVar[Optional[RequestDBStats]] = ContextVar(
+    "request_db_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and request_db_stats.get() is not None:
+        context._metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    stats = request_db_stats.get()
+    start = getattr(context, "_metrics_start", None)
+    if stats is not None and start is not None:
+        stats.queries += 1
+        stats.duration += time.perf_counter() - start
+
+
+class Registry:
+    """
+    The request metrics of the process, labelled by route template, method and
+    status. Route templates (not raw paths) keep the label sets bounded.
+    """
+
+    def __init__(self):
+        self.latency: dict[tuple[str, str, str], Histogram] = {}
+        self.db_queries: dict[str, Histogram] = {}
+        self.db_duration: dict[str, Histogram] = {}
+        self.in_flight: dict[str, int] = {}
+
+    def started(self, method: str) -> None:
+        self.in_flight[method] = self.in_flight.get(method, 0) + 1
+
+    def finished(
+        self,
+        route: str,
+        method: str,
+        status: int,
+        duration: float,
+        db: RequestDBStats,
+    ) -> None:
+        self.in_flight[method] -= 1
+
+        key = (route, method, str(status))
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(duration)
+
+        queries = self.db_queries.get(route)
+        if queries is None:
+            queries = self.db_queries[route] = Histogram(QUERY_COUNT_BUCKETS)
+            self.db_duration[route] = Histogram(LATENCY_BUCKETS)
+        queries.observe(db.queries)
+        self.db_duration[route].observe(db.duration)
+
+    def clear(self) -> None:
+        self.latency.clear()
+        self.db_queries.clear()
+        self.db_duration.clear()
+        self.in_flight.clear()
+
+
+registry = Registry()
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{key}="{escape_label(value)}"' for key, value in labels.items())
+    return "{" + ",".join(pairs) + "}"
+
+
+def render_histogram(
+    name: str, help_text: str, histograms: Iterable[tuple[dict, Histogram]]
+) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in histograms:
+        for le, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{format_labels({**labels, 'le': le})} {count}")
+        lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    return lines
+
+
+def render_stats(
+    prefix: str,
+    samples: Iterable[tuple[dict, Optional[dict]]],
+    counters: Iterable[str] = (),
+) -> list[str]:
+    """
+    render_stats
+
+    Render stats dicts (hashing pool, caches, connection pools) as metrics.
+
+    parameters:
+    - prefix (str): the metric name prefix
+    - samples (Iterable): (labels, stats) pairs, the stats being numeric values
+      by name; None stats are skipped
+    - counters (Iterable[str]): the names that only grow, rendered as `_total`
+
+    return:
+    - the exposition lines
+    """
+    counters = set(counters)
+    families: dict[str, list[str]] = {}
+    for labels, stats in samples:
+        for key, value in (stats or {}).items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in counters:
+                name, kind = f"{prefix}_{key}_total", "counter"
+            else:
+                name, kind = f"{prefix}_{key}", "gauge"
+            lines = families.setdefault(name, [f"# TYPE {name} {kind}"])
+            lines.append(f"{name}{format_labels(labels)} {float(value)}")
+    return [line for lines in families.values() for line in lines]
+
+
+def render_requests(metrics: Registry) -> list[str]:
+    """
+    the request metrics of a registry in the Prometheus text format
+    """
+    lines = render_histogram(
+        "keeper_http_request_duration_seconds",
+        "Request latency by route, method and status.",
+        (
+            ({"route": route, "method": method, "status": status}, histogram)
+            for (route, method, status), histogram in sorted(metrics.latency.items())
+        ),
+    )
+    lines += [
+        "# HELP keeper_http_requests_in_flight Requests being served.",
+        "# TYPE keeper_http_requests_in_flight gauge",
+    ]
+    lines += [
+        f"keeper_http_requests_in_flight{format_labels({'method': method})} {count}"
+        for method, count in sorted(metrics.in_flight.items())
+    ]
+    lines += render_histogram(
+        "keeper_db_queries_per_request",
+        "Database queries run by a request, by route.",
+        (({"route": route}, h) for route, h in sorted(metrics.db_queries.items())),
+    )
+    lines += render_histogram(
+        "keeper_db_duration_seconds",
+        "Time a request spent in database queries, by route.",
+        (({"route": route}, h) for route, h in sorted(metrics.db_duration.items())),
+    )
+    return lines
@@ -0,0 +1,142 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from core.config import get_settings
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class QueryLog:
+    """
+    The statements run while profiling a request or a block of code. The
+    statements are kept with their placeholders, so the same query run for
+    every row of a list (an N+1) shows up as one repeated statement.
+    """
+
+    def __init__(self):
+        self.statements: Counter[str] = Counter()
+        self.count = 0
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float) -> None:
+        with self._lock:
+            self.statements[statement] += 1
+            self.count += 1
+            self.duration += duration
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        the statements run at least `threshold` times, most repeated first
+        """
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+# the profile of the request being served, set by QueryProfilerMiddleware
+request_profile: ContextVar[Optional[QueryLog]] = ContextVar(
+    "request_profile", default=None
+)
+
+# profiles opened by capture_queries, they see the statements of every thread
+_captures: list[QueryLog] = []
+
+
+def profiling() -> bool:
+    return bool(_captures) or request_profile.get() is not None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _profile_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and (profiling() or settings.SQL_SLOW_QUERY_MS > 0):
+        context._profile_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _profile_finished(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_profile_start", None)
+    if start is None:
+        return
+    duration = time.perf_counter() - start
+
+    for log in list(_captures):
+        log.record(statement, duration)
+    profile = request_profile.get()
+    if profile is not None:
+        profile.record(statement, duration)
+
+    if 0 < settings.SQL_SLOW_QUERY_MS <= duration * 1000:
+        logger.warning(
+            "slow query %.1fms: %s params=%.500r",
+            duration * 1000,
+            " ".join(statement.split()),
+            parameters,
+        )
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryLog]:
+    """
+    capture_queries
+
+    Record every statement run inside the block, whatever the thread running
+    it (the TestClient serves the app from its own thread).
+
+    return:
+    - the QueryLog, filled when the block ends
+    """
+    log = QueryLog()
+    _captures.append(log)
+    try:
+        yield log
+    finally:
+        _captures.remove(log)
+
+
+@contextmanager
+def query_budget(
+    max_queries: int, max_repeats: Optional[int] = None
+) -> Iterator[QueryLog]:
+    """
+    query_budget
+
+    Fail when the block runs more statements than its budget, or repeats a
+    statement like an N+1 would.
+
+    parameters:
+    - max_queries (int): the statements allowed
+    - max_repeats (int): the times a statement may run, SQL_N_PLUS_ONE_THRESHOLD
+      minus one by default
+
+    raises:
+    - AssertionError: listing the statements when the budget is exceeded
+    """
+    if max_repeats is None:
+        max_repeats = settings.SQL_N_PLUS_ONE_THRESHOLD - 1
+
+    with capture_queries() as log:
+        yield log
+
+    problems = []
+    if log.count > max_queries:
+        problems.append(f"{log.count} queries, the budget is {max_queries}")
+    for statement, count in log.repeated(max_repeats + 1):
+        problems.append(f"N+1: ran {count} times: {' '.join(statement.split())}")
+
+    if problems:
+        statements = "\n".join(
+            f"  {count}x {' '.join(statement.split())}"
+            for statement, count in log.statements.most_common()
+        )
+        raise AssertionError("\n".join(problems) + "\nstatements:\n" + statements)
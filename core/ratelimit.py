@@ -0,0 +1,301 @@
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Optional
+from core.config import get_settings
+from starlette.concurrency import run_in_threadpool
+import threading
+import time
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    A token bucket rule: `burst` requests at once, refilled at `rate` per second
+    """
+
+    name: str
+    rate: float
+    burst: int
+
+    def __post_init__(self):
+        if self.rate <= 0:
+            raise ValueError(f"The rate of the '{self.name}' limit must be positive")
+
+    @classmethod
+    def per_minute(cls, name: str, count: float, burst: int) -> "RateLimit":
+        return cls(name, count / 60, burst)
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a bucket is empty, the API answers 429 with Retry-After
+    """
+
+    def __init__(self, limit: RateLimit, retry_after: float):
+        super().__init__(f"Too many requests, try again in {retry_after:.0f}s")
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def refill(
+    tokens: float, updated_at: float, now: float, rate: float, burst: int
+) -> float:
+    """
+    the tokens of a bucket at `now`, capped to the burst
+    """
+    return min(burst, tokens + (now - updated_at) * rate)
+
+
+class BucketStore:
+    """
+    Where the buckets live. `take` is atomic per key: it refills the bucket,
+    takes `cost` tokens when there are enough and returns 0, or returns the
+    seconds until there will be. `blocking` stores do network IO, so the async
+    checks go through the threadpool.
+    """
+
+    blocking = False
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class ShardedBucketStore(BucketStore):
+    """
+    In-process buckets, split in shards with a lock each so concurrent
+    requests on different keys rarely wait on each other. A bucket is two
+    floats; a key never seen is a full bucket, found missing in one dict
+    lookup. Each shard keeps at most max_keys / shards buckets and drops the
+    least recently used first: a dropped bucket comes back full, so the bound
+    should stay well above the number of keys limited at once.
+    """
+
+    def __init__(self, shards: int = 64, max_keys: int = 100_000):
+        self.shards = [OrderedDict() for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.max_per_shard = max(1, max_keys // shards)
+        self.evictions = 0
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        index = hash(key) % len(self.shards)
+        buckets = self.shards[index]
+        now = time.monotonic()
+        with self.locks[index]:
+            bucket = buckets.get(key)
+            if bucket is None:
+                tokens = burst
+                if len(buckets) >= self.max_per_shard:
+                    buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                tokens = refill(bucket[0], bucket[1], now, rate, burst)
+                buckets.move_to_end(key)
+
+            if tokens >= cost:
+                buckets[key] = (tokens - cost, now)
+                return 0.0
+            buckets[key] = (tokens, now)
+            return (cost - tokens) / rate
+
+    def clear(self) -> None:
+        for lock, buckets in zip(self.locks, self.shards):
+            with lock:
+                buckets.clear()
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets in self.shards)
+
+
+class FakeSharedBucketStore(BucketStore):
+    """
+    In-memory stand-in for the shared store, used by the tests and with
+    RATE_LIMIT_URL=memory://. Like Redis, an idle bucket expires once it would
+    be full again.
+    """
+
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket[2] <= now:
+                tokens = burst
+            else:
+                tokens = refill(bucket[0], bucket[1], now, rate, burst)
+
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return 0.0 if allowed else (cost - tokens) / rate
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+# refill and take in one round trip, with the Redis clock so every process
+# agrees on the time. Returns the retry delay in milliseconds, 0 if allowed.
+TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(bucket[1]) or burst
+if bucket[2] then
+  tokens = math.min(burst, tokens + (now - tonumber(bucket[2])) * rate)
+end
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  retry = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return retry
+"""
+
+
+class RedisBucketStore(BucketStore):
+    """
+    Buckets shared by every process on Redis, the `redis` package is only
+    needed when it's used. Each check is one blocking round trip (a Lua script
+    refilling and taking atomically), so Redis should be next to the workers.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "keeper:ratelimit:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "A redis:// RATE_LIMIT_URL needs `pip install redis`"
+            ) from exc
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        return self.script(keys=[self.prefix + key], args=[rate, burst, cost]) / 1000
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+def bucket_store_for(url: Optional[str]) -> BucketStore:
+    """
+    The bucket store configured by RATE_LIMIT_URL, in-process without one
+    """
+    if not url:
+        return ShardedBucketStore(
+            settings.RATE_LIMIT_SHARDS, settings.RATE_LIMIT_MAX_KEYS
+        )
+    if url == "memory://":
+        return FakeSharedBucketStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBucketStore(url)
+    raise ValueError(f"Unsupported RATE_LIMIT_URL '{url}'")
+
+
+class RateLimiter:
+    """
+    Checks the token buckets of the requests, one bucket per rule and key
+    """
+
+    def __init__(self, store: BucketStore, enabled: bool = True):
+        self.store = store
+        self.enabled = enabled
+        self.allowed = 0
+        self.rejected = 0
+
+    def check(self, limit: RateLimit, key: str, cost: float = 1) -> None:
+        """
+        check
+
+        Take from the bucket of `key` under `limit`.
+
+        parameters:
+        - limit (RateLimit): the rule
+        - key (str): what's limited, e.g. the client IP or the email
+        - cost (float): the tokens taken
+
+        raises:
+        - RateLimitExceeded: if the bucket is empty
+        """
+        if not self.enabled:
+            return
+        self._count(
+            limit,
+            self.store.take(f"{limit.name}:{key}", limit.rate, limit.burst, cost),
+        )
+
+    async def check_async(self, limit: RateLimit, key: str, cost: float = 1) -> None:
+        """
+        check_async
+
+        Take from the bucket of `key` under `limit` without blocking the event
+        loop: a blocking store (Redis) is called from the threadpool.
+
+        parameters:
+        - limit (RateLimit): the rule
+        - key (str): what's limited, e.g. the client IP or the email
+        - cost (float): the tokens taken
+
+        raises:
+        - RateLimitExceeded: if the bucket is empty
+        """
+        if not self.enabled:
+            return
+        args = (f"{limit.name}:{key}", limit.rate, limit.burst, cost)
+        if self.store.blocking:
+            retry_after = await run_in_threadpool(self.store.take, *args)
+        else:
+            retry_after = self.store.take(*args)
+        self._count(limit, retry_after)
+
+    def _count(self, limit: RateLimit, retry_after: float) -> None:
+        if retry_after:
+            self.rejected += 1
+            raise RateLimitExceeded(limit, retry_after)
+        self.allowed += 1
+
+    def clear(self) -> None:
+        self.store.clear()
+
+    def stats(self) -> dict:
+        stats = {"allowed": self.allowed, "rejected": self.rejected}
+        if isinstance(self.store, ShardedBucketStore):
+            stats.update(keys=len(self.store), evictions=self.store.evictions)
+        return stats
+
+
+# every request, per client IP
+IP_LIMIT = RateLimit(
+    "ip", settings.RATE_LIMIT_IP_PER_SECOND, settings.RATE_LIMIT_IP_BURST
+)
+
+# the login attempts, per client IP and per email
+LOGIN_IP_LIMIT = RateLimit.per_minute(
+    "login_ip", settings.LOGIN_LIMIT_IP_PER_MINUTE, settings.LOGIN_LIMIT_IP_BURST
+)
+LOGIN_EMAIL_LIMIT = RateLimit.per_minute(
+    "login_email",
+    settings.LOGIN_LIMIT_EMAIL_PER_MINUTE,
+    settings.LOGIN_LIMIT_EMAIL_BURST,
+)
+
+rate_limiter = RateLimiter(
+    bucket_store_for(settings.RATE_LIMIT_URL), enabled=settings.RATE_LIMIT_ENABLED
+)
@@ -0,0 +1,154 @@
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Iterable, Tuple
+import re
+
+WORD = re.compile(r"\w+")
+
+# search modes of GET /product/search
+SEARCH_MODES = ("prefix", "fulltext", "fuzzy")
+
+
+def words(text: str) -> list[str]:
+    """
+    the lowercase words of a text
+    """
+    return WORD.findall(text.lower())
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    trigrams
+
+    The trigrams of a text the way pg_trgm builds them: every word is padded
+    with two spaces before and one after, so "milk" gives "  m", " mi", "mil",
+    "ilk" and "lk ".
+
+    parameters:
+    - text (str): the text
+
+    return:
+    - set of trigrams
+    """
+    grams = set()
+    for word in words(text):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NgramIndex:
+    """
+    In-process search index over (key, text) pairs, the search of the databases
+    without full-text and trigram indexes (SQLite). It answers the same three
+    modes as the PostgreSQL search, with the same kind of scores:
+
+    - prefix: texts starting with the query, case-insensitive, by text
+    - fulltext: texts having every word of the query, scored by the share of
+      the text words matched
+    - fuzzy: texts whose trigram similarity with the query (shared trigrams
+      over the trigrams of both) reaches the threshold, like pg_trgm `%`
+
+    The index is built once and never changed, a write builds a new one.
+    """
+
+    def __init__(self, items: Iterable[Tuple[Any, str]]):
+        self.texts: dict[Any, str] = {}
+        self.sorted: list[Tuple[str, Any]] = []
+        self.words: dict[str, set] = {}
+        self.grams: dict[str, set] = {}
+        self.gram_counts: dict[Any, int] = {}
+        self.word_counts: dict[Any, int] = {}
+
+        for key, text in items:
+            self.texts[key] = text
+            self.sorted.append((text.lower(), key))
+
+            text_words = set(words(text))
+            self.word_counts[key] = len(text_words)
+            for word in text_words:
+                self.words.setdefault(word, set()).add(key)
+
+            text_grams = trigrams(text)
+            self.gram_counts[key] = len(text_grams)
+            for gram in text_grams:
+                self.grams.setdefault(gram, set()).add(key)
+
+        self.sorted.sort()
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def search(
+        self,
+        query: str,
+        mode: str,
+        limit: int,
+        offset: int = 0,
+        threshold: float = 0.3,
+    ) -> list[Tuple[Any, float]]:
+        """
+        search
+
+        The ranked matches of a query, best first, ties by text then key.
+
+        parameters:
+        - query (str): the searched text
+        - mode (str): "prefix", "fulltext" or "fuzzy"
+        - limit (int): the number of matches
+        - offset (int): the matches skipped first
+        - threshold (float): the minimum similarity of the fuzzy matches
+
+        return:
+        - list of (key, score)
+        """
+        if mode == "prefix":
+            return self._prefix(query.lower(), limit, offset)
+        if mode == "fulltext":
+            matches = self._fulltext(query)
+        elif mode == "fuzzy":
+            matches = self._fuzzy(query, threshold)
+        else:
+            raise ValueError(f"Unknown search mode {mode}")
+
+        ranked = sorted(
+            matches.items(),
+            key=lambda match: (-match[1], self.texts[match[0]].lower(), match[0]),
+        )
+        return ranked[offset : offset + limit]
+
+    def _prefix(self, prefix: str, limit: int, offset: int):
+        # the matches are a contiguous run of the sorted texts
+        start = bisect_left(self.sorted, (prefix,)) + offset
+        matches = []
+        for text, key in self.sorted[start : start + limit]:
+            if not text.startswith(prefix):
+                break
+            matches.append((key, 1.0))
+        return matches
+
+    def _fulltext(self, query: str) -> dict:
+        query_words = set(words(query))
+        if not query_words:
+            return {}
+        postings = sorted(
+            (self.words.get(word, set()) for word in query_words), key=len
+        )
+        keys = set.intersection(*postings)
+        return {key: len(query_words) / self.word_counts[key] for key in keys}
+
+    def _fuzzy(self, query: str, threshold: float) -> dict:
+        query_grams = trigrams(query)
+        if not query_grams:
+            return {}
+
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.grams.get(gram, ()))
+
+        matches = {}
+        for key, count in shared.items():
+            similarity = count / (len(query_grams) + self.gram_counts[key] - count)
+            if similarity >= threshold:
+                matches[key] = similarity
+        return matches
@@ -1,4 +1,12 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
 from passlib.context import CryptContext
+from functools import lru_cache
+from typing import Any, Callable, Optional
+from core.config import get_settings
+import asyncio
+import secrets
+import time
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -32,3 +40,197 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     - True or False
     """
     return pwd_context.verify(plain_password, hashed_password)
+
+
+@lru_cache(maxsize=1)
+def dummy_hash() -> str:
+    """
+    the hash of a random password, built once per process with the same
+    settings as the real hashes
+    """
+    return hash_password(secrets.token_urlsafe(32))
+
+
+def verify_dummy_password(plain_password: str) -> bool:
+    """
+    verify_dummy_password
+
+    Check a password against dummy_hash, for a login with an unknown email: it
+    costs as much as a wrong password, so the response time doesn't tell
+    whether the email has an account.
+
+    parameters:
+    - plain_password (str): the password given by user.
+
+    return:
+    - False
+    """
+    verify_password(plain_password, dummy_hash())
+    return False
+
+
+class HashingPoolSaturated(Exception):
+    """
+    Raised when the hashing pool queue is full, the API answers 503
+    """
+
+
+@dataclass
+class HashingStats:
+    """
+    Timing counters for the hashing pool, all the times are in seconds
+    """
+
+    calls: int = 0
+    rejected: int = 0
+    in_flight: int = 0
+    total_wait: float = 0.0
+    total_run: float = 0.0
+    max_wait: float = 0.0
+    max_run: float = 0.0
+
+
+def _timed(fn: Callable[..., Any], *args: Any) -> tuple[Any, float]:
+    """
+    Run fn inside the worker and measure only the bcrypt time
+    """
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class HashingPool:
+    """
+    Bounded worker pool that keeps bcrypt out of the event loop.
+
+    At most `workers + max_queue` calls can be pending, the next ones are
+    rejected with HashingPoolSaturated instead of piling up on the loop.
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = 4, max_queue: int = 32):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown hashing pool kind '{kind}'")
+
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stats = HashingStats()
+        self._executor: Optional[Executor] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            executor_class = (
+                ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+            )
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        run
+
+        Submit fn to the pool and wait for it without blocking the event loop.
+
+        parameters:
+        - fn (Callable): a module level function, so it can go to a process
+        - args: the fn arguments
+
+        return:
+        - the fn result
+
+        raises:
+        - HashingPoolSaturated: if the pool already has `capacity` calls pending
+        """
+        if self.stats.in_flight >= self.capacity:
+            self.stats.rejected += 1
+            raise HashingPoolSaturated("Too many password operations, try again")
+
+        self.stats.in_flight += 1
+        submitted = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, run_time = await loop.run_in_executor(
+                self.executor, _timed, fn, *args
+            )
+        finally:
+            self.stats.in_flight -= 1
+
+        wait_time = max(time.perf_counter() - submitted - run_time, 0.0)
+        self.stats.calls += 1
+        self.stats.total_wait += wait_time
+        self.stats.total_run += run_time
+        self.stats.max_wait = max(self.stats.max_wait, wait_time)
+        self.stats.max_run = max(self.stats.max_run, run_time)
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+settings = get_settings()
+
+hashing_pool = HashingPool(
+    kind=settings.HASH_POOL_KIND,
+    workers=settings.HASH_POOL_WORKERS,
+    max_queue=settings.HASH_POOL_MAX_QUEUE,
+)
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    hash_password_async
+
+    Same as hash_password, but runs bcrypt in the hashing pool.
+
+    parameters:
+    - password: the password given by user.
+
+    return:
+    - password hashed
+    """
+    return await hashing_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password_async
+
+    Same as verify_password, but runs bcrypt in the hashing pool.
+
+    parameters:
+    - plain_password (str): the password given by user.
+    - hashed_password (str): the password hashed.
+
+    return:
+    - True or False
+    """
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def verify_dummy_password_async(plain_password: str) -> bool:
+    """
+    verify_dummy_password_async
+
+    Same as verify_dummy_password, but runs bcrypt in the hashing pool.
+
+    parameters:
+    - plain_password (str): the password given by user.
+
+    return:
+    - False
+    """
+    return await hashing_pool.run(verify_dummy_password, plain_password)
+
+
+def hashing_stats() -> dict:
+    """
+    Return the hashing pool counters as a dict
+    """
+    return asdict(hashing_pool.stats)
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+from core.cache import dump_entity, load_entity
+from core.config import get_settings
+from core.security.jwt import decode_access_token
+import hashlib
+import threading
+import time
+
+
+@dataclass
+class TokenEntry:
+    """
+    A verified token: its claims, when it expires and the user it resolved to,
+    kept until `user_expires_at` (monotonic)
+    """
+
+    claims: dict
+    expires_at: float
+    user: Optional[Any] = None
+    user_expires_at: float = 0.0
+
+
+def token_digest(token: str) -> str:
+    """
+    The cache key, the raw token is never kept in memory as a key
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def detached_copy(user):
+    """
+    Copy the loaded columns of a user into a detached instance, so the cached
+    identity doesn't depend on the session that loaded it.
+    """
+    return load_entity(type(user), dump_entity(user))
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens, every entry expires at the token `exp`.
+    The user a token resolved to is kept `user_ttl` seconds: invalidate_user
+    only reaches this process, so a user updated or deleted through another
+    worker is resolved again once the TTL ends.
+    """
+
+    def __init__(self, max_entries: int = 10000, user_ttl: float = 30):
+        self.max_entries = max_entries
+        self.user_ttl = user_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, TokenEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify(self, token: str) -> Optional[TokenEntry]:
+        """
+        verify
+
+        Return the cached entry of the token, decoding and caching it on a miss.
+
+        parameters:
+        - token (str): the token encoded
+
+        return:
+        - TokenEntry if the token is valid
+        - None if it's invalid or expired
+        """
+        key = token_digest(token)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                del self._entries[key]
+            self.misses += 1
+
+        claims = decode_access_token(token)
+        if not claims or "exp" not in claims:
+            return None
+
+        entry = TokenEntry(claims=claims, expires_at=float(claims["exp"]))
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def remember_user(self, entry: TokenEntry, user) -> None:
+        """
+        Keep a detached copy of the user resolved from the entry claims, for
+        `user_ttl` seconds
+        """
+        entry.user = detached_copy(user)
+        entry.user_expires_at = time.monotonic() + self.user_ttl
+
+    def cached_user(self, entry: TokenEntry):
+        """
+        the user the entry resolved to, None once it's forgotten or expired
+        """
+        user = entry.user
+        if user is None or entry.user_expires_at <= time.monotonic():
+            return None
+        return user
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Forget the resolved user of every token, used when it's updated or deleted
+        """
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.user is not None and entry.user.id == user_id:
+                    entry.user = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+token_cache = TokenCache(
+    max_entries=get_settings().TOKEN_CACHE_SIZE,
+    user_ttl=get_settings().CACHE_TTL_SECONDS,
+)
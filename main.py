@@ -1,13 +1,38 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeout
 from core.config import get_settings
+from core.ratelimit import RateLimitExceeded
+from core.db import async_engine
+from core.security.hashing import HashingPoolSaturated, hashing_pool
 from api.v1.routes.user_route import user_route
 from api.v1.routes.product_route import product_route
-from middlewares.middleware import add_user_to_request_state
+from api.v1.routes.budget_route import budget_route
+from api.v1.routes.alert_route import alert_route
+from api.v1.routes.metrics_route import metrics_route
+from middlewares.metrics import MetricsMiddleware
+from middlewares.middleware import AuthStateMiddleware, SharedDeletesMiddleware
+from middlewares.profiler import QueryProfilerMiddleware
+from middlewares.ratelimit import RateLimitMiddleware
+import math
 import uvicorn
 
 settings = get_settings()
 
-app = FastAPI(debug=settings.DEBUG)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    hashing_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+# orjson encodes the response bodies, several times faster than json.dumps
+app = FastAPI(
+    debug=settings.DEBUG, lifespan=lifespan, default_response_class=ORJSONResponse
+)
 
 
 @app.get("/")
@@ -15,10 +40,47 @@ def read_item():
     return {"Keeper": "A shopping helper"}
 
 
-app.middleware("http")(add_user_to_request_state)
+@app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated(request: Request, exc: HashingPoolSaturated):
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"}
+    )
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
+@app.exception_handler(PoolTimeout)
+async def database_pool_saturated(request: Request, exc: PoolTimeout):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, try again"},
+        headers={"Retry-After": "1"},
+    )
+
+
+if settings.CACHE_SHARED_URL:
+    app.add_middleware(SharedDeletesMiddleware)
+app.add_middleware(AuthStateMiddleware)
+if settings.SQL_PROFILE:
+    app.add_middleware(QueryProfilerMiddleware)
+# outside the token verification, an empty bucket costs nothing else
+app.add_middleware(RateLimitMiddleware)
+if settings.METRICS_ENABLED:
+    # added last, so it's the outermost middleware and times the whole request
+    app.add_middleware(MetricsMiddleware)
 
 app.include_router(user_route, tags=["/user"])
 app.include_router(product_route, tags=["/product"])
+app.include_router(budget_route, tags=["/budget"])
+app.include_router(alert_route, tags=["/alert"])
+app.include_router(metrics_route, tags=["/metrics"])
 
 
 if __name__ == "__main__":
@@ -27,4 +89,5 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.RELOAD,  # só em dev! cuidado em produção
+        workers=settings.WORKERS,
     )
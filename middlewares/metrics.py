@@ -0,0 +1,43 @@
+from core.metrics import Registry, RequestDBStats, registry, request_db_stats
+import time
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording the latency, status and database queries of
+    every request in the metrics registry. It runs on the event loop thread
+    only, so the counters are updated without locks.
+    """
+
+    def __init__(self, app, metrics: Registry = registry):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        db = RequestDBStats()
+        token = request_db_stats.set(db)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.started(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            request_db_stats.reset(token)
+            # the route template set by the router, raw paths would make a
+            # label per id
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.metrics.finished(path, method, status, duration, db)
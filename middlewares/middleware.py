@@ -1,33 +1,77 @@
-from fastapi import Request
-from core.security.jwt import decode_access_token
+from typing import Optional
+from core.cache import shared_deletes
+from core.security.token_cache import token_cache
 
 
-async def add_user_to_request_state(request: Request, call_next):
+def bearer_token(headers: list[tuple[bytes, bytes]]) -> Optional[str]:
     """
-    Middleware to get the header, decode and add the user data to request.state.user
+    bearer_token
+
+    The token of the Authorization header, read straight from the ASGI headers.
 
     parameters:
-    - request (Request): to get header and add to state.user
-    - call_next: call the next middleware
+    - headers (list): the raw (name, value) pairs of the scope, names lowercased
 
     return:
-    - next middleware if success
-    - nothing if not success
+    - the token, None without a well formed `Bearer <token>` header
+    """
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            token = token.strip()
+            if scheme.lower() != "bearer" or not token:
+                return None
+            return token
+    return None
+
+
+class AuthStateMiddleware:
     """
-    token = request.headers.get("Authorization")
+    Pure ASGI middleware verifying the bearer token through the token cache and
+    adding the user data to request.state.user. The verified entry is kept in
+    request.state.token_entry so get_current_user doesn't decode it again.
+
+    Unlike a call_next middleware, the request body and the response (streamed
+    ones included) go through untouched, without an extra task per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
 
-    if token:
-        try:
-            token = token.split(" ")[1]
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = bearer_token(scope["headers"])
+        entry = token_cache.verify(token) if token else None
+
+        # request.state reads this dict
+        state = scope.setdefault("state", {})
+        state["token_entry"] = entry
+        state["user"] = entry.claims if entry else None
+
+        await self.app(scope, receive, send)
+
+
+class SharedDeletesMiddleware:
+    """
+    Pure ASGI middleware holding the response back until the shared cache
+    deletes queued by the request are done (SharedDeletes): the invalidations
+    of a write reach the other workers before its client gets the answer.
+    """
 
-            user_data = decode_access_token(token)
-            request.state.user = user_data
-        except Exception:
+    def __init__(self, app):
+        self.app = app
 
-            request.state.user = None
-    else:
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        request.state.user = None
+        async def send_after_deletes(message):
+            if message["type"] == "http.response.start":
+                await shared_deletes.wait()
+            await send(message)
 
-    response = await call_next(request)
-    return response
+        await self.app(scope, receive, send_after_deletes)
@@ -0,0 +1,53 @@
+from core.config import get_settings
+from core.profiler import QueryLog, logger, request_profile
+
+settings = get_settings()
+
+
+class QueryProfilerMiddleware:
+    """
+    Pure ASGI middleware profiling the SQL of every request, for debugging. The
+    response gets `X-DB-Queries` and a `Server-Timing` db entry, and statements
+    repeated SQL_N_PLUS_ONE_THRESHOLD times are logged and counted in
+    `X-DB-N-Plus-One`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryLog()
+        token = request_profile.set(profile)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(profile.count).encode()))
+                headers.append(
+                    (
+                        b"server-timing",
+                        f'db;dur={profile.duration * 1000:.2f};desc="{profile.count} queries"'.encode(),
+                    )
+                )
+                repeated = profile.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD)
+                if repeated:
+                    headers.append((b"x-db-n-plus-one", str(len(repeated)).encode()))
+                    for statement, count in repeated:
+                        logger.warning(
+                            "N+1 on %s %s: ran %d times: %s",
+                            scope["method"],
+                            scope["path"],
+                            count,
+                            " ".join(statement.split()),
+                        )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            request_profile.reset(token)
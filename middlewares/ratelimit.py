@@ -0,0 +1,80 @@
+from core.config import get_settings
+from core.ratelimit import IP_LIMIT, RateLimitExceeded, rate_limiter
+import math
+import orjson
+
+settings = get_settings()
+
+
+def client_ip(scope) -> str:
+    """
+    client_ip
+
+    The address the request comes from. Behind proxies
+    (RATE_LIMIT_TRUST_FORWARDED) it's read from X-Forwarded-For, counting
+    RATE_LIMIT_TRUSTED_PROXIES addresses from the right: each proxy appends the
+    address it saw, the addresses on their left are the client's own and can't
+    be trusted.
+
+    parameters:
+    - scope (dict): the ASGI scope
+
+    return:
+    - the IP, "unknown" when the server doesn't give one
+    """
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = [
+            address.strip()
+            for name, value in scope["headers"]
+            if name == b"x-forwarded-for"
+            for address in value.decode("latin-1").split(",")
+            if address.strip()
+        ]
+        if forwarded:
+            hops = settings.RATE_LIMIT_TRUSTED_PROXIES
+            return forwarded[max(len(forwarded) - hops, 0)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def too_many_requests(exc: RateLimitExceeded) -> tuple[dict, dict]:
+    """
+    the 429 response start and body messages
+    """
+    body = orjson.dumps({"detail": str(exc)})
+    start = {
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(math.ceil(exc.retry_after)).encode()),
+        ],
+    }
+    return start, {"type": "http.response.body", "body": body}
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware taking a token from the client IP bucket of every
+    request. An empty bucket answers 429 with Retry-After right away, before
+    the token verification, the routes and the database.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await rate_limiter.check_async(IP_LIMIT, client_ip(scope))
+        except RateLimitExceeded as exc:
+            start, body = too_many_requests(exc)
+            await send(start)
+            await send(body)
+            return
+
+        await self.app(scope, receive, send)
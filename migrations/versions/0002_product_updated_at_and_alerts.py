@@ -0,0 +1,78 @@
+"""product updated_at and alerts
+
+What the models gained while the schema was still made by create_all, which
+never changes an existing table: the (date_expire, id) index of the keyset
+pages and the alert scans, the products `updated_at` read by the alert
+watermark, and the alerts and alert_watermarks tables.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 05:12:08.331904
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite can't add a column with a non-constant default, the batch
+    # operation copies the table there instead
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "updated_at",
+                sa.DateTime(timezone=True),
+                server_default=sa.func.now(),
+                nullable=True,
+            )
+        )
+    op.create_index(
+        "ix_products_date_expire_id", "products", ["date_expire", "id"], unique=False
+    )
+
+    op.create_table(
+        "alerts",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("fk_user", sa.Integer(), nullable=False),
+        sa.Column("fk_product", sa.Integer(), nullable=False),
+        sa.Column("date_expire", sa.Date(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=True,
+        ),
+        sa.ForeignKeyConstraint(["fk_product"], ["products.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["fk_user"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("fk_product", "date_expire", name="uq_alerts_product_date"),
+    )
+    op.create_index("ix_alerts_id", "alerts", ["id"], unique=False)
+
+    op.create_table(
+        "alert_watermarks",
+        sa.Column("job", sa.String(length=50), nullable=False),
+        sa.Column("last_run_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("window_end", sa.Date(), nullable=False),
+        sa.PrimaryKeyConstraint("job"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("alert_watermarks")
+    op.drop_index("ix_alerts_id", table_name="alerts")
+    op.drop_table("alerts")
+    op.drop_index("ix_products_date_expire_id", table_name="products")
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,47 @@
+"""product query indexes
+
+Indexes for the per user listings by expiry date and by name, and the
+case-insensitive name lookups.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 05:20:11.018342
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_products_fk_user_date_expire",
+        "products",
+        ["fk_user", "date_expire"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_products_fk_user_name", "products", ["fk_user", "name"], unique=False
+    )
+    op.create_index(
+        "ix_products_fk_user_lower_name",
+        "products",
+        ["fk_user", sa.text("lower(name)")],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_products_fk_user_lower_name", table_name="products")
+    op.drop_index("ix_products_fk_user_name", table_name="products")
+    op.drop_index("ix_products_fk_user_date_expire", table_name="products")
@@ -0,0 +1,47 @@
+"""per user product pagination indexes
+
+The product pages are per user: (fk_user, id) serves the pages by id and
+(fk_user, date_expire, id) the pages by expiry date, replacing the
+(fk_user, date_expire) index.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 05:47:52.976160
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_products_fk_user_id", "products", ["fk_user", "id"], unique=False
+    )
+    op.create_index(
+        "ix_products_fk_user_date_expire_id",
+        "products",
+        ["fk_user", "date_expire", "id"],
+        unique=False,
+    )
+    op.drop_index("ix_products_fk_user_date_expire", table_name="products")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        "ix_products_fk_user_date_expire",
+        "products",
+        ["fk_user", "date_expire"],
+        unique=False,
+    )
+    op.drop_index("ix_products_fk_user_date_expire_id", table_name="products")
+    op.drop_index("ix_products_fk_user_id", table_name="products")
@@ -0,0 +1,35 @@
+"""product price index
+
+The product listing filters on a price range and sorts by price per user:
+(fk_user, price, id) serves both, and the keyset pages by price.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:12:31.402518
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_products_fk_user_price_id",
+        "products",
+        ["fk_user", "price", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_products_fk_user_price_id", table_name="products")
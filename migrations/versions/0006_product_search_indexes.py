@@ -0,0 +1,53 @@
+"""product search indexes
+
+GET /product/search: a GIN index on to_tsvector('simple', name) serves the
+full-text search and a pg_trgm GIN index on lower(name) the fuzzy search.
+Both are PostgreSQL only, SQLite searches through an in-process index.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 11:03:47.218904
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_products_name_tsv",
+        "products",
+        [sa.text("to_tsvector('simple'::regconfig, name)")],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "ix_products_lower_name_trgm",
+        "products",
+        [sa.text("lower(name) gin_trgm_ops")],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.drop_index("ix_products_lower_name_trgm", table_name="products")
+    op.drop_index("ix_products_name_tsv", table_name="products")
@@ -0,0 +1,59 @@
+"""user product summaries
+
+The per user aggregates of GET /user/{id}/summary: the product count and
+total price per user, and per user and expiry date. They're filled from the
+existing products, the product writes keep them up to date afterwards.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 13:26:09.551872
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user_product_summaries",
+        sa.Column("fk_user", sa.Integer(), nullable=False),
+        sa.Column("product_count", sa.Integer(), nullable=False),
+        sa.Column("total_price", sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(["fk_user"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("fk_user"),
+    )
+    op.create_table(
+        "user_expiry_buckets",
+        sa.Column("fk_user", sa.Integer(), nullable=False),
+        sa.Column("date_expire", sa.Date(), nullable=False),
+        sa.Column("product_count", sa.Integer(), nullable=False),
+        sa.Column("total_price", sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(["fk_user"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("fk_user", "date_expire"),
+    )
+    op.execute(
+        "INSERT INTO user_product_summaries (fk_user, product_count, total_price) "
+        "SELECT fk_user, count(id), sum(price) FROM products GROUP BY fk_user"
+    )
+    op.execute(
+        "INSERT INTO user_expiry_buckets "
+        "(fk_user, date_expire, product_count, total_price) "
+        "SELECT fk_user, date_expire, count(id), sum(price) FROM products "
+        "WHERE date_expire IS NOT NULL GROUP BY fk_user, date_expire"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_expiry_buckets")
+    op.drop_table("user_product_summaries")
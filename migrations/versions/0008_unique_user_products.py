@@ -0,0 +1,54 @@
+"""unique user products
+
+A user has one product per name and expiry date, the conflict target of the
+product upserts. The migration refuses to run while duplicates are there:
+they may be referenced by alerts and differ in price, so the operator decides
+which one to keep (the query is in the error) before upgrading again.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 16:02:41.204518
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# the groups of products the unique index would reject
+DUPLICATES = (
+    "SELECT fk_user, name, date_expire, count(id) AS products FROM products "
+    "WHERE date_expire IS NOT NULL GROUP BY fk_user, name, date_expire "
+    "HAVING count(id) > 1"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    duplicates = op.get_bind().execute(sa.text(DUPLICATES)).all()
+    if duplicates:
+        raise RuntimeError(
+            f"{len(duplicates)} groups of products share a user, name and expiry "
+            "date, e.g. (fk_user, name, date_expire, products) "
+            f"{tuple(duplicates[0])}. Merge or delete them before upgrading, "
+            f"they are listed by: {DUPLICATES}"
+        )
+    op.create_index(
+        "uq_products_fk_user_name_date_expire",
+        "products",
+        ["fk_user", "name", "date_expire"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_products_fk_user_name_date_expire", table_name="products")
@@ -0,0 +1,44 @@
+"""product name prefix index
+
+The name prefix filter and search compare lower(name) COLLATE "C" with their
+bounds, the range is only right in code point order. PostgreSQL serves it
+with an index of the same collation; SQLite compares in byte order already
+and keeps using ix_products_fk_user_lower_name.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 19:40:12.603117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.create_index(
+        "ix_products_fk_user_lower_name_c",
+        "products",
+        ["fk_user", sa.text('(lower(name) COLLATE "C")')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.drop_index("ix_products_fk_user_lower_name_c", table_name="products")
@@ -0,0 +1,13 @@
+from models.user import User
+from models.product import Product
+from models.alert import Alert, AlertWatermark
+from models.summary import UserExpiryBucket, UserProductSummary
+
+__all__ = [
+    "User",
+    "Product",
+    "Alert",
+    "AlertWatermark",
+    "UserProductSummary",
+    "UserExpiryBucket",
+]
@@ -0,0 +1,49 @@
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    ForeignKey,
+    Date,
+    DateTime,
+    UniqueConstraint,
+)
+from sqlalchemy.sql import func
+from core.db import Base
+
+
+class Alert(Base):
+    """
+    Alert model for SQLAlchemy, one row per product close to expiring
+    """
+
+    __tablename__ = "alerts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    fk_user = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    fk_product = Column(
+        Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False
+    )
+    date_expire = Column(Date, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # a product alerts once per expiry date, reruns insert nothing
+    __table_args__ = (
+        UniqueConstraint("fk_product", "date_expire", name="uq_alerts_product_date"),
+    )
+
+    def __repr__(self):
+        return f"<Alert(id={self.id}, fk_user={self.fk_user}, fk_product={self.fk_product}, date_expire={self.date_expire})>"
+
+
+class AlertWatermark(Base):
+    """
+    Where the last alert scan stopped, so the next one only reads what changed
+    """
+
+    __tablename__ = "alert_watermarks"
+
+    job = Column(String(50), primary_key=True)
+    last_run_at = Column(DateTime(timezone=True), nullable=False)
+    window_end = Column(Date, nullable=False)
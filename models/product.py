@@ -1,6 +1,20 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Numeric
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    ForeignKey,
+    Date,
+    DateTime,
+    Numeric,
+    Index,
+    DDL,
+    event,
+    literal_column,
+)
+from sqlalchemy.dialects import postgresql  # noqa: F401  registers to_tsvector
+from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
-from core.db import Base, engine
+from core.db import Base
 from datetime import date
 
 
@@ -16,9 +30,53 @@ class Product(Base):
     fk_user = Column(Integer, ForeignKey("users.id"), nullable=False)
     date_expire = Column(Date, nullable=True)
     price = Column(Numeric(10, 2), nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
 
     user = relationship("User", back_populates="products")
 
+    __table_args__ = (
+        # keyset pagination and the expiry alert scans by expiry date
+        Index("ix_products_date_expire_id", "date_expire", "id"),
+        # per user listings: the keyset pages and range filters by id, expiry
+        # date, price and name
+        Index("ix_products_fk_user_id", "fk_user", "id"),
+        Index("ix_products_fk_user_date_expire_id", "fk_user", "date_expire", "id"),
+        Index("ix_products_fk_user_price_id", "fk_user", "price", "id"),
+        Index("ix_products_fk_user_name", "fk_user", "name"),
+        # a user has one product per name and expiry date, the conflict target
+        # of the product upserts
+        Index(
+            "uq_products_fk_user_name_date_expire",
+            "fk_user",
+            "name",
+            "date_expire",
+            unique=True,
+        ),
+        # case-insensitive lookups by name, and the prefix ranges on SQLite
+        Index("ix_products_fk_user_lower_name", "fk_user", func.lower(name)),
+        # the prefix ranges on PostgreSQL, compared in code point order
+        # (utils.sql.byte_order) whatever the database collation
+        Index(
+            "ix_products_fk_user_lower_name_c",
+            "fk_user",
+            func.lower(name).collate("C"),
+        ).ddl_if(dialect="postgresql"),
+        # the full-text and the fuzzy (pg_trgm) search, PostgreSQL only
+        Index(
+            "ix_products_name_tsv",
+            func.to_tsvector(literal_column("'simple'::regconfig"), name),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_products_lower_name_trgm",
+            func.lower(name).label("lower_name"),
+            postgresql_using="gin",
+            postgresql_ops={"lower_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         if self.date_expire and self.date_expire < date.today():
@@ -28,4 +86,9 @@ class Product(Base):
         return f"<Product(id={self.id}, name={self.name}, price={self.price}, date_expire={self.date_expire})>"
 
 
-Base.metadata.create_all(bind=engine)
+# the trigram index needs pg_trgm, create_all (tests, dev) enables it first
+event.listen(
+    Product.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, ForeignKey, Date, Numeric
+from core.db import Base
+
+
+class UserProductSummary(Base):
+    """
+    The totals of the products of a user, kept up to date by every product
+    write (repository.summary_repo)
+    """
+
+    __tablename__ = "user_product_summaries"
+
+    fk_user = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    product_count = Column(Integer, nullable=False, default=0)
+    total_price = Column(Numeric(14, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<UserProductSummary(fk_user={self.fk_user}, product_count={self.product_count}, total_price={self.total_price})>"
+
+
+class UserExpiryBucket(Base):
+    """
+    The products of a user expiring on a date, so the value expiring in the
+    next N days is a sum over N rows of the primary key whatever the date
+    """
+
+    __tablename__ = "user_expiry_buckets"
+
+    fk_user = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    date_expire = Column(Date, primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    total_price = Column(Numeric(14, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<UserExpiryBucket(fk_user={self.fk_user}, date_expire={self.date_expire}, product_count={self.product_count})>"
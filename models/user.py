@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, DateTime
 from sqlalchemy.sql import func
-from core.db import Base, engine
+from core.db import Base
 from sqlalchemy.orm import relationship
 
 
@@ -16,7 +16,6 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    products = relationship("Product", back_populates="user")
-
-
-Base.metadata.create_all(bind=engine)
+    products = relationship(
+        "Product", back_populates="user", cascade="all, delete-orphan"
+    )
@@ -0,0 +1,166 @@
+from datetime import date, datetime
+from sqlalchemy import and_, or_, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from core.db import run_in_session
+from models.alert import Alert, AlertWatermark
+from models.product import Product
+from utils.pagination import after
+from utils.sql import dialect_insert
+from typing import Optional, List, Sequence, Union
+
+
+class AlertRepo:
+    """
+    Alert repository that provides many functions connecting with database
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def now(self) -> datetime:
+        """
+        the database clock, the watermarks are compared with updated_at written by it
+        """
+        return self.db.execute(select(func.now())).scalar_one()
+
+    def get_watermark(self, job: str) -> Optional[AlertWatermark]:
+        """
+        get the watermark of a job
+
+        parameters:
+        - job (str): the job name
+
+        return:
+        - AlertWatermark or None on the first run
+        """
+        return self.db.get(AlertWatermark, job)
+
+    def save_watermark(self, job: str, last_run_at: datetime, window_end: date) -> None:
+        """
+        save where the job stopped and commit
+
+        parameters:
+        - job (str): the job name
+        - last_run_at (datetime): when the run started, by the database clock
+        - window_end (date): the last expiry date covered by the run
+        """
+        watermark = self.db.get(AlertWatermark, job)
+        if watermark is None:
+            watermark = AlertWatermark(job=job)
+            self.db.add(watermark)
+        watermark.last_run_at = last_run_at
+        watermark.window_end = window_end
+        self.db.commit()
+
+    def expiring_products_chunk(
+        self,
+        today: date,
+        window_end: date,
+        changed_since: Optional[datetime] = None,
+        previous_window_end: Optional[date] = None,
+        last_key: Optional[Sequence] = None,
+        limit: int = 1000,
+    ) -> List:
+        """
+        next chunk of products expiring between today and window_end, read through
+        the (date_expire, id) index. With a previous run only the products changed
+        since it or that just entered the window are returned.
+
+        parameters:
+        - today (date): the window start
+        - window_end (date): the window end
+        - changed_since (datetime): products updated after it are read again
+        - previous_window_end (date): the window end of the previous run
+        - last_key (Sequence): (date_expire, id) of the last row of the previous chunk
+        - limit (int): the chunk size
+
+        return:
+        - rows of (id, fk_user, date_expire)
+        """
+        query = select(Product.id, Product.fk_user, Product.date_expire).where(
+            Product.date_expire >= today, Product.date_expire <= window_end
+        )
+
+        if changed_since is not None and previous_window_end is not None:
+            query = query.where(
+                or_(
+                    Product.updated_at > changed_since,
+                    Product.date_expire > previous_window_end,
+                )
+            )
+
+        if last_key is not None:
+            query = query.where(after((Product.date_expire, Product.id), last_key))
+
+        query = query.order_by(Product.date_expire, Product.id).limit(limit)
+        return self.db.execute(query).all()
+
+    def bulk_create_alerts(self, rows: List[dict]) -> List[int]:
+        """
+        insert many alerts in one statement and commit, the alerts that already
+        exist are skipped
+
+        parameters:
+        - rows (List[dict]): fk_user, fk_product and date_expire of each alert
+
+        return:
+        - the fk_user of every alert inserted
+        """
+        if not rows:
+            return []
+
+        statement = (
+            dialect_insert(self.db, Alert)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["fk_product", "date_expire"])
+            .returning(Alert.fk_user)
+        )
+        inserted = list(self.db.execute(statement).scalars())
+        self.db.commit()
+        return inserted
+
+    def list_alerts_by_user(self, fk_user: int, since: date) -> List[Alert]:
+        """
+        list the alerts of an user that didn't expire yet
+
+        parameters:
+        - fk_user (int): the user id
+        - since (date): alerts expiring before it are hidden
+
+        return:
+        - Alert
+        """
+        return (
+            self.db.query(Alert)
+            .filter(and_(Alert.fk_user == fk_user, Alert.date_expire >= since))
+            .order_by(Alert.date_expire, Alert.id)
+            .all()
+        )
+
+
+class AsyncAlertRepo:
+    """
+    Async alert repository, runs the AlertRepo queries without blocking the event loop
+    """
+
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.db = db
+
+    async def _run(self, method, *args):
+        return await run_in_session(
+            self.db, lambda session, *a: method(AlertRepo(session), *a), *args
+        )
+
+    async def list_alerts_by_user(self, fk_user: int, since: date) -> List[Alert]:
+        """
+        list the alerts of an user that didn't expire yet
+
+        parameters:
+        - fk_user (int): the user id
+        - since (date): alerts expiring before it are hidden
+
+        return:
+        - Alert
+        """
+        return await self._run(AlertRepo.list_alerts_by_user, fk_user, since)
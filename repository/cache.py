@@ -0,0 +1,247 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from core.cache import (
+    CollectionVersions,
+    EntityCache,
+    ListCache,
+    LRUCache,
+    shared_backend_for,
+)
+from core.config import get_settings
+from core.search import NgramIndex
+from models.product import Product
+from models.user import User
+from repository.product_repo import SQL_SEARCH_DIALECTS, AsyncProductRepo
+from repository.user_repo import AsyncUserRepo
+from schemas.product import ProductFilters
+from sqlalchemy.engine import Row
+from typing import List, Optional, Tuple, Union
+
+settings = get_settings()
+
+shared_backend = shared_backend_for(settings.CACHE_SHARED_URL)
+
+
+def entity_cache(model, keys: tuple[str, ...]) -> EntityCache:
+    return EntityCache(
+        model,
+        keys,
+        local=LRUCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS),
+        shared=shared_backend,
+        shared_ttl=settings.CACHE_SHARED_TTL_SECONDS,
+        enabled=settings.CACHE_ENABLED,
+    )
+
+
+product_cache = entity_cache(Product, ("id",))
+user_cache = entity_cache(User, ("id", "email"))
+
+# the caches invalidated by the writes of each model
+CACHES = {Product: product_cache, User: user_cache}
+
+# the pages of every user's products, GET /product
+product_list_cache = ListCache(
+    "products_by_user",
+    "fk_user",
+    local=LRUCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS),
+    shared=shared_backend,
+    shared_ttl=settings.CACHE_SHARED_TTL_SECONDS,
+    enabled=settings.CACHE_ENABLED,
+)
+
+# every user's own version and the version of the user list, GET /user
+user_versions = CollectionVersions(
+    "user_list", "id", shared_backend, settings.CACHE_SHARED_TTL_SECONDS
+)
+
+# the versions of the per owner collections bumped by the writes of each
+# model: the list cache pages and the ETags of the responses are keyed on them.
+# The repositories record their Core writes (record_collection_writes), the
+# ORM writes are collected by the session events
+COLLECTIONS = {Product: product_list_cache.versions, User: user_versions}
+
+
+@event.listens_for(Session, "after_flush")
+def collect_cache_keys(session, flush_context):
+    """
+    Remember the cache keys of every flushed entity (old key values included)
+    and the collections it belongs to, they're dropped once the transaction
+    commits. Every session writes through
+    here: the sync services, the Celery tasks and the AsyncSession alike.
+    """
+    pending = session.info.setdefault("cache_keys", {})
+    for entity in (*session.new, *session.dirty, *session.deleted):
+        for cache in (CACHES.get(type(entity)), COLLECTIONS.get(type(entity))):
+            if cache is not None:
+                pending.setdefault(cache, set()).update(cache.entity_keys(entity))
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_cache_keys(session):
+    for cache, keys in session.info.pop("cache_keys", {}).items():
+        cache.invalidate(keys)
+    for model, owners in session.info.pop("collection_writes", {}).items():
+        COLLECTIONS[model].invalidate(owners)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_cache_keys(session):
+    session.info.pop("cache_keys", None)
+    session.info.pop("collection_writes", None)
+
+
+def invalidate(model, **keys) -> None:
+    """
+    Drop an entity from its cache by key, for writes that don't go through the
+    ORM unit of work (Core UPDATE/DELETE statements)
+    """
+    cache = CACHES[model]
+    cache.invalidate(cache.key(attr, value) for attr, value in keys.items())
+
+
+async def collection_version(model, owner=None) -> Union[int, str]:
+    """
+    The version of an owner's collection of a model, of the whole collection
+    without an owner. It changes with every committed write to it, in every
+    process when the versions are in the shared backend.
+    """
+    return await COLLECTIONS[model].get(owner)
+
+
+def cache_stats() -> dict:
+    """
+    The hit/miss counters of every cache, per table
+    """
+    caches = (*CACHES.values(), product_list_cache, user_versions)
+    return {cache.name: cache.stats() for cache in caches}
+
+
+class CachedAsyncProductRepo(AsyncProductRepo):
+    """
+    AsyncProductRepo with the lookups by id served through the product cache,
+    and the user's product pages through the per user list cache. The cached
+    products are detached copies, the writes go through the repository
+    statements.
+    """
+
+    async def get_product_by_id(self, product_id: int) -> Optional[Product]:
+        """
+        get products by id through the cache
+
+        parameters:
+        - product_id (int): the product id
+
+        return:
+        - product
+        """
+        load = super().get_product_by_id
+        return await product_cache.read_through(
+            "id", product_id, lambda: load(product_id)
+        )
+
+    async def list_products_page(
+        self,
+        fk_user: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        order_by: str = "id",
+        filters: Optional[ProductFilters] = None,
+    ) -> Tuple[List[Row], Optional[str], Optional[str]]:
+        """
+        page of the user's products through the per user list cache
+
+        parameters:
+        - fk_user (int): the owner
+        - limit (int): the page size
+        - cursor (str): the next/prev cursor of a previous page
+        - order_by (str): a PRODUCT_ORDERS key
+        - filters (ProductFilters): the filters, None for every product
+
+        return:
+        - (rows, next_cursor, prev_cursor)
+        """
+        load = super().list_products_page
+        return await product_list_cache.read_through(
+            fk_user,
+            (limit, cursor, order_by, filters),
+            lambda: load(fk_user, limit, cursor, order_by, filters),
+        )
+
+    async def search_products(
+        self,
+        fk_user: int,
+        query: str,
+        mode: str,
+        limit: int,
+        offset: int = 0,
+        threshold: float = 0.3,
+    ) -> List[dict]:
+        """
+        ranked search of the user's products by name. PostgreSQL searches with
+        its full-text and trigram indexes; the other databases through an
+        NgramIndex of the user's product names, kept in the per user list cache
+        so a write to the user's products builds a new one.
+
+        parameters:
+        - fk_user (int): the owner
+        - query (str): the searched text
+        - mode (str): "prefix", "fulltext" or "fuzzy"
+        - limit (int): the number of products
+        - offset (int): the products skipped first
+        - threshold (float): the minimum similarity of the fuzzy matches
+
+        return:
+        - list of the PRODUCT_COLUMNS values and the `score`, best first
+        """
+        if self.db.get_bind().dialect.name in SQL_SEARCH_DIALECTS:
+            rows = await super().search_products(
+                fk_user, query, mode, limit, offset, threshold
+            )
+            return [dict(row._mapping) for row in rows]
+
+        async def build_index():
+            return NgramIndex(await self.list_product_names(fk_user))
+
+        index = await product_list_cache.read_through(
+            fk_user, ("search_index",), build_index
+        )
+        hits = index.search(query, mode, limit, offset, threshold)
+        rows = await self.list_product_rows_by_ids(fk_user, [key for key, _ in hits])
+        by_id = {row.id: row for row in rows}
+        return [
+            {**by_id[key]._mapping, "score": score}
+            for key, score in hits
+            if key in by_id
+        ]
+
+
+class CachedAsyncUserRepo(AsyncUserRepo):
+    """
+    AsyncUserRepo with the lookups by id and by email served through the user cache
+    """
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        """
+        get users by id through the cache
+
+        parameters:
+        - user_id (int): the user id
+
+        return:
+        - User
+        """
+        load = super().get_user_by_id
+        return await user_cache.read_through("id", user_id, lambda: load(user_id))
+
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        """
+        get user by email through the cache
+
+        parameters:
+        - email (str): the users email
+
+        return:
+        - User
+        """
+        load = super().get_user_by_email
+        return await user_cache.read_through("email", email, lambda: load(email))
@@ -1,7 +1,111 @@
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import delete, func, insert, literal, literal_column, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import iterate_in_threadpool
+from core.cache import record_collection_writes
+from core.db import run_in_session
+from repository.summary_repo import SUMMARY_ATTRS, apply_product_changes, money
+from utils.pagination import paginate
+from utils.sql import dialect_insert, prefix_range, update_returning
 from models.product import Product
-from schemas.product import ProductCreate, ProductUpdate
-from typing import Optional, List
+from models.user import User
+from schemas.product import ProductCreate, ProductFilters
+from typing import AsyncIterator, Iterator, Optional, List, Tuple, Union
+
+# sort orders accepted by list_products_page, the primary key breaks the ties
+PRODUCT_ORDERS = {
+    "id": (Product.id,),
+    "date_expire": (Product.date_expire, Product.id),
+    "price": (Product.price, Product.id),
+    "name": (Product.name, Product.id),
+}
+
+# the ProductResponse columns. The read-only lists select them as plain rows:
+# no Product instances, no identity map entries, no attribute instrumentation
+PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.fk_user,
+    Product.date_expire,
+    Product.price,
+)
+
+# a user has one product per name and expiry date, the upsert conflict target
+PRODUCT_KEY = (Product.fk_user, Product.name, Product.date_expire)
+
+# inserts tried by an upsert whose conflicting product is deleted meanwhile
+UPSERT_ATTEMPTS = 3
+
+
+class ProductExists(ValueError):
+    """
+    Raised when a write would give a user two products with the same name and
+    expiry date
+    """
+
+
+# the columns the per user aggregates are computed from
+SUMMARY_COLUMNS = tuple(getattr(Product, attr) for attr in SUMMARY_ATTRS)
+
+# columns written by the exports
+EXPORT_COLUMNS = PRODUCT_COLUMNS
+
+# the dialects searching with their own indexes (full-text and pg_trgm), the
+# others search through an in-process core.search.NgramIndex
+SQL_SEARCH_DIALECTS = ("postgresql",)
+
+# text search configuration of the full-text search, written as a constant so
+# the queries match the ix_products_name_tsv expression
+SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+
+def product_filters(filters: Optional[ProductFilters]) -> list:
+    """
+    product_filters
+
+    The conditions of the GET /product filters. Each one is a range on an
+    indexed column, next to the fk_user equality every listing starts with.
+
+    parameters:
+    - filters (ProductFilters): the requested filters, None for no filter
+
+    return:
+    - list of conditions
+    """
+    if filters is None:
+        return []
+
+    conditions = []
+    if filters.min_price is not None:
+        conditions.append(Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        conditions.append(Product.price <= filters.max_price)
+    if filters.expire_after is not None:
+        conditions.append(Product.date_expire >= filters.expire_after)
+    if filters.expire_before is not None:
+        conditions.append(Product.date_expire <= filters.expire_before)
+    if filters.name_prefix:
+        conditions.append(
+            prefix_range(func.lower(Product.name), filters.name_prefix.lower())
+        )
+    return conditions
+
+
+def export_statement(fk_user: int, batch_size: int):
+    """
+    the user's products in id order, fetched `batch_size` rows at a time through
+    a server-side cursor
+    """
+    return (
+        select(*EXPORT_COLUMNS)
+        .where(Product.fk_user == fk_user)
+        .order_by(Product.id)
+        .execution_options(yield_per=batch_size)
+    )
 
 
 class ProductRepo:
@@ -24,79 +128,630 @@ class ProductRepo:
         """
         return self.db.query(Product).filter(Product.id == product_id).first()
 
-    def get_product_by_name(self, name: str) -> Optional[Product]:
+    def get_product_by_name(
+        self, name: str, fk_user: Optional[int] = None
+    ) -> Optional[Product]:
         """
         get product by name inside the database retuning the product
 
         parameters:
         - name (str): the product name
+        - fk_user (int): the owner, the name then matches case-insensitive
+          through the (fk_user, lower(name)) index
 
         return:
         - Product
         """
-        return self.db.query(Product).filter(Product.name == name).first()
+        if fk_user is None:
+            return self.db.query(Product).filter(Product.name == name).first()
 
-    def create_product(self, product_data: ProductCreate) -> Product:
+        return (
+            self.db.query(Product)
+            .filter(
+                Product.fk_user == fk_user, func.lower(Product.name) == name.lower()
+            )
+            .first()
+        )
+
+    def bulk_create_products(self, rows: List[dict]) -> List[Union[int, str]]:
         """
-        Create a product and return the Product
+        Create a chunk of products in one transaction, with a multi-row
+        INSERT ... RETURNING instead of a round trip per product.
+
+        Rows pointing to a missing user are left out before the insert. If the
+        database still rejects the chunk, the rows are inserted one by one so
+        only the bad rows fail.
 
         parameters:
-        - product_data (ProductCreate): the product data to create
+        - rows (List[dict]): the validated product columns
 
         return:
-        - Product
+        - per row, the new product id or the error message
         """
-        new_product = Product(
-            name=product_data.name,
-            fk_user=product_data.fk_user,
-            date_expire=product_data.date_expire,
-            price=product_data.price,
+        owners = {row["fk_user"] for row in rows}
+        existing = set(
+            self.db.execute(select(User.id).where(User.id.in_(owners))).scalars()
         )
-        self.db.add(new_product)
+        results: List[Union[int, str]] = [
+            "User not found" if row["fk_user"] not in existing else None for row in rows
+        ]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+
+        statement = insert(Product).returning(Product.id, sort_by_parameter_order=True)
+        try:
+            ids = self.db.execute(statement, [rows[i] for i in pending]).scalars()
+            for i, product_id in zip(pending, ids.all()):
+                results[i] = product_id
+            apply_product_changes(self.db, added=[rows[i] for i in pending])
+            record_collection_writes(
+                self.db, Product, {rows[i]["fk_user"] for i in pending}
+            )
+            self.db.commit()
+            return results
+        except IntegrityError:
+            self.db.rollback()
+
+        for i in pending:
+            try:
+                results[i] = self.db.execute(statement, rows[i]).scalar_one()
+                apply_product_changes(self.db, added=[rows[i]])
+                record_collection_writes(self.db, Product, {rows[i]["fk_user"]})
+                self.db.commit()
+            except IntegrityError as exc:
+                self.db.rollback()
+                results[i] = str(exc.orig)
+        return results
+
+    def upsert_product(
+        self, product_data: ProductCreate, update_price: bool = False
+    ) -> Tuple[Row, bool]:
+        """
+        Create a product unless the user already has one with the same name
+        and expiry date, with INSERT ... ON CONFLICT DO NOTHING RETURNING: a
+        new product is one round trip and a concurrent duplicate can't be
+        inserted. On a conflict the existing product is read, locked until the
+        commit, and its price updated when `update_price` is set.
+
+        parameters:
+        - product_data (ProductCreate): the product data, fk_user set
+        - update_price (bool): update the price of an existing product
+
+        return:
+        - (the product row, True if it was created)
+
+        raises:
+        - ProductExists: the conflicting product kept being deleted before it
+          could be read, UPSERT_ATTEMPTS times
+        """
+        values = product_data.model_dump(
+            include={"name", "fk_user", "date_expire", "price"}
+        )
+        if values["date_expire"] and values["date_expire"] < date.today():
+            raise ValueError("The date cannot be before today!")
+
+        statement = (
+            dialect_insert(self.db, Product)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=[c.key for c in PRODUCT_KEY])
+            .returning(*PRODUCT_COLUMNS)
+        )
+        # the conflicting product can be deleted before it's read, the insert
+        # is then tried again
+        for _ in range(UPSERT_ATTEMPTS):
+            row = self.db.execute(statement).first()
+            if row is not None:
+                # the Core insert doesn't go through the session events
+                apply_product_changes(self.db, added=[row._mapping])
+                record_collection_writes(self.db, Product, {row.fk_user})
+                self.db.commit()
+                return row, True
+
+            existing = self.db.execute(
+                select(*PRODUCT_COLUMNS)
+                .where(*(column == values[column.key] for column in PRODUCT_KEY))
+                .with_for_update()
+            ).first()
+            if existing is not None:
+                break
+        else:
+            self.db.rollback()
+            raise ProductExists("Product already exists!")
+
+        price = money(values["price"]).quantize(Decimal("0.01"))
+        if update_price and money(existing.price) != price:
+            row = self.db.execute(
+                update(Product)
+                .where(Product.id == existing.id)
+                .values(price=price)
+                .returning(*PRODUCT_COLUMNS)
+            ).one()
+            apply_product_changes(
+                self.db, added=[row._mapping], removed=[existing._mapping]
+            )
+            record_collection_writes(self.db, Product, {row.fk_user})
+            existing = row
         self.db.commit()
-        self.db.refresh(new_product)
-        return new_product
+        return existing, False
 
-    def list_products(self, skip: int = 0, limit: int = 100) -> List[Product]:
+    def list_product_rows_by_user(self, fk_user: int) -> List[Row]:
         """
-        list of all product retuning Product
+        read-only list of every product of an user, only the PRODUCT_COLUMNS are
+        selected
 
         parameters:
-        - skip (int): where start the much products you can get
-        - limit (int): where end the list
+        - fk_user (int): the user id
 
         return:
-        - Product
+        - rows with the PRODUCT_COLUMNS attributes
+        """
+        return self.db.query(*PRODUCT_COLUMNS).filter(Product.fk_user == fk_user).all()
+
+    def iter_products_by_user(
+        self, fk_user: int, batch_size: int
+    ) -> Iterator[List[tuple]]:
+        """
+        stream the user's products in batches, only a batch is held in memory
+
+        parameters:
+        - fk_user (int): the owner
+        - batch_size (int): rows fetched per batch
+
+        return:
+        - iterator of row batches with the EXPORT_COLUMNS
+        """
+        result = self.db.execute(export_statement(fk_user, batch_size))
+        try:
+            yield from result.partitions()
+        finally:
+            result.close()
+
+    def filtered_products(self, fk_user: int, filters: Optional[ProductFilters] = None):
+        """
+        the query of the user's products matching the filters, only the
+        PRODUCT_COLUMNS are selected
+
+        parameters:
+        - fk_user (int): the owner
+        - filters (ProductFilters): the filters, None for every product
+
+        return:
+        - Query, without ORDER BY/LIMIT
+        """
+        query = self.db.query(*PRODUCT_COLUMNS).filter(Product.fk_user == fk_user)
+        for condition in product_filters(filters):
+            query = query.filter(condition)
+        return query
+
+    def list_products_page(
+        self,
+        fk_user: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        order_by: str = "id",
+        filters: Optional[ProductFilters] = None,
+    ) -> Tuple[List[Row], Optional[str], Optional[str]]:
+        """
+        read-only page of the user's products using keyset pagination, only the
+        PRODUCT_COLUMNS are selected. The (fk_user, <sort key>) indexes serve
+        every page, whatever the number of products of the other users.
+
+        parameters:
+        - fk_user (int): the owner
+        - limit (int): the page size
+        - cursor (str): the next/prev cursor of a previous page
+        - order_by (str): a PRODUCT_ORDERS key
+        - filters (ProductFilters): the filters, None for every product
+
+        return:
+        - (rows, next_cursor, prev_cursor)
         """
-        return self.db.query(Product).offset(skip).limit(limit).all()
+        return paginate(
+            self.filtered_products(fk_user, filters),
+            PRODUCT_ORDERS[order_by],
+            limit,
+            cursor,
+            order_by,
+        )
 
-    def update_product(self, product_id: int, product: Product) -> Optional[Product]:
+    def search_products(
+        self,
+        fk_user: int,
+        query: str,
+        mode: str,
+        limit: int,
+        offset: int = 0,
+        threshold: float = 0.3,
+    ) -> List[Row]:
         """
-        update an Product in database returning Product
+        ranked search of the user's products by name, on PostgreSQL:
+
+        - prefix: the (fk_user, lower(name)) index range, by name
+        - fulltext: every word of the query, ranked by ts_rank through the
+          ix_products_name_tsv GIN index
+        - fuzzy: the pg_trgm `%` operator, ranked by similarity through the
+          ix_products_lower_name_trgm GIN index
+
+        parameters:
+        - fk_user (int): the owner
+        - query (str): the searched text
+        - mode (str): "prefix", "fulltext" or "fuzzy"
+        - limit (int): the number of rows
+        - offset (int): the rows skipped first
+        - threshold (float): the minimum similarity of the fuzzy matches
+
+        return:
+        - rows with the PRODUCT_COLUMNS attributes and the `score`
+        """
+        name = func.lower(Product.name)
+        if mode == "prefix":
+            score = literal(1.0)
+            condition = prefix_range(name, query.lower())
+            order = (name, Product.id)
+        elif mode == "fulltext":
+            document = func.to_tsvector(SEARCH_CONFIG, Product.name)
+            terms = func.plainto_tsquery(SEARCH_CONFIG, query)
+            score = func.ts_rank(document, terms)
+            condition = document.op("@@")(terms)
+            order = (score.desc(), name, Product.id)
+        elif mode == "fuzzy":
+            # `%` compares with the threshold of the transaction
+            self.db.execute(
+                select(
+                    func.set_config(
+                        "pg_trgm.similarity_threshold", str(threshold), True
+                    )
+                )
+            )
+            score = func.similarity(name, query.lower())
+            condition = name.op("%")(query.lower())
+            order = (score.desc(), name, Product.id)
+        else:
+            raise ValueError(f"Unknown search mode {mode}")
+
+        statement = (
+            select(*PRODUCT_COLUMNS, score.label("score"))
+            .where(Product.fk_user == fk_user, condition)
+            .order_by(*order)
+            .offset(offset)
+            .limit(limit)
+        )
+        return self.db.execute(statement).all()
+
+    def list_product_names(self, fk_user: int) -> List[Row]:
+        """
+        the (id, name) of every product of an user, what the in-process search
+        index is built from
+
+        parameters:
+        - fk_user (int): the user id
+
+        return:
+        - rows with `id` and `name`
+        """
+        return (
+            self.db.query(Product.id, Product.name)
+            .filter(Product.fk_user == fk_user)
+            .all()
+        )
+
+    def list_product_rows_by_ids(self, fk_user: int, ids: List[int]) -> List[Row]:
+        """
+        read-only rows of the user's products among `ids`, in one IN query
+
+        parameters:
+        - fk_user (int): the owner, the other users' ids are left out
+        - ids (List[int]): the product ids
+
+        return:
+        - rows with the PRODUCT_COLUMNS attributes, in no particular order
+        """
+        if not ids:
+            return []
+        return (
+            self.db.query(*PRODUCT_COLUMNS)
+            .filter(Product.fk_user == fk_user, Product.id.in_(ids))
+            .all()
+        )
+
+    def update_product_row(
+        self, product_id: int, values: dict, fk_user: Optional[int] = None
+    ) -> Optional[Row]:
+        """
+        update a product with UPDATE ... RETURNING, without loading it first
+
+        The old price and expiry date, needed by the aggregates, come back
+        from the same statement on PostgreSQL (see utils.sql.update_returning)
+        and are only read when they change.
 
         parameters:
         - product_id (int): the Product id
-        - product (Product): the Product data
+        - values (dict): the columns to set
+        - fk_user (int): the owner, the product of another user isn't updated
 
         return:
-        - Product
+        - the updated row with the PRODUCT_COLUMNS attributes
+        - None if the product doesn't exist or belongs to another user
+
+        raises:
+        - ProductExists: the user has another product with the new name and
+          expiry date
         """
+        conditions = [Product.id == product_id]
+        if fk_user is not None:
+            conditions.append(Product.fk_user == fk_user)
+        changes_summary = bool(values.keys() & set(SUMMARY_ATTRS))
+
+        try:
+            result = update_returning(
+                self.db,
+                Product,
+                conditions,
+                values,
+                PRODUCT_COLUMNS,
+                SUMMARY_COLUMNS if changes_summary else (),
+            )
+        except IntegrityError:
+            self.db.rollback()
+            raise ProductExists("Product already exists!")
+        if result is None:
+            self.db.rollback()
+            return None
+
+        row, old = result
+        # the Core statements don't go through the session events
+        if changes_summary:
+            apply_product_changes(self.db, added=[row._mapping], removed=[old])
+        record_collection_writes(self.db, Product, {row.fk_user})
         self.db.commit()
-        self.db.refresh(product)
-        return product
+        return row
 
-    def delete_product(self, product_id: int) -> bool:
+    def delete_product(
+        self, product_id: int, fk_user: Optional[int] = None
+    ) -> Optional[Row]:
         """
-        delete an product in the database returning True
+        delete a product with DELETE ... RETURNING, without loading it first
 
         parameters:
         - product_id (int): the Product id
+        - fk_user (int): the owner, the product of another user isn't deleted
 
         return:
-        - True
+        - the deleted row with the fk_user, price and date_expire attributes
+        - None if the product doesn't exist or belongs to another user
         """
-        product = self.get_product_by_id(product_id)
+        statement = delete(Product).where(Product.id == product_id)
+        if fk_user is not None:
+            statement = statement.where(Product.fk_user == fk_user)
+        row = self.db.execute(statement.returning(*SUMMARY_COLUMNS)).first()
+        if row is None:
+            self.db.rollback()
+            return None
 
-        self.db.delete(product)
+        apply_product_changes(self.db, removed=[row._mapping])
+        record_collection_writes(self.db, Product, {row.fk_user})
         self.db.commit()
-        return True
+        return row
+
+
+class AsyncProductRepo:
+    """
+    Async product repository, runs the ProductRepo queries without blocking the event loop
+    """
+
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.db = db
+
+    async def _run(self, method, *args):
+        return await run_in_session(
+            self.db, lambda session, *a: method(ProductRepo(session), *a), *args
+        )
+
+    async def get_product_by_id(self, product_id: int) -> Optional[Product]:
+        """
+        get products by id inside the database returning the Product
+
+        parameters:
+        - product_id (int): the product id
+
+        return:
+        - product
+        """
+        return await self._run(ProductRepo.get_product_by_id, product_id)
+
+    async def get_product_by_name(
+        self, name: str, fk_user: Optional[int] = None
+    ) -> Optional[Product]:
+        """
+        get product by name inside the database retuning the product
+
+        parameters:
+        - name (str): the product name
+        - fk_user (int): the owner, the name then matches case-insensitive
+
+        return:
+        - Product
+        """
+        return await self._run(ProductRepo.get_product_by_name, name, fk_user)
+
+    async def bulk_create_products(self, rows: List[dict]) -> List[Union[int, str]]:
+        """
+        Create a chunk of products in one transaction with a multi-row insert
+
+        parameters:
+        - rows (List[dict]): the validated product columns
+
+        return:
+        - per row, the new product id or the error message
+        """
+        return await self._run(ProductRepo.bulk_create_products, rows)
+
+    async def upsert_product(
+        self, product_data: ProductCreate, update_price: bool = False
+    ) -> Tuple[Row, bool]:
+        """
+        Create a product unless the user has one with the same name and expiry
+        date, see ProductRepo.upsert_product
+
+        parameters:
+        - product_data (ProductCreate): the product data, fk_user set
+        - update_price (bool): update the price of an existing product
+
+        return:
+        - (the product row, True if it was created)
+        """
+        return await self._run(ProductRepo.upsert_product, product_data, update_price)
+
+    async def list_product_rows_by_user(self, fk_user: int) -> List[Row]:
+        """
+        read-only list of every product of an user, only the PRODUCT_COLUMNS are
+        selected
+
+        parameters:
+        - fk_user (int): the user id
+
+        return:
+        - rows with the PRODUCT_COLUMNS attributes
+        """
+        return await self._run(ProductRepo.list_product_rows_by_user, fk_user)
+
+    async def stream_products_by_user(
+        self, fk_user: int, batch_size: int
+    ) -> AsyncIterator[List[tuple]]:
+        """
+        stream the user's products in batches, only a batch is held in memory.
+        An AsyncSession streams through the async driver, a sync Session reads
+        each batch in the threadpool.
+
+        parameters:
+        - fk_user (int): the owner
+        - batch_size (int): rows fetched per batch
+
+        return:
+        - async iterator of row batches with the EXPORT_COLUMNS
+        """
+        if isinstance(self.db, AsyncSession):
+            result = await self.db.stream(export_statement(fk_user, batch_size))
+            try:
+                async for partition in result.partitions():
+                    yield partition
+            finally:
+                await result.close()
+            return
+
+        batches = ProductRepo(self.db).iter_products_by_user(fk_user, batch_size)
+        async for partition in iterate_in_threadpool(batches):
+            yield partition
+
+    async def list_products_page(
+        self,
+        fk_user: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        order_by: str = "id",
+        filters: Optional[ProductFilters] = None,
+    ) -> Tuple[List[Row], Optional[str], Optional[str]]:
+        """
+        read-only page of the user's products using keyset pagination, only the
+        PRODUCT_COLUMNS are selected
+
+        parameters:
+        - fk_user (int): the owner
+        - limit (int): the page size
+        - cursor (str): the next/prev cursor of a previous page
+        - order_by (str): a PRODUCT_ORDERS key
+        - filters (ProductFilters): the filters, None for every product
+
+        return:
+        - (rows, next_cursor, prev_cursor)
+        """
+        return await self._run(
+            ProductRepo.list_products_page, fk_user, limit, cursor, order_by, filters
+        )
+
+    async def search_products(
+        self,
+        fk_user: int,
+        query: str,
+        mode: str,
+        limit: int,
+        offset: int = 0,
+        threshold: float = 0.3,
+    ) -> List[Row]:
+        """
+        ranked search of the user's products by name, on PostgreSQL
+
+        parameters:
+        - fk_user (int): the owner
+        - query (str): the searched text
+        - mode (str): "prefix", "fulltext" or "fuzzy"
+        - limit (int): the number of rows
+        - offset (int): the rows skipped first
+        - threshold (float): the minimum similarity of the fuzzy matches
+
+        return:
+        - rows with the PRODUCT_COLUMNS attributes and the `score`
+        """
+        return await self._run(
+            ProductRepo.search_products, fk_user, query, mode, limit, offset, threshold
+        )
+
+    async def list_product_names(self, fk_user: int) -> List[Row]:
+        """
+        the (id, name) of every product of an user
+
+        parameters:
+        - fk_user (int): the user id
+
+        return:
+        - rows with `id` and `name`
+        """
+        return await self._run(ProductRepo.list_product_names, fk_user)
+
+    async def list_product_rows_by_ids(self, fk_user: int, ids: List[int]) -> List[Row]:
+        """
+        read-only rows of the user's products among `ids`, in one IN query
+
+        parameters:
+        - fk_user (int): the owner
+        - ids (List[int]): the product ids
+
+        return:
+        - rows with the PRODUCT_COLUMNS attributes, in no particular order
+        """
+        return await self._run(ProductRepo.list_product_rows_by_ids, fk_user, ids)
+
+    async def update_product_row(
+        self, product_id: int, values: dict, fk_user: Optional[int] = None
+    ) -> Optional[Row]:
+        """
+        update a product with UPDATE ... RETURNING, see ProductRepo.update_product_row
+
+        parameters:
+        - product_id (int): the Product id
+        - values (dict): the columns to set
+        - fk_user (int): the owner, the product of another user isn't updated
+
+        return:
+        - the updated row, None if the user has no such product
+        """
+        return await self._run(
+            ProductRepo.update_product_row, product_id, values, fk_user
+        )
+
+    async def delete_product(
+        self, product_id: int, fk_user: Optional[int] = None
+    ) -> Optional[Row]:
+        """
+        delete a product with DELETE ... RETURNING
+
+        parameters:
+        - product_id (int): the Product id
+        - fk_user (int): the owner, the product of another user isn't deleted
+
+        return:
+        - the deleted row with the fk_user, price and date_expire attributes
+        - None if the product doesn't exist or belongs to another user
+        """
+        return await self._run(ProductRepo.delete_product, product_id, fk_user)
@@ -0,0 +1,386 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Iterable, List, Mapping, Optional, Union
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from core.db import run_in_session
+from models.product import Product
+from models.summary import UserExpiryBucket, UserProductSummary
+from models.user import User
+from utils.sql import dialect_insert
+
+# the Product columns the aggregates are computed from
+SUMMARY_ATTRS = ("fk_user", "price", "date_expire")
+
+
+def money(value) -> Decimal:
+    """
+    a price as a Decimal, the float prices of the new products included
+    """
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+class SummaryDeltas:
+    """
+    What a set of product writes adds to the aggregates: per user and per
+    (user, expiry date), the change of the product count and of the total price
+    """
+
+    def __init__(self):
+        self.users = defaultdict(lambda: [0, Decimal(0)])
+        self.buckets = defaultdict(lambda: [0, Decimal(0)])
+
+    def add(self, fk_user: int, price, date_expire: Optional[date], sign: int = 1):
+        """
+        count a product in (sign=1) or out (sign=-1) of its user's aggregates
+        """
+        targets = [self.users[fk_user]]
+        if date_expire is not None:
+            targets.append(self.buckets[(fk_user, date_expire)])
+        for delta in targets:
+            delta[0] += sign
+            delta[1] += sign * money(price)
+
+    def without(self, owners: set) -> "SummaryDeltas":
+        """
+        the deltas of the other users, the deleted users have no aggregates
+        """
+        kept = SummaryDeltas()
+        kept.users.update(
+            (key, delta) for key, delta in self.users.items() if key not in owners
+        )
+        kept.buckets.update(
+            (key, delta) for key, delta in self.buckets.items() if key[0] not in owners
+        )
+        return kept
+
+
+def apply_deltas(db: Session, deltas: SummaryDeltas) -> None:
+    """
+    apply_deltas
+
+    Add the deltas to the aggregates with one upsert per table, in the
+    transaction of the writes. The buckets left without products are deleted.
+
+    parameters:
+    - db (Session): the session of the product writes
+    - deltas (SummaryDeltas): the changes
+    """
+    for model, key_columns, changes in (
+        (UserProductSummary, ("fk_user",), deltas.users.items()),
+        (UserExpiryBucket, ("fk_user", "date_expire"), deltas.buckets.items()),
+    ):
+        rows = [
+            {
+                **dict(zip(key_columns, key if isinstance(key, tuple) else (key,))),
+                "product_count": count,
+                "total_price": total,
+            }
+            for key, (count, total) in changes
+            if count or total
+        ]
+        if not rows:
+            continue
+
+        table = model.__table__
+        statement = dialect_insert(db, table)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={
+                "product_count": table.c.product_count
+                + statement.excluded.product_count,
+                "total_price": table.c.total_price + statement.excluded.total_price,
+            },
+        )
+        db.execute(statement, rows)
+
+    owners = {owner for owner, _ in deltas.buckets}
+    if owners:
+        db.execute(
+            delete(UserExpiryBucket).where(
+                UserExpiryBucket.fk_user.in_(owners),
+                UserExpiryBucket.product_count <= 0,
+            )
+        )
+
+
+def apply_product_changes(
+    db: Session,
+    added: Iterable[Mapping[str, Any]] = (),
+    removed: Iterable[Mapping[str, Any]] = (),
+) -> None:
+    """
+    apply_product_changes
+
+    Update the aggregates for products written without the ORM unit of work
+    (Core INSERT/UPDATE/DELETE statements), before the transaction commits.
+
+    parameters:
+    - db (Session): the session of the writes
+    - added (Iterable): the products added, mappings with fk_user, price and
+      date_expire (an updated product is removed with its old values and added
+      with the new ones)
+    - removed (Iterable): the products removed
+    """
+    deltas = SummaryDeltas()
+    for sign, rows in ((1, added), (-1, removed)):
+        for row in rows:
+            deltas.add(row["fk_user"], row["price"], row.get("date_expire"), sign)
+    apply_deltas(db, deltas)
+
+
+def old_values(entity) -> tuple:
+    """
+    the SUMMARY_ATTRS of a product as they were committed
+    """
+    state = inspect(entity)
+    values = []
+    for attr in SUMMARY_ATTRS:
+        history = state.attrs[attr].history
+        committed = (*history.deleted, *history.unchanged)
+        values.append(committed[0] if committed else None)
+    return tuple(values)
+
+
+def new_values(entity) -> tuple:
+    """
+    the SUMMARY_ATTRS of a product as they're flushed
+    """
+    return tuple(getattr(entity, attr) for attr in SUMMARY_ATTRS)
+
+
+@event.listens_for(Session, "after_flush")
+def update_summaries(session, flush_context):
+    """
+    Apply what the flushed products change to their users' aggregates, in the
+    same transaction. Every session writes through here: the services, the
+    Celery tasks and the AsyncSession alike. The aggregates of the deleted
+    users are deleted with them.
+    """
+    deltas = SummaryDeltas()
+    deleted_users = set()
+
+    for entity in session.new:
+        if isinstance(entity, Product):
+            deltas.add(*new_values(entity))
+    for entity in session.dirty:
+        if isinstance(entity, Product) and session.is_modified(entity):
+            old, new = old_values(entity), new_values(entity)
+            if old != new:
+                deltas.add(*old, sign=-1)
+                deltas.add(*new)
+    for entity in session.deleted:
+        if isinstance(entity, Product):
+            deltas.add(*old_values(entity), sign=-1)
+        elif isinstance(entity, User):
+            deleted_users.add(entity.id)
+
+    if deleted_users:
+        deltas = deltas.without(deleted_users)
+        for model in (UserExpiryBucket, UserProductSummary):
+            session.execute(delete(model).where(model.fk_user.in_(deleted_users)))
+    apply_deltas(session, deltas)
+
+
+class SummaryRepo:
+    """
+    Summary repository, reads the per user aggregates and rebuilds or checks
+    them against the products table
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_summary(self, fk_user: int, today: date, horizon_days: int) -> dict:
+        """
+        the aggregates of an user, in one round trip: each value is a scalar
+        subquery on the primary keys of the aggregate tables
+
+        parameters:
+        - fk_user (int): the user id
+        - today (date): the first day of the expiry window
+        - horizon_days (int): how many days ahead the expiry window goes
+
+        return:
+        - dict with product_count, total_price, soonest_expiry,
+          expiring_count and expiring_value
+        """
+        summary = UserProductSummary
+        bucket = UserExpiryBucket
+        window = (
+            bucket.fk_user == fk_user,
+            bucket.date_expire >= today,
+            bucket.date_expire <= today + timedelta(days=horizon_days),
+        )
+        statement = select(
+            select(summary.product_count)
+            .where(summary.fk_user == fk_user)
+            .scalar_subquery()
+            .label("product_count"),
+            select(summary.total_price)
+            .where(summary.fk_user == fk_user)
+            .scalar_subquery()
+            .label("total_price"),
+            select(func.min(bucket.date_expire))
+            .where(bucket.fk_user == fk_user, bucket.date_expire >= today)
+            .scalar_subquery()
+            .label("soonest_expiry"),
+            select(func.sum(bucket.product_count))
+            .where(*window)
+            .scalar_subquery()
+            .label("expiring_count"),
+            select(func.sum(bucket.total_price))
+            .where(*window)
+            .scalar_subquery()
+            .label("expiring_value"),
+        )
+        row = self.db.execute(statement).one()
+        return {
+            "product_count": row.product_count or 0,
+            "total_price": row.total_price or 0,
+            "soonest_expiry": row.soonest_expiry,
+            "expiring_count": row.expiring_count or 0,
+            "expiring_value": row.expiring_value or 0,
+        }
+
+    def expected_summaries(self, fk_user: Optional[int] = None):
+        """
+        the per user aggregates computed from the products table
+        """
+        statement = select(
+            Product.fk_user,
+            func.count(Product.id).label("product_count"),
+            func.sum(Product.price).label("total_price"),
+        ).group_by(Product.fk_user)
+        if fk_user is not None:
+            statement = statement.where(Product.fk_user == fk_user)
+        return statement
+
+    def expected_buckets(self, fk_user: Optional[int] = None):
+        """
+        the per (user, expiry date) aggregates computed from the products table
+        """
+        statement = (
+            select(
+                Product.fk_user,
+                Product.date_expire,
+                func.count(Product.id).label("product_count"),
+                func.sum(Product.price).label("total_price"),
+            )
+            .where(Product.date_expire.is_not(None))
+            .group_by(Product.fk_user, Product.date_expire)
+        )
+        if fk_user is not None:
+            statement = statement.where(Product.fk_user == fk_user)
+        return statement
+
+    def rebuild(self, fk_user: Optional[int] = None) -> int:
+        """
+        rebuild
+
+        Recompute the aggregates from the products table with two
+        INSERT ... SELECT, in one transaction. Writes to the same users while
+        it runs may be counted twice, run it with the writes stopped or per
+        user.
+
+        parameters:
+        - fk_user (int): the user to rebuild, every user by default
+
+        return:
+        - the number of users rebuilt
+        """
+        for model in (UserExpiryBucket, UserProductSummary):
+            statement = delete(model)
+            if fk_user is not None:
+                statement = statement.where(model.fk_user == fk_user)
+            self.db.execute(statement)
+
+        users = self.db.execute(
+            UserProductSummary.__table__.insert().from_select(
+                ["fk_user", "product_count", "total_price"],
+                self.expected_summaries(fk_user),
+            )
+        ).rowcount
+        self.db.execute(
+            UserExpiryBucket.__table__.insert().from_select(
+                ["fk_user", "date_expire", "product_count", "total_price"],
+                self.expected_buckets(fk_user),
+            )
+        )
+        self.db.commit()
+        return users
+
+    def check(self, fk_user: Optional[int] = None) -> List[dict]:
+        """
+        check
+
+        Compare the aggregates with the products table. A missing aggregate
+        row and a row of zeros are the same.
+
+        parameters:
+        - fk_user (int): the user to check, every user by default
+
+        return:
+        - list of the mismatches, each with the table, the key, the expected
+          and the stored (product_count, total_price); empty when consistent
+        """
+        mismatches = []
+        for model, key_columns, expected_statement in (
+            (UserProductSummary, ("fk_user",), self.expected_summaries(fk_user)),
+            (
+                UserExpiryBucket,
+                ("fk_user", "date_expire"),
+                self.expected_buckets(fk_user),
+            ),
+        ):
+            stored_statement = select(model)
+            if fk_user is not None:
+                stored_statement = stored_statement.where(model.fk_user == fk_user)
+
+            def totals(rows) -> dict:
+                return {
+                    tuple(getattr(row, column) for column in key_columns): (
+                        row.product_count,
+                        money(row.total_price).quantize(Decimal("0.01")),
+                    )
+                    for row in rows
+                    if row.product_count or row.total_price
+                }
+
+            expected = totals(self.db.execute(expected_statement).all())
+            stored = totals(self.db.execute(stored_statement).scalars().all())
+            for key in sorted(expected.keys() | stored.keys(), key=str):
+                zero = (0, Decimal("0.00"))
+                if expected.get(key, zero) != stored.get(key, zero):
+                    mismatches.append(
+                        {
+                            "table": model.__tablename__,
+                            "key": dict(zip(key_columns, key)),
+                            "expected": expected.get(key, zero),
+                            "stored": stored.get(key, zero),
+                        }
+                    )
+        return mismatches
+
+
+class AsyncSummaryRepo:
+    """
+    Async summary repository, runs the SummaryRepo queries without blocking the event loop
+    """
+
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.db = db
+
+    async def get_summary(self, fk_user: int, today: date, horizon_days: int) -> dict:
+        """
+        the aggregates of an user, see SummaryRepo.get_summary
+        """
+        return await run_in_session(
+            self.db,
+            lambda session, *args: SummaryRepo(session).get_summary(*args),
+            fk_user,
+            today,
+            horizon_days,
+        )
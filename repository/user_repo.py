@@ -1,8 +1,20 @@
+from sqlalchemy import delete
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from core.cache import record_collection_writes
+from core.db import run_in_session
+from models.product import Product
+from models.summary import UserExpiryBucket, UserProductSummary
 from models.user import User
-from schemas.user import UserCreate, UserUpdate
+from schemas.user import UserCreate
 from core.security.hashing import hash_password
-from typing import Optional, List
+from utils.pagination import paginate
+from utils.sql import update_returning
+from typing import Optional, List, Tuple, Union
+
+# the UserResponse columns, the read-only lists select them as plain rows
+USER_COLUMNS = (User.id, User.name, User.email, User.created_at)
 
 
 class UserRepo:
@@ -49,17 +61,20 @@ class UserRepo:
         """
         return self.db.query(User).filter(User.name == username).first()
 
-    def create_user(self, user_data: UserCreate) -> User:
+    def create_user(
+        self, user_data: UserCreate, hashed_password: Optional[str] = None
+    ) -> User:
         """
         Create an account for the user returning the User
 
         parameters:
         - user_data (UserCreate): the user data to create the account
+        - hashed_password (str): the password already hashed, hashed here if not given
 
         return:
         - User
         """
-        hashed_pwd = hash_password(user_data.password)
+        hashed_pwd = hashed_password or hash_password(user_data.password)
         new_user = User(
             name=user_data.name, email=user_data.email, hashed_password=hashed_pwd
         )
@@ -68,47 +83,214 @@ class UserRepo:
         self.db.refresh(new_user)
         return new_user
 
-    def list_users(self, skip: int = 0, limit: int = 100) -> List[User]:
+    def list_user_rows_by_ids(self, ids: List[int]) -> List[Row]:
         """
-        list of all users retuning User
+        read-only rows of the users among `ids`, in one IN query
 
         parameters:
-        - skip (int): where start the much accounts you can get
-        - limit (int): where end the list
+        - ids (List[int]): the user ids
 
         return:
-        - User
+        - rows with the USER_COLUMNS attributes, in no particular order
         """
-        return self.db.query(User).offset(skip).limit(limit).all()
+        if not ids:
+            return []
+        return self.db.query(*USER_COLUMNS).filter(User.id.in_(ids)).all()
 
-    def update_user(self, user_id: int, user: User) -> Optional[User]:
+    def list_users_page(
+        self, limit: int, cursor: Optional[str] = None
+    ) -> Tuple[List[Row], Optional[str], Optional[str]]:
         """
-        update an user in database returning User
+        read-only page of users using keyset pagination on the id, only the
+        USER_COLUMNS are selected
 
         parameters:
-        - user_id (int): the user id
-        - user (User): the User data
+        - limit (int): the page size
+        - cursor (str): the next/prev cursor of a previous page
 
         return:
-        - User
+        - (rows, next_cursor, prev_cursor)
+        """
+        return paginate(self.db.query(*USER_COLUMNS), (User.id,), limit, cursor)
+
+    def update_user_row(self, user_id: int, values: dict) -> Optional[Tuple[Row, dict]]:
         """
+        update an user with UPDATE ... RETURNING, without loading it first
 
+        parameters:
+        - user_id (int): the user id
+        - values (dict): the columns to set
+
+        return:
+        - (the updated row with the USER_COLUMNS attributes, the old email when
+          it changes), None if the user doesn't exist
+        """
+        result = update_returning(
+            self.db,
+            User,
+            [User.id == user_id],
+            values,
+            USER_COLUMNS,
+            (User.email,) if "email" in values else (),
+        )
+        if result is None:
+            self.db.rollback()
+            return None
+        # the Core statements don't go through the session events
+        record_collection_writes(self.db, User, {user_id})
         self.db.commit()
-        self.db.refresh(user)
-        return user
+        return result
 
-    def delete_user(self, user_id: int) -> bool:
+    def delete_user(self, user_id: int) -> Optional[Tuple[Row, List[int]]]:
         """
-        delete an user in the database returning True
+        delete an user, its products and its aggregates with one DELETE per
+        table, instead of loading the user and every product to delete them
+        one by one
 
         parameters:
         - user_id (int): the user id
 
         return:
-        - True
+        - (the deleted row with the id and email attributes, the ids of the
+          deleted products), None if the user doesn't exist
         """
-        user = self.get_user_by_id(user_id)
+        product_ids = list(
+            self.db.execute(
+                delete(Product).where(Product.fk_user == user_id).returning(Product.id)
+            ).scalars()
+        )
+        for model in (UserExpiryBucket, UserProductSummary):
+            self.db.execute(delete(model).where(model.fk_user == user_id))
+        user = self.db.execute(
+            delete(User).where(User.id == user_id).returning(User.id, User.email)
+        ).first()
+        if user is None:
+            self.db.rollback()
+            return None
 
-        self.db.delete(user)
+        record_collection_writes(self.db, Product, {user_id})
+        record_collection_writes(self.db, User, {user_id})
         self.db.commit()
-        return True
+        return user, product_ids
+
+
+class AsyncUserRepo:
+    """
+    Async user repository, runs the UserRepo queries without blocking the event loop
+    """
+
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.db = db
+
+    async def _run(self, method, *args):
+        return await run_in_session(
+            self.db, lambda session, *a: method(UserRepo(session), *a), *args
+        )
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        """
+        get users by id inside the database returning the user
+
+        parameters:
+        - user_id (int): the user id
+
+        return:
+        - User
+        """
+        return await self._run(UserRepo.get_user_by_id, user_id)
+
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        """
+        get user by email inside the database retuning the user
+
+        parameters:
+        - email (str): the users email
+
+        return:
+        - User
+        """
+        return await self._run(UserRepo.get_user_by_email, email)
+
+    async def get_user_by_username(self, username: str) -> Optional[User]:
+        """
+        get user by username inside the database retuning the user
+
+        parameters:
+        - username (str): the users username
+
+        return:
+        - User
+        """
+        return await self._run(UserRepo.get_user_by_username, username)
+
+    async def create_user(
+        self, user_data: UserCreate, hashed_password: Optional[str] = None
+    ) -> User:
+        """
+        Create an account for the user returning the User
+
+        parameters:
+        - user_data (UserCreate): the user data to create the account
+        - hashed_password (str): the password already hashed, hashed here if not given
+
+        return:
+        - User
+        """
+        return await self._run(UserRepo.create_user, user_data, hashed_password)
+
+    async def list_user_rows_by_ids(self, ids: List[int]) -> List[Row]:
+        """
+        read-only rows of the users among `ids`, in one IN query
+
+        parameters:
+        - ids (List[int]): the user ids
+
+        return:
+        - rows with the USER_COLUMNS attributes, in no particular order
+        """
+        return await self._run(UserRepo.list_user_rows_by_ids, ids)
+
+    async def list_users_page(
+        self, limit: int, cursor: Optional[str] = None
+    ) -> Tuple[List[Row], Optional[str], Optional[str]]:
+        """
+        read-only page of users using keyset pagination on the id, only the
+        USER_COLUMNS are selected
+
+        parameters:
+        - limit (int): the page size
+        - cursor (str): the next/prev cursor of a previous page
+
+        return:
+        - (rows, next_cursor, prev_cursor)
+        """
+        return await self._run(UserRepo.list_users_page, limit, cursor)
+
+    async def update_user_row(
+        self, user_id: int, values: dict
+    ) -> Optional[Tuple[Row, dict]]:
+        """
+        update an user with UPDATE ... RETURNING, see UserRepo.update_user_row
+
+        parameters:
+        - user_id (int): the user id
+        - values (dict): the columns to set
+
+        return:
+        - (the updated row, the old email when it changes), None if the user
+          doesn't exist
+        """
+        return await self._run(UserRepo.update_user_row, user_id, values)
+
+    async def delete_user(self, user_id: int) -> Optional[Tuple[Row, List[int]]]:
+        """
+        delete an user with its products, one DELETE per table
+
+        parameters:
+        - user_id (int): the user id
+
+        return:
+        - (the deleted row, the ids of the deleted products), None if the user
+          doesn't exist
+        """
+        return await self._run(UserRepo.delete_user, user_id)
@@ -0,0 +1,21 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import date, datetime
+from typing import Optional
+
+
+class AlertResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    fk_user: int
+    fk_product: int
+    date_expire: date
+    created_at: Optional[datetime] = None
+
+
+class AlertScanResult(BaseModel):
+    window_start: date
+    window_end: date
+    products: int
+    alerts_created: int
+    users: dict[int, int]
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Literal
+from schemas.product import ProductResponse
+
+
+class BudgetPlanRequest(BaseModel):
+    budget: float = Field(ge=0)
+    mode: Literal["greedy", "priority", "exact"] = "greedy"
+    priorities: dict[int, Annotated[float, Field(ge=0)]] = Field(default_factory=dict)
+
+
+class BudgetPlanResponse(BaseModel):
+    mode: str
+    budget: float
+    total: float
+    remaining: float
+    optimal: bool
+    items: list[ProductResponse]
+    left_out: list[ProductResponse]
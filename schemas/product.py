@@ -1,23 +1,89 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from datetime import date
+from typing import Optional
 
 
 class ProductCreate(BaseModel):
     name: str = Field(min_length=3, max_length=50)
-    fk_user: int
+    # ignored, POST /product and the bulk import set the authenticated user
+    fk_user: Optional[int] = None
     date_expire: date
     price: float
 
 
 class ProductResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     name: str = Field(min_length=3, max_length=50)
     fk_user: int
-    date_expire: date
+    date_expire: Optional[date] = None
     price: float
 
 
+class ProductFilters(BaseModel):
+    """
+    The GET /product filters, every one is optional
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    min_price: Optional[float] = Field(None, ge=0)
+    max_price: Optional[float] = Field(None, ge=0)
+    expire_after: Optional[date] = None
+    expire_before: Optional[date] = None
+    name_prefix: Optional[str] = Field(None, min_length=1, max_length=50)
+
+
+# validates a whole list of products at once, see utils.serialization
+ProductList = TypeAdapter(list[ProductResponse])
+
+
+class ProductPage(BaseModel):
+    items: list[ProductResponse]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+class BatchGet(BaseModel):
+    """
+    The ids of a batch get, POST /product/batch-get and POST /user/batch-get
+    """
+
+    ids: list[int] = Field(min_length=1)
+
+
+class ProductBatch(BaseModel):
+    items: list[ProductResponse]
+    missing: list[int] = []
+
+
+class ProductSearchHit(ProductResponse):
+    # prefix matches score 1, full-text ts_rank, fuzzy the trigram similarity
+    score: float
+
+
+ProductSearchList = TypeAdapter(list[ProductSearchHit])
+
+
+class ProductSearchPage(BaseModel):
+    items: list[ProductSearchHit]
+    next_offset: Optional[int] = None
+
+
 class ProductUpdate(BaseModel):
     name: str = Field(min_length=3, max_length=50)
     date_expire: date
     price: float
+
+
+class ProductBulkError(BaseModel):
+    row: int
+    errors: list[str]
+
+
+class ProductBulkResult(BaseModel):
+    created: int = 0
+    failed: int = 0
+    ids: list[int] = []
+    errors: list[ProductBulkError] = []
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import Optional
+
+
+class UserSummary(BaseModel):
+    user_id: int
+    product_count: int
+    total_price: float
+    soonest_expiry: Optional[date] = None
+    # the products expiring from today to today + horizon_days
+    horizon_days: int
+    expiring_count: int
+    expiring_value: float
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, TypeAdapter
 from datetime import datetime
+from typing import Optional
 
 
 class UserCreate(BaseModel):
@@ -14,12 +15,29 @@ class UserLogin(BaseModel):
 
 
 class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     name: str
     email: str
     created_at: datetime
 
 
+# validates a whole list of users at once, see utils.serialization
+UserList = TypeAdapter(list[UserResponse])
+
+
+class UserPage(BaseModel):
+    items: list[UserResponse]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+class UserBatch(BaseModel):
+    items: list[UserResponse]
+    missing: list[int] = []
+
+
 class UserUpdate(BaseModel):
     name: str
     email: str
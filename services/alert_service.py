@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+from typing import List, Optional, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from core.config import get_settings
+from models.alert import Alert
+from repository.alert_repo import AlertRepo, AsyncAlertRepo
+from schemas.alert import AlertScanResult
+
+settings = get_settings()
+
+EXPIRY_SCAN_JOB = "expiry_scan"
+
+
+class AlertService:
+    """
+    the Alert services, finds the products close to expiring and writes the alerts
+    """
+
+    def __init__(self, db: Session):
+        self.alert_repo = AlertRepo(db)
+
+    def scan_expiring(
+        self,
+        today: Optional[date] = None,
+        horizon_days: int = settings.ALERT_HORIZON_DAYS,
+        batch_size: int = settings.ALERT_BATCH_SIZE,
+    ) -> AlertScanResult:
+        """
+        scan the products expiring within the horizon and write their alerts in bulk
+
+        Each chunk is one query and one multi-row insert; the watermark makes the
+        next run read only the products changed since this one or that entered
+        the window. The watermark moves only once the whole scan is done, and the
+        inserts skip existing alerts, so a failed run is just run again.
+
+        parameters:
+        - today (date): the window start, today by default
+        - horizon_days (int): how many days ahead the window goes
+        - batch_size (int): products read and alerts written per chunk
+
+        return:
+        - AlertScanResult with the alerts created grouped per user
+        """
+        today = today or date.today()
+        window_end = today + timedelta(days=horizon_days)
+        started_at = self.alert_repo.now()
+
+        watermark = self.alert_repo.get_watermark(EXPIRY_SCAN_JOB)
+        changed_since = previous_window_end = None
+        if watermark is not None:
+            changed_since = watermark.last_run_at - timedelta(
+                seconds=settings.ALERT_WATERMARK_OVERLAP_SECONDS
+            )
+            previous_window_end = watermark.window_end
+
+        products = created = 0
+        users: dict[int, int] = {}
+        last_key = None
+        while True:
+            rows = self.alert_repo.expiring_products_chunk(
+                today,
+                window_end,
+                changed_since,
+                previous_window_end,
+                last_key,
+                batch_size,
+            )
+            if not rows:
+                break
+
+            inserted = self.alert_repo.bulk_create_alerts(
+                [
+                    {
+                        "fk_user": row.fk_user,
+                        "fk_product": row.id,
+                        "date_expire": row.date_expire,
+                    }
+                    for row in rows
+                ]
+            )
+            created += len(inserted)
+            for fk_user in inserted:
+                users[fk_user] = users.get(fk_user, 0) + 1
+
+            products += len(rows)
+            last_key = (rows[-1].date_expire, rows[-1].id)
+            if len(rows) < batch_size:
+                break
+
+        self.alert_repo.save_watermark(EXPIRY_SCAN_JOB, started_at, window_end)
+
+        return AlertScanResult(
+            window_start=today,
+            window_end=window_end,
+            products=products,
+            alerts_created=created,
+            users=users,
+        )
+
+
+class AsyncAlertService:
+    """
+    the Alert services for the async routes
+    """
+
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.alert_repo = AsyncAlertRepo(db)
+
+    async def list_alerts(self, fk_user: int) -> List[Alert]:
+        """
+        list the alerts of the user for products that didn't expire yet
+
+        parameters:
+        - fk_user (int): the user id
+
+        return:
+        - Alert
+        """
+        return await self.alert_repo.list_alerts_by_user(fk_user, date.today())
@@ -0,0 +1,189 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import List, Optional, Tuple, Union
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from core.config import get_settings
+from repository.product_repo import AsyncProductRepo
+from schemas.budget import BudgetPlanRequest, BudgetPlanResponse
+import numpy as np
+
+settings = get_settings()
+
+
+def to_cents(value) -> int:
+    """
+    Convert a Numeric price (or the float budget) to integer cents
+    """
+    return int((Decimal(str(value)) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def greedy_plan(prices: np.ndarray, budget: int) -> np.ndarray:
+    """
+    greedy_plan
+
+    Cheapest first, which buys as many products as possible. The chosen items
+    are a prefix of the sorted prices, so it's a single cumulative sum.
+
+    parameters:
+    - prices (ndarray): the prices in cents
+    - budget (int): the budget in cents
+
+    return:
+    - indexes of the chosen products
+    """
+    order = np.argsort(prices, kind="stable")
+    affordable = np.cumsum(prices[order]) <= budget
+    return order[affordable]
+
+
+def priority_plan(
+    prices: np.ndarray, priorities: np.ndarray, budget: int
+) -> np.ndarray:
+    """
+    priority_plan
+
+    Highest priority per cent first, skipping what doesn't fit anymore.
+
+    parameters:
+    - prices (ndarray): the prices in cents
+    - priorities (ndarray): the weight of each product
+    - budget (int): the budget in cents
+
+    return:
+    - indexes of the chosen products
+    """
+    density = priorities / np.maximum(prices, 1)
+    order = np.lexsort((prices, -density))
+
+    chosen = []
+    remaining = budget
+    for index in order[prices[order] <= budget]:
+        if prices[index] <= remaining:
+            chosen.append(index)
+            remaining -= prices[index]
+    return np.asarray(chosen, dtype=np.int64)
+
+
+def knapsack_plan(
+    prices: np.ndarray, priorities: np.ndarray, budget: int, max_cells: int
+) -> Tuple[np.ndarray, bool]:
+    """
+    knapsack_plan
+
+    0/1 knapsack maximizing the sum of priorities, vectorized over the budget.
+    The work is items x budget cells; above max_cells the prices are grouped in
+    coarser units (rounded up, so the plan always fits the budget) and the plan
+    may miss the optimum by less than one unit per item. That bounds the runtime
+    and the memory for any list size.
+
+    parameters:
+    - prices (ndarray): the prices in cents
+    - priorities (ndarray): the weight of each product
+    - budget (int): the budget in cents
+    - max_cells (int): the items x budget cells allowed
+
+    return:
+    - (indexes of the chosen products, True if the plan is optimal)
+    """
+    candidates = np.flatnonzero((prices <= budget) & (priorities > 0))
+    if prices[candidates].sum() <= budget:
+        return candidates, True
+
+    free = candidates[prices[candidates] == 0]
+    paid = candidates[prices[candidates] > 0]
+
+    unit = max(1, -(-len(paid) * (budget + 1) // max_cells))
+    weights = -(-prices[paid] // unit)
+    capacity = budget // unit
+    values = priorities[paid]
+
+    best = np.zeros(capacity + 1)
+    taken = np.zeros((len(paid), capacity + 1), dtype=bool)
+    for row, (weight, value) in enumerate(zip(weights, values)):
+        if weight > capacity:
+            continue
+        candidate = best[: capacity + 1 - weight] + value
+        improved = candidate > best[weight:]
+        taken[row, weight:] = improved
+        best[weight:] = np.where(improved, candidate, best[weight:])
+
+    chosen = []
+    cell = capacity
+    for row in range(len(paid) - 1, -1, -1):
+        if taken[row, cell]:
+            chosen.append(paid[row])
+            cell -= weights[row]
+
+    return np.concatenate([free, np.asarray(chosen, dtype=np.int64)]), unit == 1
+
+
+class BudgetService:
+    """
+    the Budget services, shows what a budget can and cannot buy from the user products
+    """
+
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.product_repo = AsyncProductRepo(db)
+
+    async def plan(
+        self, fk_user: int, request: BudgetPlanRequest
+    ) -> BudgetPlanResponse:
+        """
+        plan the best affordable subset of the user products
+
+        parameters:
+        - fk_user (int): the user id
+        - request (BudgetPlanRequest): the budget, the mode and the priorities
+
+        return:
+        - BudgetPlanResponse
+        """
+        products = await self.product_repo.list_product_rows_by_user(fk_user)
+        return await run_in_threadpool(self.solve, products, request)
+
+    def solve(
+        self, products: List[Row], request: BudgetPlanRequest
+    ) -> BudgetPlanResponse:
+        """
+        run the solver of the requested mode, it's CPU bound so it runs in the threadpool
+        """
+        budget = to_cents(request.budget)
+        prices = np.fromiter(
+            (to_cents(product.price) for product in products),
+            dtype=np.int64,
+            count=len(products),
+        )
+        priorities = np.fromiter(
+            (request.priorities.get(product.id, 1.0) for product in products),
+            dtype=np.float64,
+            count=len(products),
+        )
+
+        optimal: Optional[bool] = None
+        if request.mode == "greedy":
+            chosen = greedy_plan(prices, budget)
+        elif request.mode == "priority":
+            chosen = priority_plan(prices, priorities, budget)
+        else:
+            chosen, optimal = knapsack_plan(
+                prices, priorities, budget, settings.BUDGET_DP_MAX_CELLS
+            )
+
+        chosen_set = set(chosen.tolist())
+        total = int(prices[chosen].sum()) if len(chosen) else 0
+
+        return BudgetPlanResponse(
+            mode=request.mode,
+            budget=budget / 100,
+            total=total / 100,
+            remaining=(budget - total) / 100,
+            optimal=bool(optimal) if request.mode == "exact" else False,
+            items=[products[index] for index in sorted(chosen_set)],
+            left_out=[
+                product
+                for index, product in enumerate(products)
+                if index not in chosen_set
+            ],
+        )
@@ -1,19 +1,187 @@
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from datetime import date
+from core.config import get_settings
+from core.dataloader import DataLoader
 from models.product import Product
-from schemas.product import ProductCreate, ProductUpdate
-from repository.product_repo import ProductRepo
-from typing import List, Optional
+from schemas.product import (
+    ProductBulkError,
+    ProductBulkResult,
+    ProductCreate,
+    ProductFilters,
+    ProductUpdate,
+)
+from repository.cache import (
+    CachedAsyncProductRepo,
+    collection_version,
+    invalidate,
+)
+from repository.product_repo import EXPORT_COLUMNS
+from utils.bulk import RowError, format_rows
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
+settings = get_settings()
 
-class ProductService:
+
+def validate_bulk_row(record: Any, fk_user: int) -> Union[dict, List[str]]:
+    """
+    validate_bulk_row
+
+    Validate one imported row like POST /product does, for the importing user.
+
+    parameters:
+    - record: the parsed row, a dict or a RowError
+    - fk_user (int): the owner of the row, an fk_user in the record is ignored
+
+    return:
+    - the product columns, or the list of error messages
+    """
+    if isinstance(record, RowError):
+        return [record.message]
+
+    if isinstance(record, dict):
+        record = {**record, "fk_user": fk_user}
+    try:
+        product = ProductCreate.model_validate(record)
+    except ValidationError as exc:
+        return [
+            f"{'.'.join(str(loc) for loc in error['loc']) or 'row'}: {error['msg']}"
+            for error in exc.errors()
+        ]
+
+    if product.date_expire < date.today():
+        return ["date_expire: The date cannot be before today!"]
+    return product.model_dump()
+
+
+def update_values(product_data: ProductUpdate) -> dict:
+    """
+    the columns an update sets, the empty values keep the current ones
+    """
+    return {
+        column: value for column, value in product_data.model_dump().items() if value
+    }
+
+
+def invalidate_product(product_id: int) -> None:
+    """
+    Drop a product updated or deleted by a Core statement from the cache, the
+    statement doesn't go through the session events. The repository bumps the
+    version of the user's products.
+    """
+    invalidate(Product, id=product_id)
+
+
+class BulkImport:
+    """
+    Collects the rows of a bulk import of an user in chunks and the import result
+    """
+
+    def __init__(self, chunk_size: int, fk_user: int):
+        self.chunk_size = chunk_size
+        self.fk_user = fk_user
+        self.chunk: List[Tuple[int, dict]] = []
+        self.result = ProductBulkResult()
+
+    def add(self, row: int, record: Any) -> bool:
+        """
+        validate a row, returning True when the chunk is full
+        """
+        data = validate_bulk_row(record, self.fk_user)
+        if isinstance(data, list):
+            self.fail(row, data)
+        else:
+            self.chunk.append((row, data))
+        return len(self.chunk) >= self.chunk_size
+
+    def take(self) -> Tuple[List[int], List[dict]]:
+        """
+        empty the chunk returning its rows and columns
+        """
+        rows = [row for row, _ in self.chunk]
+        data = [data for _, data in self.chunk]
+        self.chunk = []
+        return rows, data
+
+    def done(self, rows: List[int], results: List[Union[int, str]]) -> None:
+        """
+        record the inserted chunk
+        """
+        for row, result in zip(rows, results):
+            if isinstance(result, int):
+                self.result.created += 1
+                self.result.ids.append(result)
+            else:
+                self.fail(row, [result])
+
+    def fail(self, row: int, errors: List[str]) -> None:
+        self.result.failed += 1
+        if len(self.result.errors) < settings.BULK_MAX_REPORTED_ERRORS:
+            self.result.errors.append(ProductBulkError(row=row, errors=errors))
+
+
+class AsyncProductService:
     """
-    the User services providing functions to connect with the repository
+    the Product services for the async routes, the queries never block the event loop
     """
 
-    def __init__(self, db: Session):
-        self.product_repo = ProductRepo(db)
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.product_repo = CachedAsyncProductRepo(db)
+        # per owner, the products looked up by id during the request
+        self.product_loaders: dict[int, DataLoader] = {}
+
+    async def products_version(self, fk_user: int) -> Union[int, str]:
+        """
+        the version of the user's products, changed by every committed write
+        to them
+        """
+        return await collection_version(Product, fk_user)
 
-    def get_product_by_id(self, product_id: int) -> Optional[Product]:
+    def product_loader(self, fk_user: int) -> DataLoader:
+        """
+        the DataLoader of the user's products by id, one IN query per batch
+        """
+        loader = self.product_loaders.get(fk_user)
+        if loader is None:
+
+            async def load(ids: List[int]) -> dict:
+                rows = await self.product_repo.list_product_rows_by_ids(fk_user, ids)
+                return {row.id: row for row in rows}
+
+            loader = DataLoader(load, settings.BATCH_GET_MAX_IDS)
+            self.product_loaders[fk_user] = loader
+        return loader
+
+    async def get_user_products(
+        self, fk_user: int, ids: List[int]
+    ) -> Tuple[List[Row], List[int]]:
+        """
+        get the user's products among ids, with the other lookups of the
+        request in one IN query
+
+        parameters:
+        - fk_user (int): the owner, the other users' products are missing
+        - ids (List[int]): the product ids
+
+        return:
+        - (the product rows in the order of ids, the ids not found)
+        """
+        rows = await self.product_loader(fk_user).load_many(ids)
+        found = [row for row in rows if row is not None]
+        missing = [product_id for product_id, row in zip(ids, rows) if row is None]
+        return found, missing
+
+    async def get_product_by_id(self, product_id: int) -> Optional[Product]:
         """
         get product by id returning the product
 
@@ -23,38 +191,197 @@ class ProductService:
         return:
         - product
         """
-        return self.product_repo.get_product_by_id(product_id)
+        return await self.product_repo.get_product_by_id(product_id)
 
-    def get_product_by_name(self, name: str) -> Optional[Product]:
+    async def get_product_by_name(
+        self, name: str, fk_user: Optional[int] = None
+    ) -> Optional[Product]:
         """
-        get the product name
+        get the product name, case-insensitive when the owner is given
         """
 
-        return self.product_repo.get_product_by_name(name)
+        return await self.product_repo.get_product_by_name(name, fk_user)
 
-    def create_product(self, product_data: ProductCreate) -> Product:
+    async def get_user_product(
+        self, product_id: int, fk_user: int
+    ) -> Optional[Product]:
+        """
+        get a product of the user by id, through the product cache
 
-        return self.product_repo.create_product(product_data)
+        parameters:
+        - product_id (int): the product id
+        - fk_user (int): the owner
 
-    def update_product(self, product_id: int, product_data: ProductUpdate) -> Product:
+        return:
+        - product, None if it doesn't exist or belongs to another user
+        """
+        product = await self.get_product_by_id(product_id)
+        if product is None or product.fk_user != fk_user:
+            return None
+        return product
 
-        product = self.get_product_by_id(product_id)
+    async def upsert_product(
+        self,
+        product_data: ProductCreate,
+        fk_user: Optional[int] = None,
+        update_price: bool = False,
+    ) -> Tuple[Row, bool]:
+        """
+        create a product once per name and expiry date
 
-        if product is None:
-            return None
+        A retried or concurrent duplicate of a product gets the existing one
+        back instead of a new row.
 
-        if product_data.name:
-            product.name = product_data.name
-        if product_data.date_expire:
-            product.date_expire = product_data.date_expire
-        if product_data.price:
-            product.price = product_data.price
+        parameters:
+        - product_data (ProductCreate): the product data
+        - fk_user (int): the owner, replaces product_data.fk_user when given
+        - update_price (bool): update the price of an existing product
 
-        return self.product_repo.update_product(product_id, product)
+        return:
+        - (the product row, True if it was created)
+        """
+        if fk_user is not None:
+            product_data = product_data.model_copy(update={"fk_user": fk_user})
+        product, created = await self.product_repo.upsert_product(
+            product_data, update_price
+        )
+        if update_price and not created:
+            invalidate_product(product.id)
+        return product, created
+
+    async def update_product(
+        self,
+        product_id: int,
+        product_data: ProductUpdate,
+        fk_user: Optional[int] = None,
+    ) -> Optional[Row]:
+        """
+        update a product in one UPDATE ... RETURNING, without reading it first
+
+        parameters:
+        - product_id (int): the product id
+        - product_data (ProductUpdate): the new values, the empty ones are kept
+        - fk_user (int): the owner, only the owner's product is updated when given
+
+        return:
+        - the updated product row, None if there's no such product
+
+        raises:
+        - ProductExists: the user has another product with the new name and
+          expiry date
+        """
+        product = await self.product_repo.update_product_row(
+            product_id, update_values(product_data), fk_user
+        )
+        if product is not None:
+            invalidate_product(product_id)
+        return product
+
+    async def bulk_create_products(
+        self,
+        records: AsyncIterable[Tuple[int, Any]],
+        fk_user: int,
+        chunk_size: Optional[int] = None,
+    ) -> ProductBulkResult:
+        """
+        import products of an user in chunks while the upload streams in, a
+        chunk is one insert and one transaction
+
+        parameters:
+        - records (AsyncIterable): (row, record) pairs from utils.bulk.iter_records
+        - fk_user (int): the owner of every imported product
+        - chunk_size (int): rows per chunk, BULK_CHUNK_SIZE by default
+
+        return:
+        - ProductBulkResult with the new ids and the rows that failed
+        """
+        bulk = BulkImport(chunk_size or settings.BULK_CHUNK_SIZE, fk_user)
+        async for row, record in records:
+            if bulk.add(row, record):
+                await self.insert_chunk(bulk)
 
-    def list_product(self, skip: int = 0, limit: int = 100) -> List[Product]:
-        return self.product_repo.list_products(skip, limit)
+        if bulk.chunk:
+            await self.insert_chunk(bulk)
+        return bulk.result
 
-    def delete_product(self, product_id: int) -> bool:
+    async def insert_chunk(self, bulk: BulkImport) -> None:
+        rows, data = bulk.take()
+        bulk.done(rows, await self.product_repo.bulk_create_products(data))
 
-        return self.product_repo.delete_product(product_id)
+    async def export_products(
+        self, fk_user: int, kind: str, batch_size: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        export the user's products as NDJSON or CSV, a batch of rows at a time,
+        so the memory used doesn't depend on the number of products
+
+        parameters:
+        - fk_user (int): the owner
+        - kind (str): "ndjson" or "csv"
+        - batch_size (int): rows per batch, EXPORT_BATCH_SIZE by default
+
+        return:
+        - async iterator of text chunks
+        """
+        columns = [column.key for column in EXPORT_COLUMNS]
+        batches = self.product_repo.stream_products_by_user(
+            fk_user, batch_size or settings.EXPORT_BATCH_SIZE
+        )
+
+        header = kind == "csv"
+        async for rows in batches:
+            yield format_rows(rows, columns, kind, header)
+            header = False
+
+        if header:
+            yield format_rows([], columns, kind, header)
+
+    async def list_product_page(
+        self,
+        fk_user: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        order_by: str = "id",
+        filters: Optional[ProductFilters] = None,
+    ) -> Tuple[List[Row], Optional[str], Optional[str]]:
+        """
+        page of the user's products matching the filters, through the per user
+        list cache
+        """
+        return await self.product_repo.list_products_page(
+            fk_user, limit, cursor, order_by, filters
+        )
+
+    async def search_products(
+        self, fk_user: int, query: str, mode: str, limit: int, offset: int = 0
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        ranked page of the user's products matching the query
+
+        return:
+        - (products with their score, the offset of the next page)
+        """
+        hits = await self.product_repo.search_products(
+            fk_user, query, mode, limit + 1, offset, settings.SEARCH_FUZZY_THRESHOLD
+        )
+        next_offset = offset + limit if len(hits) > limit else None
+        return hits[:limit], next_offset
+
+    async def delete_product(
+        self, product_id: int, fk_user: Optional[int] = None
+    ) -> bool:
+        """
+        delete a product in one DELETE ... RETURNING, without reading it first
+
+        parameters:
+        - product_id (int): the product id
+        - fk_user (int): the owner, only the owner's product is deleted when given
+
+        return:
+        - True, False if there's no such product
+        """
+        deleted = await self.product_repo.delete_product(product_id, fk_user)
+        if deleted is None:
+            return False
+        invalidate_product(product_id)
+        return True
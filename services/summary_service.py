@@ -0,0 +1,61 @@
+from datetime import date
+from typing import List, Optional, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from core.config import get_settings
+from repository.summary_repo import AsyncSummaryRepo, SummaryRepo
+from schemas.summary import UserSummary
+
+settings = get_settings()
+
+
+class SummaryService:
+    """
+    the summary maintenance services, used by the rebuild and check commands
+    """
+
+    def __init__(self, db: Session):
+        self.summary_repo = SummaryRepo(db)
+
+    def rebuild(self, fk_user: Optional[int] = None) -> int:
+        """
+        recompute the aggregates from the products, returning the users rebuilt
+        """
+        return self.summary_repo.rebuild(fk_user)
+
+    def check(self, fk_user: Optional[int] = None) -> List[dict]:
+        """
+        the aggregates that don't match the products, empty when consistent
+        """
+        return self.summary_repo.check(fk_user)
+
+
+class AsyncSummaryService:
+    """
+    the summary services for the async routes
+    """
+
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.summary_repo = AsyncSummaryRepo(db)
+
+    async def get_summary(
+        self,
+        user_id: int,
+        horizon_days: int = settings.SUMMARY_HORIZON_DAYS,
+        today: Optional[date] = None,
+    ) -> UserSummary:
+        """
+        get the product aggregates of an user, without reading the products
+
+        parameters:
+        - user_id (int): the user id
+        - horizon_days (int): how many days ahead the expiring value goes
+        - today (date): the first day of the window, today by default
+
+        return:
+        - UserSummary
+        """
+        summary = await self.summary_repo.get_summary(
+            user_id, today or date.today(), horizon_days
+        )
+        return UserSummary(user_id=user_id, horizon_days=horizon_days, **summary)
@@ -1,20 +1,81 @@
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from models.product import Product
 from models.user import User
 from schemas.user import UserCreate, UserUpdate
-from repository.user_repo import UserRepo
-from typing import List, Optional
-from core.security.hashing import hash_password
+from repository.cache import (
+    CachedAsyncUserRepo,
+    collection_version,
+    invalidate,
+)
+from typing import List, Optional, Tuple, Union
+from core.security.hashing import hash_password_async
+from core.security.token_cache import token_cache
+from core.config import get_settings
+from core.dataloader import DataLoader
 
+settings = get_settings()
 
-class UserService:
+
+def invalidate_updated_user(user: Row, old: dict) -> None:
+    """
+    Drop an user updated by a Core statement from the caches, under its id and
+    its old and new emails, and its verified tokens
+    """
+    invalidate(User, id=user.id, email=user.email)
+    if old.get("email") is not None:
+        invalidate(User, email=old["email"])
+    token_cache.invalidate_user(user.id)
+
+
+def invalidate_deleted_user(user: Row, product_ids: List[int]) -> None:
+    """
+    Drop a deleted user and its products from the caches
+    """
+    invalidate(User, id=user.id, email=user.email)
+    for product_id in product_ids:
+        invalidate(Product, id=product_id)
+    token_cache.invalidate_user(user.id)
+
+
+class AsyncUserService:
     """
-    the User services providing functions to connect with the repository
+    the User services for the async routes, the queries never block the event loop
     """
 
-    def __init__(self, db: Session):
-        self.user_repo = UserRepo(db)
+    def __init__(self, db: Union[AsyncSession, Session]):
+        self.user_repo = CachedAsyncUserRepo(db)
+        # the users looked up by id during the request, one IN query per batch
+        self.user_loader = DataLoader(self._load_users, settings.BATCH_GET_MAX_IDS)
+
+    async def users_version(self) -> Union[int, str]:
+        """
+        the version of the user list, changed by every committed user write
+        """
+        return await collection_version(User)
+
+    async def _load_users(self, ids: List[int]) -> dict:
+        rows = await self.user_repo.list_user_rows_by_ids(ids)
+        return {row.id: row for row in rows}
+
+    async def get_users_by_ids(self, ids: List[int]) -> Tuple[List[Row], List[int]]:
+        """
+        get the users among ids, with the other lookups of the request in one
+        IN query
+
+        parameters:
+        - ids (List[int]): the user ids
+
+        return:
+        - (the user rows in the order of ids, the ids not found)
+        """
+        rows = await self.user_loader.load_many(ids)
+        found = [row for row in rows if row is not None]
+        missing = [user_id for user_id, row in zip(ids, rows) if row is None]
+        return found, missing
 
-    def get_user_by_id(self, user_id: int) -> Optional[User]:
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
         """
         get user by id returning the User
 
@@ -24,9 +85,9 @@ class UserService:
         return:
         - User
         """
-        return self.user_repo.get_user_by_id(user_id)
+        return await self.user_repo.get_user_by_id(user_id)
 
-    def get_user_by_email(self, email: str) -> Optional[User]:
+    async def get_user_by_email(self, email: str) -> Optional[User]:
         """
         get the user by email returning the User
 
@@ -36,43 +97,70 @@ class UserService:
         return:
         - User
         """
-        return self.user_repo.get_user_by_email(email)
+        return await self.user_repo.get_user_by_email(email)
 
-    def get_user_by_username(self, username: str) -> Optional[User]:
+    async def get_user_by_username(self, username: str) -> Optional[User]:
         """
         get the username
         """
 
-        return self.user_repo.get_user_by_username(username)
+        return await self.user_repo.get_user_by_username(username)
 
-    def create_user(self, user_data: UserCreate) -> User:
+    async def create_user(self, user_data: UserCreate) -> User:
 
-        existing_user = self.user_repo.get_user_by_email(user_data.email)
+        existing_user = await self.user_repo.get_user_by_email(user_data.email)
         if existing_user:
             raise ValueError("Email already in use.")
 
-        return self.user_repo.create_user(user_data)
+        hashed_password = await hash_password_async(user_data.password)
 
-    def update_user(self, user_id: int, user_data: UserUpdate) -> User:
+        return await self.user_repo.create_user(user_data, hashed_password)
 
-        user = self.get_user_by_id(user_id)
+    async def update_user(self, user_id: int, user_data: UserUpdate) -> Optional[Row]:
+        """
+        update an user in one UPDATE ... RETURNING, without reading it first
 
-        if user is None:
-            return None
+        parameters:
+        - user_id (int): the user id
+        - user_data (UserUpdate): the new values, the empty ones are kept
 
+        return:
+        - the updated user row, None if the user doesn't exist
+        """
+        values = {}
         if user_data.name:
-            user.name = user_data.name
+            values["name"] = user_data.name
         if user_data.email:
-            user.email = user_data.email
+            values["email"] = user_data.email
         if user_data.password:
+            values["hashed_password"] = await hash_password_async(user_data.password)
+        if not values:
+            return await self.get_user_by_id(user_id)
 
-            user.hashed_password = hash_password(user_data.password)
+        result = await self.user_repo.update_user_row(user_id, values)
+        if result is None:
+            return None
+        user, old = result
+        invalidate_updated_user(user, old)
+        return user
 
-        return self.user_repo.update_user(user_id, user)
+    async def list_users_page(
+        self, limit: int, cursor: Optional[str] = None
+    ) -> Tuple[List[Row], Optional[str], Optional[str]]:
+        return await self.user_repo.list_users_page(limit, cursor)
 
-    def list_users(self, skip: int = 0, limit: int = 100) -> List[User]:
-        return self.user_repo.list_users(skip, limit)
+    async def delete_user(self, user_id: int) -> bool:
+        """
+        delete an user with its products, one DELETE per table
 
-    def delete_user(self, user_id: int) -> bool:
+        parameters:
+        - user_id (int): the user id
 
-        return self.user_repo.delete_user(user_id)
+        return:
+        - True, False if the user doesn't exist
+        """
+        deleted = await self.user_repo.delete_user(user_id)
+        if deleted is None:
+            return False
+        invalidate_deleted_user(*deleted)
+        return True
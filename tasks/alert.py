@@ -0,0 +1,21 @@
+from core.celeryschedul import celery_app
+from core.db import SessionLocal
+from services.alert_service import AlertService
+
+
+@celery_app.task(name="tasks.alert.scan_expiring_products")
+def scan_expiring_products() -> dict:
+    """
+    scan_expiring_products
+
+    Periodic task (see beat_schedule in core/celeryschedul.py) writing the alerts
+    of the products close to expiring.
+
+    return:
+    - the scan result as a dict
+    """
+    db = SessionLocal()
+    try:
+        return AlertService(db).scan_expiring().model_dump(mode="json")
+    finally:
+        db.close()
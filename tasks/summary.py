@@ -0,0 +1,81 @@
+"""
+Rebuild or check the per user product aggregates:
+
+    python -m tasks.summary check [--user ID]
+    python -m tasks.summary rebuild [--user ID]
+
+check exits with 1 when an aggregate doesn't match the products.
+"""
+
+import argparse
+import sys
+from core.celeryschedul import celery_app
+from core.db import SessionLocal
+from services.summary_service import SummaryService
+from typing import Optional
+
+
+@celery_app.task(name="tasks.summary.rebuild_summaries")
+def rebuild_summaries(fk_user: Optional[int] = None) -> int:
+    """
+    rebuild_summaries
+
+    Recompute the aggregates from the products table, for every user or one.
+
+    return:
+    - the number of users rebuilt
+    """
+    db = SessionLocal()
+    try:
+        return SummaryService(db).rebuild(fk_user)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="tasks.summary.check_summaries")
+def check_summaries(fk_user: Optional[int] = None) -> list:
+    """
+    check_summaries
+
+    Compare the aggregates with the products table.
+
+    return:
+    - the mismatches, empty when consistent
+    """
+    db = SessionLocal()
+    try:
+        return [
+            {
+                **mismatch,
+                "key": {k: str(v) for k, v in mismatch["key"].items()},
+                "expected": [str(v) for v in mismatch["expected"]],
+                "stored": [str(v) for v in mismatch["stored"]],
+            }
+            for mismatch in SummaryService(db).check(fk_user)
+        ]
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--user", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        print(f"{rebuild_summaries(args.user)} users rebuilt")
+        return 0
+
+    mismatches = check_summaries(args.user)
+    for mismatch in mismatches:
+        print(
+            f"{mismatch['table']} {mismatch['key']}: expected "
+            f"{mismatch['expected']}, stored {mismatch['stored']}"
+        )
+    print(f"{len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
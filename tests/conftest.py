@@ -0,0 +1,71 @@
+from fastapi.testclient import TestClient
+from core import profiler
+from core.ratelimit import rate_limiter
+from core.db import Base, engine
+from main import app
+import models  # noqa: F401  registers every table on Base.metadata
+import pytest
+import uuid
+
+
+@pytest.fixture(scope="session", autouse=True)
+def app_database_schema():
+    """
+    The schema is owned by the Alembic migrations and isn't created on import
+    anymore, so the app database used by the routes is created for the tests.
+    """
+    Base.metadata.create_all(bind=engine)
+    yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits():
+    """
+    Every test client request comes from the same address, each test starts
+    with full buckets.
+    """
+    rate_limiter.clear()
+    yield
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Assert the SQL budget of a block:
+
+        with query_budget(2):
+            client.get("/product")
+
+    fails when the block runs more than 2 statements or an N+1.
+    """
+    return profiler.query_budget
+
+
+@pytest.fixture
+def new_user():
+    """
+    Create users, returning their id and the headers authenticating as them:
+
+        user_id, headers = new_user()
+        client.get("/product", headers=headers)
+    """
+    client = TestClient(app)
+
+    def create():
+        email = f"user_{uuid.uuid4().hex[:8]}@example.com"
+        user = client.post(
+            "/user", json={"name": "Tester", "email": email, "password": "senha123"}
+        ).json()
+        token = client.post("/login", json={"email": email, "password": "senha123"})
+        headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+        return user["id"], headers
+
+    return create
+
+
+@pytest.fixture
+def auth_user(new_user):
+    """
+    A new user and its headers, see new_user
+    """
+    return new_user()
@@ -0,0 +1,119 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from core.db import Base
+from core.db import SessionLocal
+from main import app
+from models.alert import Alert
+from models.product import Product
+from models.user import User
+from services import alert_service
+from services.alert_service import AlertService
+from tasks.alert import scan_expiring_products
+from datetime import date, datetime, timedelta
+import pytest
+import uuid
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """
+    In-memory database with two users, without the rescan overlap.
+    """
+    monkeypatch.setattr(alert_service.settings, "ALERT_WATERMARK_OVERLAP_SECONDS", 0)
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [
+            User(id=1, name="Ana", email="ana@example.com", hashed_password="x"),
+            User(id=2, name="Bia", email="bia@example.com", hashed_password="x"),
+        ]
+    )
+    session.commit()
+
+    yield session
+
+    session.close()
+    engine.dispose()
+
+
+def add_product(db, fk_user, days):
+    product = Product(
+        name=f"product {days}",
+        fk_user=fk_user,
+        date_expire=date.today() + timedelta(days=days),
+        price=1,
+    )
+    db.add(product)
+    db.commit()
+    return product
+
+
+def test_scan_groups_per_user_and_follows_the_watermark(db):
+    """
+    Test the first scan alerts every product in the window, grouped per user,
+    and the next scans only read products changed or entering the window.
+    """
+    today = date.today()
+    for fk_user, days in [(1, 0), (1, 2), (2, 3), (2, 4), (1, 10)]:
+        add_product(db, fk_user, days)
+
+    first = AlertService(db).scan_expiring(today=today, horizon_days=3, batch_size=2)
+    assert first.products == 3
+    assert first.alerts_created == 3
+    assert first.users == {1: 2, 2: 1}
+
+    second = AlertService(db).scan_expiring(today=today, horizon_days=3)
+    assert second.products == 0
+
+    changed = db.query(Product).filter(Product.fk_user == 1).first()
+    changed.updated_at = datetime.now() + timedelta(days=1)
+    db.commit()
+
+    third = AlertService(db).scan_expiring(today=today, horizon_days=3)
+    assert third.products == 1
+    assert third.alerts_created == 0
+    assert third.users == {}
+
+    next_day = AlertService(db).scan_expiring(
+        today=today + timedelta(days=1), horizon_days=3
+    )
+    assert next_day.products == 1
+    assert next_day.alerts_created == 1
+    assert next_day.users == {2: 1}
+    assert db.query(Alert).count() == 4
+
+
+def test_task_runs_in_process_and_route_lists_alerts():
+    """
+    Test the Celery task runs in-process and GET /alert lists the user alerts.
+    """
+    email = f"alert_{uuid.uuid4().hex[:8]}@example.com"
+    user = client.post(
+        "/user", json={"name": "Alert", "email": email, "password": "senha123"}
+    ).json()
+    token = client.post("/login", json={"email": email, "password": "senha123"})
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+
+    db = SessionLocal()
+    db.add(
+        Product(
+            name="Milk",
+            fk_user=user["id"],
+            date_expire=date.today() + timedelta(days=1),
+            price=4.5,
+        )
+    )
+    db.commit()
+    db.close()
+
+    result = scan_expiring_products.apply().get()
+    assert result["users"][str(user["id"])] >= 1
+
+    response = client.get("/alert", headers=headers)
+    assert response.status_code == 200
+    assert [alert["fk_user"] for alert in response.json()] == [user["id"]]
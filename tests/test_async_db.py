@@ -0,0 +1,71 @@
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from core.db import Base, to_async_url
+from core.db_test import DATABASE_URL_TEST
+from models.user import User  # noqa: F401  products reference the users table
+from schemas.product import ProductCreate, ProductUpdate
+from services.product_service import AsyncProductService
+from datetime import date, timedelta
+import asyncio
+import pytest
+
+
+def test_to_async_url():
+    """
+    Test the sync urls are translated to the async drivers.
+    """
+    assert to_async_url("postgresql://u:p@localhost/keeper") == (
+        "postgresql+asyncpg://u:p@localhost/keeper"
+    )
+    assert to_async_url("sqlite:///./keeper.db") == "sqlite+aiosqlite:///./keeper.db"
+    assert to_async_url("sqlite+aiosqlite:///./keeper.db") == (
+        "sqlite+aiosqlite:///./keeper.db"
+    )
+
+    with pytest.raises(ValueError):
+        to_async_url("mssql://u:p@localhost/keeper")
+
+
+def test_async_product_service():
+    """
+    Test the AsyncProductService end to end with an AsyncSession.
+
+    Creates, updates, lists and deletes a product through the async driver.
+    """
+
+    async def scenario():
+        engine = create_async_engine(to_async_url(DATABASE_URL_TEST))
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as db:
+            service = AsyncProductService(db)
+            created, _ = await service.upsert_product(
+                ProductCreate(
+                    name="Async product",
+                    fk_user=1,
+                    date_expire=date.today() + timedelta(days=3),
+                    price=9.90,
+                )
+            )
+            updated = await service.update_product(
+                created.id,
+                ProductUpdate(
+                    name="Async updated",
+                    date_expire=date.today() + timedelta(days=4),
+                    price=1.5,
+                ),
+            )
+            listed, _, _ = await service.list_product_page(1, 100)
+            deleted = await service.delete_product(created.id)
+            missing = await service.get_product_by_id(created.id)
+
+        await engine.dispose()
+        return created, updated, listed, deleted, missing
+
+    created, updated, listed, deleted, missing = asyncio.run(scenario())
+
+    assert updated.name == "Async updated"
+    assert created.id in [product.id for product in listed]
+    assert deleted is True
+    assert missing is None
@@ -0,0 +1,119 @@
+from fastapi.testclient import TestClient
+from api.v1 import dependencies
+from core.dataloader import DataLoader
+from main import app
+from datetime import date, timedelta
+import asyncio
+import pytest
+
+client = TestClient(app)
+
+
+def create_products(headers, names) -> list[int]:
+    expire = (date.today() + timedelta(days=5)).isoformat()
+    return [
+        client.post(
+            "/product",
+            json={"name": name, "price": 1, "date_expire": expire},
+            headers=headers,
+        ).json()["id"]
+        for name in names
+    ]
+
+
+def product_statements(log) -> list[str]:
+    return [s for s in log.statements.elements() if " products" in s]
+
+
+def test_loader_coalesces_concurrent_lookups():
+    batches = []
+
+    async def batch_load(keys):
+        batches.append(keys)
+        return {key: key * 10 for key in keys if key != 3}
+
+    async def lookups():
+        loader = DataLoader(batch_load, max_batch_size=2)
+
+        async def lookup(key):
+            await asyncio.sleep(0)
+            return await loader.load(key)
+
+        values = await asyncio.gather(*(lookup(key) for key in (1, 2, 1, 3)))
+        return values, await loader.load(2)
+
+    values, cached = asyncio.run(lookups())
+    assert values == [10, 20, 10, None]
+    assert cached == 20
+    assert batches == [[1, 2], [3]]
+
+
+def test_loader_failures_reach_every_caller():
+    async def batch_load(keys):
+        raise RuntimeError("database down")
+
+    async def lookups():
+        loader = DataLoader(batch_load)
+        return await asyncio.gather(
+            loader.load(1), loader.load(2), return_exceptions=True
+        )
+
+    assert [str(error) for error in asyncio.run(lookups())] == ["database down"] * 2
+
+
+def test_batch_get_products_in_one_query(auth_user, new_user, query_budget):
+    _, headers = auth_user
+    _, other_headers = new_user()
+    first, second, third = create_products(headers, ["Milk", "Rice", "Beans"])
+    [foreign] = create_products(other_headers, ["Milk"])
+
+    ids = [third, first, foreign, 10**9, first]
+    with query_budget(3) as log:
+        response = client.post("/product/batch-get", json={"ids": ids}, headers=headers)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [third, first]
+    assert response.json()["missing"] == [foreign, 10**9]
+    [statement] = product_statements(log)
+    assert " IN " in statement
+
+    response = client.get(
+        "/product", params={"ids": f"{second},{third},{foreign}"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [second, third]
+
+
+def test_batch_get_users(auth_user, new_user, query_budget):
+    user_id, _ = auth_user
+    other_id, _ = new_user()
+
+    with query_budget(1):
+        response = client.post(
+            "/user/batch-get", json={"ids": [other_id, 10**9, user_id]}
+        )
+    assert [item["id"] for item in response.json()["items"]] == [other_id, user_id]
+    assert response.json()["missing"] == [10**9]
+
+    response = client.get("/user", params={"ids": f"{user_id},{other_id}"})
+    assert [item["id"] for item in response.json()["items"]] == [user_id, other_id]
+
+
+@pytest.mark.parametrize("ids", ["1,x", "", "1,,2"])
+def test_invalid_ids_are_rejected(auth_user, ids):
+    _, headers = auth_user
+    response = client.get("/product", params={"ids": ids}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_batch_size_is_bounded(auth_user, monkeypatch):
+    _, headers = auth_user
+    monkeypatch.setattr(dependencies.settings, "BATCH_GET_MAX_IDS", 3)
+
+    response = client.get("/product", params={"ids": "1,2,3,4"}, headers=headers)
+    assert response.status_code == 422
+    response = client.post("/user/batch-get", json={"ids": [1, 2, 3, 4]})
+    assert response.status_code == 422
+    assert client.post("/user/batch-get", json={"ids": []}).status_code == 422
+    # repeated ids count once
+    response = client.post("/user/batch-get", json={"ids": [1, 1, 2, 2, 3]})
+    assert response.status_code == 200
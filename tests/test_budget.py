@@ -0,0 +1,110 @@
+from fastapi.testclient import TestClient
+from services.budget_service import greedy_plan, knapsack_plan, priority_plan
+from main import app
+from datetime import date, timedelta
+from itertools import combinations
+import numpy as np
+import uuid
+
+client = TestClient(app)
+
+
+def brute_force(prices, priorities, budget):
+    best = 0.0
+    for size in range(len(prices) + 1):
+        for subset in combinations(range(len(prices)), size):
+            if prices[list(subset)].sum() <= budget:
+                best = max(best, priorities[list(subset)].sum())
+    return best
+
+
+def test_greedy_buys_the_most_products():
+    """
+    Test greedy picks the cheapest prefix that fits.
+    """
+    prices = np.array([500, 100, 300, 200], dtype=np.int64)
+    assert sorted(greedy_plan(prices, 600).tolist()) == [1, 2, 3]
+
+
+def test_priority_prefers_weight_per_cent():
+    """
+    Test priority mode picks the best priority per price, then fills the rest.
+    """
+    prices = np.array([600, 300, 300, 100], dtype=np.int64)
+    priorities = np.array([6.0, 1.0, 2.0, 0.1])
+    assert sorted(priority_plan(prices, priorities, 700).tolist()) == [0, 3]
+
+
+def test_knapsack_matches_brute_force():
+    """
+    Test exact mode finds the optimum on random lists.
+    """
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        prices = rng.integers(1, 2000, size=9)
+        priorities = rng.integers(1, 10, size=9).astype(np.float64)
+        budget = int(prices.sum() // 2)
+
+        chosen, optimal = knapsack_plan(prices, priorities, budget, 10**7)
+
+        assert optimal
+        assert prices[chosen].sum() <= budget
+        assert priorities[chosen].sum() == brute_force(prices, priorities, budget)
+
+
+def test_knapsack_stays_within_budget_when_scaled():
+    """
+    Test a list over the cell limit is solved in coarser units and still fits.
+    """
+    rng = np.random.default_rng(11)
+    prices = rng.integers(1, 5000, size=10_000)
+    priorities = rng.random(10_000)
+    budget = 1_000_000
+
+    chosen, optimal = knapsack_plan(prices, priorities, budget, 2_000_000)
+
+    assert not optimal
+    assert prices[chosen].sum() <= budget
+    assert len(set(chosen.tolist())) == len(chosen)
+
+
+def test_plan_route_uses_the_user_products():
+    """
+    Test /budget/plan plans only over the authenticated user's products.
+    """
+    email = f"budget_{uuid.uuid4().hex[:8]}@example.com"
+    user = client.post(
+        "/user", json={"name": "Budget", "email": email, "password": "senha123"}
+    ).json()
+    token = client.post("/login", json={"email": email, "password": "senha123"})
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+
+    expire = (date.today() + timedelta(days=5)).isoformat()
+    for name, price in [("Rice", 20.0), ("Beans", 8.5), ("Coffee", 15.0)]:
+        client.post(
+            "/product",
+            json={
+                "name": name,
+                "fk_user": user["id"],
+                "date_expire": expire,
+                "price": price,
+            },
+            headers=headers,
+        )
+
+    response = client.post(
+        "/budget/plan", json={"budget": 30, "mode": "exact"}, headers=headers
+    )
+    assert response.status_code == 200
+    plan = response.json()
+    assert plan["optimal"] is True
+    assert {item["name"] for item in plan["items"]} in (
+        {"Beans", "Coffee"},
+        {"Beans", "Rice"},
+    )
+    assert {item["fk_user"] for item in plan["items"] + plan["left_out"]} == {
+        user["id"]
+    }
+    assert plan["total"] + plan["remaining"] == 30
+
+    assert client.post("/budget/plan", json={"budget": 30}).status_code == 401
@@ -0,0 +1,315 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from core import cache as cache_module
+from core.cache import (
+    CollectionVersions,
+    EntityCache,
+    FakeSharedBackend,
+    LRUCache,
+    shared_deletes,
+)
+from core.db import Base
+from middlewares.middleware import SharedDeletesMiddleware
+from models.product import Product
+from models.user import User
+from repository import cache as repo_cache
+from repository.cache import (
+    CachedAsyncProductRepo,
+    CachedAsyncUserRepo,
+    collection_version,
+)
+from repository.product_repo import ProductRepo
+from schemas.user import UserUpdate
+from services.user_service import AsyncUserService
+from datetime import date, timedelta
+from decimal import Decimal
+import asyncio
+import pytest
+import threading
+
+
+@pytest.fixture
+def db():
+    """
+    In-memory database with a user and a product, the shared caches are
+    emptied afterwards since its ids overlap the app database ids.
+    """
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, name="Ana", email="ana@example.com", hashed_password="x"))
+    session.add(
+        Product(
+            id=1,
+            name="Milk",
+            fk_user=1,
+            date_expire=date.today() + timedelta(days=3),
+            price=4.5,
+        )
+    )
+    session.commit()
+
+    yield session
+
+    session.close()
+    engine.dispose()
+    repo_cache.user_cache.clear()
+    repo_cache.product_cache.clear()
+    repo_cache.product_list_cache.clear()
+
+
+def test_lru_expires_and_evicts(monkeypatch):
+    """
+    Test entries expire after the ttl and the least recently used is evicted.
+    """
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    lru = LRUCache(max_entries=2, ttl=10)
+
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert (lru.get("a"), lru.get("b"), lru.get("c")) == (1, None, 3)
+
+    now[0] += 10
+    assert lru.get("a") is None
+    assert len(lru) == 1
+
+
+def test_concurrent_misses_load_once(db):
+    """
+    Test a stampede on a cold key runs one load, every caller getting its own
+    detached copy.
+    """
+    cache = EntityCache(User, ("id", "email"))
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return db.get(User, 1)
+
+    async def stampede():
+        return await asyncio.gather(
+            *(cache.read_through("id", 1, load) for _ in range(20))
+        )
+
+    users = asyncio.run(stampede())
+
+    assert len(loads) == 1
+    assert {user.email for user in users} == {"ana@example.com"}
+    assert len({id(user) for user in users}) == 20
+    assert cache.stats()["coalesced"] == 19
+
+    user = asyncio.run(cache.read_through("email", "ana@example.com", load))
+    assert user.id == 1 and len(loads) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_load_racing_an_invalidation_is_not_cached(db):
+    """
+    Test a row read before a write commits isn't cached after it.
+    """
+    cache = EntityCache(User, ("id",))
+
+    async def load():
+        user = db.get(User, 1)
+        cache.invalidate([cache.key("id", 1)])
+        return user
+
+    asyncio.run(cache.read_through("id", 1, load))
+    assert len(cache.local) == 0
+
+
+def test_shared_backend_serves_other_processes(db):
+    """
+    Test a second process (its own LRU) reads the entity from the shared
+    backend with the column types intact, and invalidations reach it.
+    """
+    shared = FakeSharedBackend()
+    first = EntityCache(Product, ("id",), local=LRUCache(), shared=shared)
+    second = EntityCache(Product, ("id",), local=LRUCache(), shared=shared)
+
+    async def load():
+        return db.get(Product, 1)
+
+    asyncio.run(first.read_through("id", 1, load))
+    product = asyncio.run(second.read_through("id", 1, load))
+
+    assert second.stats()["shared_hits"] == 1
+    assert product.price == Decimal("4.50")
+    assert product.date_expire == date.today() + timedelta(days=3)
+
+    first.invalidate([first.key("id", 1)])
+    assert shared.get(first.key("id", 1)) is None
+
+
+def test_shared_versions_see_the_writes_of_other_processes():
+    """
+    Test the collection versions of two processes agree through the shared
+    backend, and a write committed by one changes what the other reads.
+    """
+    shared = FakeSharedBackend()
+    first = CollectionVersions("products_by_user", "fk_user", shared)
+    second = CollectionVersions("products_by_user", "fk_user", shared)
+
+    async def versions():
+        return await second.get(1), await second.get(2), await second.get()
+
+    before = asyncio.run(versions())
+    assert asyncio.run(first.get(1)) == before[0]
+    assert asyncio.run(versions()) == before
+
+    first.invalidate([1])
+    after = asyncio.run(versions())
+    assert after[0] != before[0] and after[2] != before[2]
+    assert after[1] == before[1]
+
+
+class BlockingBackend(FakeSharedBackend):
+    """
+    FakeSharedBackend doing its IO like Redis, recording the threads deleting
+    """
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.delete_threads = []
+
+    def delete(self, keys):
+        self.delete_threads.append(threading.get_ident())
+        super().delete(keys)
+
+
+def test_invalidations_on_the_loop_delete_in_the_threadpool():
+    """
+    Test the shared deletes asked for on the event loop (an AsyncSession
+    commit) don't run there, and are done once the request waits for them.
+    """
+    shared = BlockingBackend()
+    versions = CollectionVersions("products_by_user", "fk_user", shared)
+    entities = EntityCache(Product, ("id",), shared=shared)
+
+    async def write():
+        version = await versions.get(1)
+        shared.set(entities.key("id", 1), b"{}", 60)
+
+        versions.invalidate([1])
+        entities.invalidate([entities.key("id", 1)])
+        await shared_deletes.wait()
+
+        assert threading.get_ident() not in shared.delete_threads
+        assert shared.get(entities.key("id", 1)) is None
+        return version, await versions.get(1)
+
+    before, after = asyncio.run(write())
+    assert before != after
+    assert len(shared.delete_threads) == 2
+
+    # off the loop, a Celery task or the sync sessions, they're done in place
+    versions.invalidate([1])
+    assert shared.delete_threads[-1] == threading.get_ident()
+
+
+def test_response_waits_for_the_shared_deletes():
+    """
+    Test the response of a write starts once its shared deletes are done.
+    """
+    shared = BlockingBackend()
+    versions = CollectionVersions("products_by_user", "fk_user", shared)
+    sent = []
+
+    async def write(scope, receive, send):
+        versions.invalidate([1])
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append((message["type"], len(shared.delete_threads)))
+
+    app = SharedDeletesMiddleware(write)
+    asyncio.run(app({"type": "http"}, None, send))
+    assert sent == [("http.response.start", 1), ("http.response.body", 1)]
+
+
+def test_repository_writes_bump_the_collection_versions(db):
+    """
+    Test the Core writes of the repositories bump the versions once they
+    commit, and not when nothing was written.
+    """
+    products = ProductRepo(db)
+    version = asyncio.run(collection_version(Product, 1))
+
+    assert products.update_product_row(99, {"price": 5}) is None
+    assert asyncio.run(collection_version(Product, 1)) == version
+
+    products.update_product_row(1, {"price": 5})
+    assert asyncio.run(collection_version(Product, 1)) != version
+
+
+def test_commits_invalidate_the_cached_entities(db):
+    """
+    Test updates and deletes, made by any session, drop the cached entries
+    under the old and the new keys.
+    """
+    users = CachedAsyncUserRepo(db)
+    products = CachedAsyncProductRepo(db)
+
+    async def lookups(email):
+        return (
+            await users.get_user_by_id(1),
+            await users.get_user_by_email(email),
+            await products.get_product_by_id(1),
+        )
+
+    asyncio.run(lookups("ana@example.com"))
+    asyncio.run(
+        AsyncUserService(db).update_user(
+            1, UserUpdate(name="Ana", email="ana@keeper.io", password="")
+        )
+    )
+
+    user, old_email, product = asyncio.run(lookups("ana@example.com"))
+    assert user.email == "ana@keeper.io"
+    assert old_email is None
+
+    asyncio.run(products.get_product_by_id(1))
+    db.get(Product, 1).name = "Oat milk"
+    db.commit()
+    assert asyncio.run(products.get_product_by_id(1)).name == "Oat milk"
+    assert db.get(Product, 1).price == Decimal("4.50")
+
+    db.delete(db.get(User, 1))
+    db.commit()
+    assert asyncio.run(users.get_user_by_id(1)) is None
+    assert asyncio.run(products.get_product_by_id(1)) is None
+
+
+def test_list_pages_are_dropped_for_old_and_new_owner(db):
+    """
+    Test the cached pages of a user are served until one of its products
+    changes, and moving a product drops the pages of both owners.
+    """
+    products = CachedAsyncProductRepo(db)
+    db.add(User(id=2, name="Bia", email="bia@example.com", hashed_password="x"))
+    db.commit()
+
+    def ids(fk_user):
+        rows, _, _ = asyncio.run(products.list_products_page(fk_user, 10))
+        return [row.id for row in rows]
+
+    assert (ids(1), ids(2)) == ([1], [])
+    hits = repo_cache.product_list_cache.hits
+    assert (ids(1), ids(2)) == ([1], [])
+    assert repo_cache.product_list_cache.hits == hits + 2
+
+    db.get(Product, 1).fk_user = 2
+    db.commit()
+    assert (ids(1), ids(2)) == ([], [1])
@@ -0,0 +1,123 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import create_async_engine
+from pydantic import ValidationError
+from sqlalchemy.pool import NullPool, SingletonThreadPool, StaticPool
+from api.v1.dependencies import get_db
+from core.config import Settings, get_settings
+from core.db import (
+    TimedQueuePool,
+    engine_options,
+    engine_pool_stats,
+    pool_sizing,
+)
+from main import app
+import pytest
+
+client = TestClient(app)
+settings = get_settings()
+
+
+def configured(**changes):
+    return settings.model_copy(update=changes)
+
+
+def test_connection_budget_is_split_between_workers():
+    """
+    Test DB_MAX_CONNECTIONS caps the pool size plus overflow of every worker.
+    """
+    assert pool_sizing(configured(DB_POOL_SIZE=5, DB_POOL_MAX_OVERFLOW=10)) == (5, 10)
+
+    config = configured(
+        DB_POOL_SIZE=5, DB_POOL_MAX_OVERFLOW=10, DB_MAX_CONNECTIONS=40, WORKERS=8
+    )
+    assert pool_sizing(config) == (5, 0)
+
+    config = configured(
+        DB_POOL_SIZE=5, DB_POOL_MAX_OVERFLOW=10, DB_MAX_CONNECTIONS=100, WORKERS=8
+    )
+    assert pool_sizing(config) == (5, 7)
+
+
+def test_connection_budget_below_the_workers_is_rejected():
+    """
+    Test a budget that can't give every worker a connection is refused.
+    """
+    with pytest.raises(ValidationError):
+        Settings(DB_MAX_CONNECTIONS=4, WORKERS=8)
+
+    assert Settings(DB_MAX_CONNECTIONS=8, WORKERS=8).DB_MAX_CONNECTIONS == 8
+
+
+@pytest.mark.parametrize(
+    "url",
+    ["sqlite://", "sqlite:///:memory:", "sqlite:///file:keeper?mode=memory&uri=true"],
+)
+def test_memory_database_keeps_the_dialect_pool(url):
+    """
+    Test an SQLite in-memory database isn't given a queue pool, every
+    connection would see a new empty database.
+    """
+    engine = create_engine(url, **engine_options(url, configured()))
+    assert isinstance(engine.pool, SingletonThreadPool)
+    engine.dispose()
+
+    async_url = url.replace("sqlite", "sqlite+aiosqlite", 1)
+    options = engine_options(async_url, configured(), is_async=True)
+    async_engine = create_async_engine(async_url, **options)
+    assert isinstance(async_engine.sync_engine.pool, StaticPool)
+
+    file_url = "sqlite:///keeper.db"
+    assert engine_options(file_url, configured())["poolclass"] is TimedQueuePool
+
+
+def test_external_pooler_mode():
+    """
+    Test the PgBouncer mode doesn't pool nor prepare statements.
+    """
+    url = "postgresql+asyncpg://keeper@pgbouncer/keeper"
+    options = engine_options(url, configured(DB_EXTERNAL_POOLER=True), is_async=True)
+
+    assert options["poolclass"] is NullPool
+    assert options["connect_args"]["statement_cache_size"] == 0
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+
+
+def test_pool_counts_waits_and_timeouts(tmp_path):
+    """
+    Test a saturated pool gives up after the timeout and the counters show it.
+    """
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    config = configured(
+        DB_POOL_SIZE=1, DB_POOL_MAX_OVERFLOW=0, DB_POOL_TIMEOUT_SECONDS=0.05
+    )
+    engine = create_engine(url, **engine_options(url, config))
+
+    held = engine.connect()
+    with pytest.raises(PoolTimeout):
+        engine.connect()
+
+    stats = engine_pool_stats(engine)
+    assert stats["checkouts"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["in_use"] == 1
+    assert stats["max_wait"] >= 0.05
+
+    held.close()
+    assert engine_pool_stats(engine)["in_use"] == 0
+    engine.dispose()
+
+
+def test_pool_timeout_answers_503():
+    def saturated():
+        raise PoolTimeout("QueuePool limit reached")
+
+    app.dependency_overrides[get_db] = saturated
+    try:
+        response = client.get("/user")
+    finally:
+        app.dependency_overrides.pop(get_db)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,80 @@
+from fastapi.testclient import TestClient
+from core.security import hashing
+from core.security.hashing import (
+    HashingPool,
+    HashingPoolSaturated,
+    hash_password_async,
+    verify_password_async,
+)
+from main import app
+import asyncio
+import pytest
+import threading
+import uuid
+
+client = TestClient(app)
+
+
+def test_async_hashing_roundtrip():
+    """
+    Test the pool hashes and verifies like the sync functions and records timings.
+    """
+
+    async def scenario():
+        hashed = await hash_password_async("senha123")
+        return (
+            await verify_password_async("senha123", hashed),
+            await verify_password_async("errada123", hashed),
+        )
+
+    calls_before = hashing.hashing_pool.stats.calls
+    valid, invalid = asyncio.run(scenario())
+
+    assert valid is True
+    assert invalid is False
+    assert hashing.hashing_stats()["calls"] == calls_before + 3
+    assert hashing.hashing_stats()["max_run"] > 0
+
+
+def test_pool_rejects_when_saturated():
+    """
+    Test the pool answers HashingPoolSaturated once workers + queue are busy.
+    """
+    pool = HashingPool(kind="thread", workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        busy = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(HashingPoolSaturated):
+            await pool.run(release.wait)
+
+        release.set()
+        await asyncio.gather(*busy)
+
+    asyncio.run(scenario())
+    pool.shutdown()
+
+    assert pool.stats.rejected == 1
+    assert pool.stats.calls == 2
+    assert pool.stats.in_flight == 0
+
+
+def test_login_returns_503_when_pool_saturated(monkeypatch):
+    """
+    Test /login answers 503 instead of queueing bcrypt work when the pool is full.
+    """
+    email = f"pool_{uuid.uuid4().hex[:8]}@example.com"
+    response = client.post(
+        "/user", json={"name": "Pool", "email": email, "password": "senha123"}
+    )
+    assert response.status_code == 200
+
+    full_pool = HashingPool(kind="thread", workers=1, max_queue=0)
+    full_pool.stats.in_flight = 1
+    monkeypatch.setattr(hashing, "hashing_pool", full_pool)
+
+    response = client.post("/login", json={"email": email, "password": "senha123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
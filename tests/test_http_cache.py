@@ -0,0 +1,176 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from core import http_cache
+from core.cache import CollectionVersions, FakeSharedBackend
+from core.config import get_settings
+from core.db import SessionLocal
+from core.http_cache import etag_cache, etag_matches, etag_memo_enabled
+from main import app
+from models.product import Product
+from repository.cache import product_list_cache
+from datetime import date, timedelta
+import pytest
+import uuid
+
+client = TestClient(app)
+
+EXPIRE = (date.today() + timedelta(days=5)).isoformat()
+
+
+@pytest.fixture(autouse=True)
+def remembered_etags(monkeypatch):
+    """
+    The test client is a single process, its versions see every write: the
+    tags are remembered as with CACHE_SHARED_URL.
+    """
+    monkeypatch.setattr(etag_cache, "enabled", True)
+
+
+def create_product(headers, name: str) -> int:
+    response = client.post(
+        "/product",
+        json={"name": name, "price": 2, "date_expire": EXPIRE},
+        headers=headers,
+    )
+    return response.json()["id"]
+
+
+def revalidate(url: str, etag: str, headers=None, **params):
+    return client.get(
+        url, params=params, headers={**(headers or {}), "If-None-Match": etag}
+    )
+
+
+def statements_on(log, table: str) -> list[str]:
+    return [s for s in log.statements.elements() if f"FROM {table}" in s]
+
+
+def test_etag_matching():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('"b", W/"a"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
+
+
+def test_etags_are_remembered_with_shared_versions_only():
+    """
+    Test the tags aren't remembered with the in-process versions, whatever
+    WORKERS says: `uvicorn --workers` doesn't change it.
+    """
+    settings = get_settings()
+    assert not etag_memo_enabled(
+        settings.model_copy(update={"WORKERS": 1, "CACHE_SHARED_URL": None})
+    )
+    assert etag_memo_enabled(
+        settings.model_copy(update={"CACHE_SHARED_URL": "redis://cache:6379/0"})
+    )
+    assert not etag_memo_enabled(
+        settings.model_copy(
+            update={"CACHE_SHARED_URL": "memory://", "CACHE_ENABLED": False}
+        )
+    )
+
+
+def test_product_list_not_modified_without_reading(auth_user, query_budget):
+    _, headers = auth_user
+    create_product(headers, "Milk")
+
+    response = client.get("/product", headers=headers)
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert response.headers["Vary"] == "Authorization"
+
+    with query_budget(1) as log:
+        response = revalidate("/product", etag, headers)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert statements_on(log, "products") == []
+
+    create_product(headers, "Rice")
+    response = revalidate("/product", etag, headers)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()["items"]) == 2
+
+
+def test_product_item_etag(auth_user, new_user):
+    _, headers = auth_user
+    _, other_headers = new_user()
+    product_id = create_product(headers, "Milk")
+
+    response = client.get(f"/product/{product_id}", headers=headers)
+    etag = response.headers["ETag"]
+    assert response.json()["name"] == "Milk"
+    assert revalidate(f"/product/{product_id}", etag, headers).status_code == 304
+    assert revalidate(f"/product/{product_id}", etag, other_headers).status_code == 404
+
+    client.put(
+        f"/product/update/{product_id}",
+        json={"name": "Oat milk", "price": 3, "date_expire": EXPIRE},
+        headers=headers,
+    )
+    response = revalidate(f"/product/{product_id}", etag, headers)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Oat milk"
+
+
+def test_user_writes_change_the_user_etags(auth_user, query_budget):
+    user_id, _ = auth_user
+
+    response = client.get("/user", params={"ids": str(user_id)})
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+    with query_budget(0):
+        assert revalidate("/user", etag, ids=str(user_id)).status_code == 304
+
+    email = f"user_{uuid.uuid4().hex[:8]}@example.com"
+    client.put(
+        f"/user/update/{user_id}",
+        json={"name": "Renamed", "email": email, "password": "senha123"},
+    )
+    response = revalidate("/user", etag, ids=str(user_id))
+    assert response.status_code == 200
+    assert response.json()["items"][0]["name"] == "Renamed"
+
+
+def test_forgotten_etag_is_rebuilt_from_the_body(auth_user):
+    _, headers = auth_user
+    create_product(headers, "Milk")
+    etag = client.get("/product", headers=headers).headers["ETag"]
+
+    # another process, or the tag expired: the page is read and hashed again
+    etag_cache.clear()
+    assert revalidate("/product", etag, headers).status_code == 304
+
+
+def test_shared_versions_see_another_worker_write(auth_user, monkeypatch):
+    user_id, headers = auth_user
+    product_id = create_product(headers, "Milk")
+    shared = FakeSharedBackend()
+    monkeypatch.setattr(product_list_cache.versions, "shared", shared)
+
+    etag = client.get("/product", headers=headers).headers["ETag"]
+    assert revalidate("/product", etag, headers).status_code == 304
+
+    # another worker, with its own caches, changes the price
+    with SessionLocal() as db:
+        db.execute(update(Product).where(Product.id == product_id).values(price=7))
+        db.commit()
+    CollectionVersions("products_by_user", "fk_user", shared).invalidate([user_id])
+
+    response = revalidate("/product", etag, headers)
+    assert response.status_code == 200
+    assert response.json()["items"][0]["price"] == 7
+
+
+def test_etags_can_be_turned_off(auth_user, monkeypatch):
+    _, headers = auth_user
+    monkeypatch.setattr(http_cache.settings, "ETAG_ENABLED", False)
+
+    response = client.get("/product", headers=headers)
+    assert "ETag" not in response.headers
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert revalidate("/product", '"x"', headers).status_code == 200
@@ -0,0 +1,82 @@
+from fastapi.testclient import TestClient
+from core.metrics import Histogram, registry
+from main import app
+import re
+
+client = TestClient(app)
+
+
+def sample(text: str, name: str, **labels) -> float:
+    """
+    the value of the metric line with exactly these labels
+    """
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{name}{{{re.escape(wanted)}}} (\S+)$", text, re.MULTILINE)
+    assert match, f"{name}{{{wanted}}} not found"
+    return float(match.group(1))
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [("0.1", 2), ("0.5", 3), ("1.0", 3), ("+Inf", 4)]
+    assert histogram.count == 4
+
+
+def test_requests_are_recorded_by_route_template(auth_user):
+    """
+    Test the latency, status and database queries of requests are exposed on
+    /metrics, labelled by the route template instead of the raw path.
+    """
+    _, headers = auth_user
+    registry.clear()
+    client.get("/product", headers=headers)
+    client.get("/product", headers=headers)
+    client.put("/product/update/999999999", json={}, headers=headers)
+    client.get("/not-a-route")
+
+    text = client.get("/metrics").text
+
+    assert "# TYPE keeper_http_request_duration_seconds histogram" in text
+    count = sample(
+        text,
+        "keeper_http_request_duration_seconds_count",
+        route="/product",
+        method="GET",
+        status="200",
+    )
+    assert count == 2
+    assert (
+        sample(
+            text,
+            "keeper_http_request_duration_seconds_bucket",
+            route="/product/update/{product_id}",
+            method="PUT",
+            status="422",
+            le="+Inf",
+        )
+        == 1
+    )
+    assert (
+        sample(
+            text,
+            "keeper_http_request_duration_seconds_count",
+            route="unmatched",
+            method="GET",
+            status="404",
+        )
+        == 1
+    )
+
+    # the second page is served by the per user list cache
+    assert sample(text, "keeper_db_queries_per_request_sum", route="/product") >= 1
+    assert sample(text, "keeper_db_duration_seconds_sum", route="/product") > 0
+    assert sample(text, "keeper_db_queries_per_request_sum", route="unmatched") == 0
+    assert sample(text, "keeper_http_requests_in_flight", method="GET") == 1  # /metrics
+
+    assert 'keeper_cache_hits_total{table="users"}' in text
+    assert 'keeper_db_pool_checkouts_total{engine="sync"}' in text
+    assert "keeper_token_cache_hits_total" in text
+    assert "keeper_hashing_calls_total" in text
@@ -0,0 +1,194 @@
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from datetime import date, timedelta
+from pathlib import Path
+from sqlalchemy import create_engine, func, insert, select, text
+from core.db import Base
+from models import Product, User
+from utils.sql import query_plan, uses_index
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def alembic_config(url: str) -> Config:
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", url)
+    config.attributes["configure_logger"] = False
+    return config
+
+
+@pytest.fixture(scope="module")
+def migrated_engine(tmp_path_factory):
+    """
+    A fresh SQLite database built only by `alembic upgrade head`, seeded with
+    enough rows for the planner to prefer the indexes.
+    """
+    url = f"sqlite:///{tmp_path_factory.mktemp('alembic') / 'keeper.db'}"
+    command.upgrade(alembic_config(url), "head")
+
+    engine = create_engine(url)
+    today = date.today()
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "name": f"user{i}",
+                    "email": f"user{i}@keeper.io",
+                    "hashed_password": "x",
+                }
+                for i in range(50)
+            ],
+        )
+        conn.execute(
+            insert(Product),
+            [
+                {
+                    "name": f"Product {i}",
+                    "fk_user": i % 50 + 1,
+                    "date_expire": today + timedelta(days=i % 365),
+                    "price": i % 100,
+                }
+                for i in range(5000)
+            ],
+        )
+        conn.execute(text("ANALYZE"))
+
+    yield engine
+    engine.dispose()
+
+
+def test_create_all_database_upgrades_from_0001(tmp_path):
+    """
+    A database made by create_all before the migrations, stamped at 0001,
+    upgrades to the current schema and keeps its rows.
+    """
+    url = f"sqlite:///{tmp_path / 'keeper.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE users (id INTEGER NOT NULL, name VARCHAR NOT NULL, "
+                "email VARCHAR NOT NULL, hashed_password VARCHAR(255) NOT NULL, "
+                "created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), PRIMARY KEY (id))"
+            )
+        )
+        conn.execute(text("CREATE UNIQUE INDEX ix_users_email ON users (email)"))
+        conn.execute(text("CREATE INDEX ix_users_id ON users (id)"))
+        conn.execute(
+            text(
+                "CREATE TABLE products (id INTEGER NOT NULL, name VARCHAR NOT NULL, "
+                "fk_user INTEGER NOT NULL, date_expire DATE, "
+                "price NUMERIC(10, 2) NOT NULL, PRIMARY KEY (id), "
+                "FOREIGN KEY(fk_user) REFERENCES users (id))"
+            )
+        )
+        conn.execute(text("CREATE INDEX ix_products_id ON products (id)"))
+        conn.execute(
+            text(
+                "INSERT INTO users (name, email, hashed_password) VALUES ('a', 'a', 'x')"
+            )
+        )
+        conn.execute(
+            text("INSERT INTO products (name, fk_user, price) VALUES ('Milk', 1, 2)")
+        )
+
+    config = alembic_config(url)
+    command.stamp(config, "0001")
+    command.upgrade(config, "head")
+
+    with engine.connect() as conn:
+        product = conn.execute(select(Product)).one()
+        diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+    assert product.name == "Milk" and product.updated_at is not None
+    assert diff == []
+    engine.dispose()
+
+
+def test_unique_products_migration_refuses_duplicates(tmp_path):
+    url = f"sqlite:///{tmp_path / 'keeper.db'}"
+    config = alembic_config(url)
+    command.upgrade(config, "0007")
+
+    engine = create_engine(url)
+    expire = date.today() + timedelta(days=3)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User).values(
+                name="user", email="user@keeper.io", hashed_password="x"
+            )
+        )
+        conn.execute(
+            insert(Product),
+            [
+                {"name": "Milk", "fk_user": 1, "date_expire": expire, "price": price}
+                for price in (2, 3)
+            ],
+        )
+
+    with pytest.raises(RuntimeError, match="Merge or delete them"):
+        command.upgrade(config, "0008")
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count(Product.id))).scalar_one() == 2
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM products WHERE price = 3"))
+    command.upgrade(config, "0008")
+    engine.dispose()
+
+
+def test_migrations_match_models(migrated_engine):
+    with migrated_engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+
+    assert diff == []
+
+
+@pytest.mark.parametrize(
+    "statement, index_name",
+    [
+        (
+            select(Product)
+            .where(Product.fk_user == 7)
+            .order_by(Product.date_expire, Product.id),
+            "ix_products_fk_user_date_expire_id",
+        ),
+        (
+            select(Product)
+            .where(Product.fk_user == 7, Product.id > 100)
+            .order_by(Product.id)
+            .limit(50),
+            "ix_products_fk_user_id",
+        ),
+        (
+            select(Product)
+            .where(Product.fk_user == 7, Product.price.between(10, 20))
+            .order_by(Product.price, Product.id),
+            "ix_products_fk_user_price_id",
+        ),
+        (
+            select(Product).where(Product.fk_user == 7).order_by(Product.name),
+            "ix_products_fk_user_name",
+        ),
+        (
+            select(Product).where(
+                Product.fk_user == 7, func.lower(Product.name) == "product 7"
+            ),
+            "ix_products_fk_user_lower_name",
+        ),
+        (
+            select(Product.id).where(
+                Product.date_expire.between(date.today(), date.today() + timedelta(3))
+            ),
+            "ix_products_date_expire_id",
+        ),
+    ],
+)
+def test_hot_queries_use_indexes(migrated_engine, statement, index_name):
+    with migrated_engine.connect() as conn:
+        plan = query_plan(conn, statement)
+
+    assert uses_index(plan, index_name), plan
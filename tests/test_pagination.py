@@ -0,0 +1,129 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from core.config import get_settings
+from core.db import Base
+from main import app
+from models.product import Product
+from repository.product_repo import ProductRepo
+from schemas.product import ProductList, ProductPage
+from utils.serialization import page_response
+from datetime import date, timedelta
+import pytest
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def product_repo():
+    """
+    Repository over an in-memory database with repeated and empty expiry dates,
+    products of users 1 and 2.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    today = date.today()
+    for i in range(23):
+        expire = None if i % 7 == 0 else today + timedelta(days=i % 4)
+        db.add(Product(name=f"product {i}", fk_user=1, date_expire=expire, price=i))
+        # another user's products, never in user 1 pages
+        db.add(Product(name=f"other {i}", fk_user=2, date_expire=expire, price=i))
+    db.commit()
+
+    yield ProductRepo(db)
+
+    db.close()
+    engine.dispose()
+
+
+def expected_order(repo, order_by):
+    products = repo.db.query(Product).filter(Product.fk_user == 1).all()
+    if order_by == "id":
+        return [p.id for p in sorted(products, key=lambda p: p.id)]
+    return [
+        p.id
+        for p in sorted(
+            products, key=lambda p: (p.date_expire is None, p.date_expire, p.id)
+        )
+    ]
+
+
+@pytest.mark.parametrize("order_by", ["id", "date_expire"])
+def test_walk_forward_and_back(product_repo, order_by):
+    """
+    Test following next cursors visits every row once in order,
+    and following prev cursors gives back the same pages.
+    """
+    pages = []
+    cursor = None
+    while True:
+        rows, next_cursor, prev_cursor = product_repo.list_products_page(
+            1, 5, cursor, order_by
+        )
+        pages.append(([row.id for row in rows], prev_cursor))
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+
+    assert [i for ids, _ in pages for i in ids] == expected_order(
+        product_repo, order_by
+    )
+    assert pages[0][1] is None
+
+    for index in range(len(pages) - 1, 0, -1):
+        rows, _, _ = product_repo.list_products_page(1, 5, pages[index][1], order_by)
+        assert [row.id for row in rows] == pages[index - 1][0]
+
+
+def test_route_returns_page_and_validates(auth_user):
+    """
+    Test GET /product answers a page envelope, rejects bad cursors with 400
+    and page sizes over PAGE_SIZE_MAX with 422.
+    """
+    _, headers = auth_user
+    response = client.get("/product", params={"limit": 2}, headers=headers)
+    assert response.status_code == 200
+    assert set(response.json()) == {"items", "next_cursor", "prev_cursor"}
+
+    response = client.get(
+        "/product", params={"cursor": "not-a-cursor"}, headers=headers
+    )
+    assert response.status_code == 400
+
+    too_big = get_settings().PAGE_SIZE_MAX + 1
+    assert client.get("/user", params={"limit": too_big}).status_code == 422
+
+
+def test_page_response_matches_the_response_model(product_repo):
+    """
+    Test the bulk validated, orjson encoded page is the same JSON the
+    ProductPage response model gives.
+    """
+    products, next_cursor, prev_cursor = product_repo.list_products_page(1, 10)
+
+    page = ProductPage.model_validate(
+        {"items": products, "next_cursor": next_cursor, "prev_cursor": prev_cursor},
+        from_attributes=True,
+    )
+    response = page_response(ProductList, products, next_cursor, prev_cursor)
+
+    assert response.media_type == "application/json"
+    assert response.body == page.model_dump_json().encode()
+
+
+def test_read_only_lists_skip_the_identity_map(product_repo):
+    """
+    Test the read-only lists return column rows, not Product entities, and
+    leave the session identity map empty.
+    """
+    db = product_repo.db
+    db.expunge_all()
+
+    rows, _, _ = product_repo.list_products_page(1, 10, order_by="date_expire")
+    rows += product_repo.list_product_rows_by_user(1)
+
+    assert rows and not any(isinstance(row, Product) for row in rows)
+    assert rows[0]._fields == ("id", "name", "fk_user", "date_expire", "price")
+    assert len(db.identity_map) == 0
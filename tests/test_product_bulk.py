@@ -0,0 +1,147 @@
+from fastapi.testclient import TestClient
+from core.db import SessionLocal
+from main import app
+from models.product import Product
+from services import product_service
+from datetime import date, timedelta
+import json
+import pytest
+
+client = TestClient(app)
+
+
+def future_date(days: int) -> str:
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def bulk_user(auth_user):
+    """
+    The importing user's id and a client authenticated as them
+    """
+    user_id, headers = auth_user
+    authenticated = TestClient(app, headers=headers)
+    return user_id, authenticated
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """
+    Chunks of 2 rows, so the imports below span several transactions.
+    """
+    monkeypatch.setattr(product_service.settings, "BULK_CHUNK_SIZE", 2)
+
+
+def test_bulk_json_reports_bad_rows_without_aborting(bulk_user, small_chunks):
+    """
+    Test the valid rows of every chunk are created and the bad ones reported
+    with their row number. Every row belongs to the importing user, whatever
+    its fk_user.
+    """
+    user_id, client = bulk_user
+    rows = [
+        {"name": "Milk", "fk_user": user_id, "date_expire": future_date(3), "price": 5},
+        {"name": "Rice", "fk_user": user_id, "date_expire": future_date(9), "price": 8},
+        {
+            "name": "Egg",
+            "fk_user": user_id,
+            "date_expire": future_date(2),
+            "price": "x",
+        },
+        {"name": "Bread", "fk_user": user_id, "date_expire": "2000-01-01", "price": 4},
+        {"name": "Beans", "fk_user": 10**9, "date_expire": future_date(5), "price": 7},
+        {
+            "name": "Apple",
+            "fk_user": user_id,
+            "date_expire": future_date(1),
+            "price": 1,
+        },
+    ]
+    response = client.post("/product/bulk", json=rows)
+    assert response.status_code == 200
+
+    result = response.json()
+    assert result["created"] == 4
+    assert result["failed"] == 2
+    assert [error["row"] for error in result["errors"]] == [3, 4]
+    assert result["errors"][0]["errors"][0].startswith("price:")
+
+    with SessionLocal() as db:
+        products = db.query(Product).filter(Product.id.in_(result["ids"]))
+        names = {product.id: (product.name, product.fk_user) for product in products}
+    assert [names.get(i) for i in result["ids"]] == [
+        ("Milk", user_id),
+        ("Rice", user_id),
+        ("Beans", user_id),
+        ("Apple", user_id),
+    ]
+
+
+def test_bulk_ndjson_and_csv_streams(bulk_user, small_chunks):
+    """
+    Test NDJSON and CSV uploads, sent as a chunked stream split mid-line.
+    """
+    user_id, client = bulk_user
+    ndjson = "\n".join(
+        [
+            json.dumps(
+                {
+                    "name": f"Item {i}",
+                    "fk_user": user_id,
+                    "date_expire": future_date(i),
+                    "price": i,
+                }
+            )
+            for i in range(1, 6)
+        ]
+        + ["", "{not json"]
+    ).encode()
+
+    def stream(body: bytes):
+        for i in range(0, len(body), 7):
+            yield body[i : i + 7]
+
+    response = client.post(
+        "/product/bulk",
+        content=stream(ndjson),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.json()["created"] == 5
+    assert response.json()["errors"] == [{"row": 6, "errors": ["Invalid JSON line"]}]
+
+    csv_body = (
+        "name,fk_user,date_expire,price\r\n"
+        f"Coffee,{user_id},{future_date(30)},12.5\r\n"
+        f"Tea,{user_id},{future_date(40)}\r\n"
+        f'"Sugar, brown",{user_id},{future_date(50)},3\r\n'
+    ).encode()
+    response = client.post(
+        "/product/bulk",
+        content=stream(csv_body),
+        headers={"Content-Type": "text/csv; charset=utf-8"},
+    )
+    assert response.json()["created"] == 2
+    assert response.json()["errors"] == [{"row": 2, "errors": ["Expected 4 columns"]}]
+
+
+def test_bulk_requires_a_token():
+    """
+    Test an anonymous import is rejected before any row is read.
+    """
+    expire = future_date(3)
+    response = client.post(
+        "/product/bulk",
+        json=[{"name": "Milk", "fk_user": 1, "date_expire": expire, "price": 5}],
+    )
+    assert response.status_code == 401
+
+
+def test_bulk_rejects_unreadable_uploads(bulk_user):
+    _, client = bulk_user
+    response = client.post(
+        "/product/bulk", content=b"name", headers={"Content-Type": "text/plain"}
+    )
+    assert response.status_code == 415
+
+    response = client.post("/product/bulk", json={"name": "Milk"})
+    assert response.status_code == 400
@@ -0,0 +1,112 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+from core.db import Base
+from main import app
+from models.user import User
+from services.product_service import AsyncProductService
+from datetime import date, timedelta
+import asyncio
+import csv
+import io
+import json
+import os
+import pytest
+import uuid
+
+client = TestClient(app)
+
+
+def login(name: str) -> tuple[int, dict]:
+    email = f"{name}_{uuid.uuid4().hex[:8]}@example.com"
+    user = client.post(
+        "/user", json={"name": name, "email": email, "password": "senha123"}
+    ).json()
+    token = client.post("/login", json={"email": email, "password": "senha123"})
+    return user["id"], {"Authorization": f"Bearer {token.json()['access_token']}"}
+
+
+def test_export_streams_only_the_user_products():
+    """
+    Test the NDJSON and CSV exports hold every product of the user and no other.
+    """
+    user_id, headers = login("Export")
+    _, other_headers = login("Other")
+    expire = (date.today() + timedelta(days=10)).isoformat()
+    rows = [
+        {"name": f"Item {i}", "date_expire": expire, "price": i} for i in range(1, 6)
+    ]
+    ids = client.post("/product/bulk", json=rows, headers=headers).json()["ids"]
+    client.post(
+        "/product/bulk",
+        json=[{"name": "Other", "date_expire": expire, "price": 1}],
+        headers=other_headers,
+    )
+
+    response = client.get("/product/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == ids
+    assert lines[0] == {
+        "id": ids[0],
+        "name": "Item 1",
+        "fk_user": user_id,
+        "date_expire": expire,
+        "price": 1.0,
+    }
+
+    response = client.get("/product/export", params={"format": "csv"}, headers=headers)
+    assert response.headers["content-type"].startswith("text/csv")
+    records = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(record["id"]) for record in records] == ids
+
+    assert client.get("/product/export").status_code == 401
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs procfs")
+def test_export_memory_does_not_grow_with_the_rows(tmp_path):
+    """
+    Test exporting a million products keeps the process memory flat, while
+    the same rows as ORM objects would take hundreds of MB.
+    """
+    rows_count = 1_000_000
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(bind=engine)
+    expire = date.today() + timedelta(days=30)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            {"id": 1, "name": "Big", "email": "big@x.io", "hashed_password": "x"},
+        )
+        conn.execute(
+            text(
+                "WITH RECURSIVE seq(n) AS "
+                "(SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :rows) "
+                "INSERT INTO products (name, fk_user, date_expire, price) "
+                "SELECT 'Product ' || n, 1, :expire, 9.99 FROM seq"
+            ),
+            {"rows": rows_count, "expire": expire.isoformat()},
+        )
+
+    async def export() -> tuple[int, int]:
+        lines, growth = 0, 0
+        with sessionmaker(bind=engine)() as db:
+            start = rss_bytes()
+            async for chunk in AsyncProductService(db).export_products(1, "ndjson"):
+                lines += chunk.count("\n")
+                growth = max(growth, rss_bytes() - start)
+        return lines, growth
+
+    try:
+        lines, growth = asyncio.run(export())
+    finally:
+        engine.dispose()
+
+    assert lines == rows_count
+    assert growth < 32 * 1024 * 1024
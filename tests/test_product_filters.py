@@ -0,0 +1,203 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker
+from core.db import Base
+from main import app
+from models import Product, User
+from repository.product_repo import PRODUCT_ORDERS, ProductRepo
+from schemas.product import ProductFilters
+from utils.sql import prefix_range, query_plan, sequential_scans
+from datetime import date, timedelta
+import pytest
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def filtered_user(auth_user):
+    """
+    A user with products of every price, expiry date and name, returning the
+    headers and the dates of the products by name
+    """
+    _, headers = auth_user
+    today = date.today()
+    products = [
+        ("Milk", 4.5, today + timedelta(days=3)),
+        ("milk powder", 12.0, today + timedelta(days=90)),
+        ("Bread", 3.2, today + timedelta(days=2)),
+        ("Cheese", 25.0, today + timedelta(days=30)),
+        ("Butter", 9.9, today + timedelta(days=180)),
+    ]
+    for name, price, expire in products:
+        response = client.post(
+            "/product",
+            json={
+                "name": name,
+                "price": price,
+                "date_expire": expire.isoformat(),
+            },
+            headers=headers,
+        )
+        assert response.status_code == 200, response.text
+    return headers, {name: expire for name, _, expire in products}
+
+
+def names(response) -> list[str]:
+    assert response.status_code == 200, response.text
+    return [item["name"] for item in response.json()["items"]]
+
+
+def test_filter_by_price_range(filtered_user):
+    headers, _ = filtered_user
+    response = client.get(
+        "/product",
+        params={"min_price": 4.5, "max_price": 12, "order_by": "price"},
+        headers=headers,
+    )
+
+    assert names(response) == ["Milk", "Butter", "milk powder"]
+
+
+def test_filter_by_expiry_range(filtered_user):
+    headers, expires = filtered_user
+    response = client.get(
+        "/product",
+        params={
+            "expire_after": expires["Milk"].isoformat(),
+            "expire_before": expires["Cheese"].isoformat(),
+            "order_by": "date_expire",
+        },
+        headers=headers,
+    )
+
+    assert names(response) == ["Milk", "Cheese"]
+
+
+def test_filter_by_name_prefix_is_case_insensitive(filtered_user):
+    headers, _ = filtered_user
+    response = client.get(
+        "/product", params={"name_prefix": "MIL", "order_by": "name"}, headers=headers
+    )
+
+    assert names(response) == ["Milk", "milk powder"]
+
+
+def test_name_prefix_range_is_in_code_point_order():
+    """
+    Test the prefix bounds compare in "C" collation on PostgreSQL and stay
+    valid for prefixes ending in the last code points.
+    """
+
+    def bounds(prefix, dialect):
+        clause = prefix_range(func.lower(Product.name), prefix)
+        return clause.compile(dialect=dialect).params
+
+    compiled = str(
+        prefix_range(func.lower(Product.name), "mil").compile(
+            dialect=postgresql.dialect()
+        )
+    )
+    assert compiled.count('lower(products.name) COLLATE "C"') == 2
+    assert list(bounds("mil", postgresql.dialect()).values()) == ["mil", "mim"]
+    assert "COLLATE" not in str(
+        prefix_range(func.lower(Product.name), "mil").compile(dialect=sqlite.dialect())
+    )
+
+    assert list(bounds("a\U0010ffff", sqlite.dialect()).values())[1] == "b"
+    assert list(bounds("\U0010ffff", sqlite.dialect()).values()) == ["\U0010ffff"]
+    assert list(bounds("a\ud7ff", sqlite.dialect()).values())[1] == "a\ue000"
+
+
+def test_sort_by_price_walks_every_page(filtered_user):
+    """
+    Test the price cursors (decimals) give every product once, in price order.
+    """
+    headers, _ = filtered_user
+    seen, cursor = [], None
+    while True:
+        params = {"order_by": "price", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/product", params=params, headers=headers)
+        seen += names(response)
+        cursor = response.json()["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == ["Bread", "Milk", "Butter", "milk powder", "Cheese"]
+
+
+def test_invalid_filters_are_rejected(auth_user):
+    _, headers = auth_user
+    for params in ({"min_price": -1}, {"expire_after": "soon"}, {"order_by": "size"}):
+        response = client.get("/product", params=params, headers=headers)
+        assert response.status_code == 422, params
+
+
+@pytest.fixture(scope="module")
+def large_product_repo():
+    """
+    Repository over many users' products, analyzed so the planner knows the
+    per user selectivity of the indexes.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    today = date.today()
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "name": f"user{i}",
+                    "email": f"user{i}@keeper.io",
+                    "hashed_password": "x",
+                }
+                for i in range(200)
+            ],
+        )
+        conn.execute(
+            insert(Product),
+            [
+                {
+                    "name": f"Product {i}",
+                    "fk_user": i % 200 + 1,
+                    "date_expire": today + timedelta(days=i % 365),
+                    "price": i % 1000,
+                }
+                for i in range(20000)
+            ],
+        )
+        conn.execute(text("ANALYZE"))
+
+    db = sessionmaker(bind=engine)()
+    yield ProductRepo(db)
+
+    db.close()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("order_by", list(PRODUCT_ORDERS))
+@pytest.mark.parametrize(
+    "filters",
+    [
+        ProductFilters(),
+        ProductFilters(min_price=100, max_price=200),
+        ProductFilters(expire_after=date.today(), expire_before=date.today()),
+        ProductFilters(name_prefix="product 1"),
+        ProductFilters(min_price=10, expire_before=date.today(), name_prefix="prod"),
+    ],
+)
+def test_filtered_pages_use_an_index(large_product_repo, filters, order_by):
+    """
+    Test no filter and sort combination reads the whole products table.
+    """
+    statement = (
+        large_product_repo.filtered_products(7, filters)
+        .order_by(*PRODUCT_ORDERS[order_by])
+        .limit(51)
+        .statement
+    )
+    plan = query_plan(large_product_repo.db, statement)
+
+    assert sequential_scans(plan) == [], plan
@@ -0,0 +1,184 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import Select, delete
+from core.db import SessionLocal, async_engine
+from main import app
+from models.product import Product
+from repository.product_repo import ProductRepo
+from schemas.product import ProductCreate
+from services.summary_service import SummaryService
+from datetime import date, timedelta
+import asyncio
+import httpx
+import uuid
+
+client = TestClient(app)
+
+
+def product(name: str = "Milk", price: float = 4.5) -> dict:
+    expire = (date.today() + timedelta(days=5)).isoformat()
+    return {"name": name, "price": price, "date_expire": expire}
+
+
+def user_products(user_id: int) -> list:
+    with SessionLocal() as db:
+        return db.query(Product).filter(Product.fk_user == user_id).all()
+
+
+def post_concurrently(requests: list[tuple[dict, dict, dict]]) -> list:
+    """
+    Send the (json, params, headers) requests at once, from one event loop.
+    The async connections opened by the loop are closed with it, like the app
+    lifespan does.
+    """
+
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://testserver"
+        ) as http:
+            try:
+                return await asyncio.gather(
+                    *(
+                        http.post("/product", json=json, params=params, headers=headers)
+                        for json, params, headers in requests
+                    )
+                )
+            finally:
+                if async_engine is not None:
+                    await async_engine.dispose()
+
+    return asyncio.run(send())
+
+
+def test_duplicate_product_conflicts(auth_user):
+    user_id, headers = auth_user
+    created = client.post("/product", json=product(), headers=headers)
+    assert created.status_code == 200
+
+    response = client.post("/product", json=product(price=9), headers=headers)
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Product already exists!"}
+    assert len(user_products(user_id)) == 1
+
+
+def test_update_onto_an_existing_product_conflicts(auth_user):
+    user_id, headers = auth_user
+    milk = client.post("/product", json=product(), headers=headers).json()
+    eggs = client.post("/product", json=product("Eggs"), headers=headers).json()
+
+    response = client.put(
+        f"/product/update/{eggs['id']}", json=product(price=2), headers=headers
+    )
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Product already exists!"}
+
+    assert client.get(f"/product/{eggs['id']}", headers=headers).json() == eggs
+    assert client.get(f"/product/{milk['id']}", headers=headers).json() == milk
+    summary = client.get(f"/user/{user_id}/summary", headers=headers).json()
+    assert (summary["product_count"], summary["total_price"]) == (2, 9.0)
+
+
+def test_upsert_updates_the_existing_product(auth_user):
+    user_id, headers = auth_user
+    first = client.post("/product", json=product(), headers=headers).json()
+    client.get("/product", headers=headers)  # cache the page
+
+    response = client.post(
+        "/product", json=product(price=6.25), params={"upsert": True}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json() == {**first, "price": 6.25}
+
+    assert (
+        client.get(f"/product/{first['id']}", headers=headers).json()["price"] == 6.25
+    )
+    page = client.get("/product", headers=headers).json()
+    assert [item["price"] for item in page["items"]] == [6.25]
+
+    summary = client.get(f"/user/{user_id}/summary", headers=headers).json()
+    assert (summary["product_count"], summary["total_price"]) == (1, 6.25)
+    with SessionLocal() as db:
+        assert SummaryService(db).check(user_id) == []
+
+
+def test_upsert_retries_when_the_conflicting_product_is_deleted(auth_user):
+    user_id, headers = auth_user
+    existing = client.post("/product", json=product(), headers=headers).json()
+
+    with SessionLocal() as db:
+        execute = db.execute
+        deleted = []
+
+        def delete_before_the_read(statement, *args, **kwargs):
+            # another transaction deletes the product between insert and read
+            if isinstance(statement, Select) and not deleted:
+                deleted.append(execute(delete(Product).filter_by(id=existing["id"])))
+            return execute(statement, *args, **kwargs)
+
+        db.execute = delete_before_the_read
+        row, created = ProductRepo(db).upsert_product(
+            ProductCreate(**product(price=3), fk_user=user_id)
+        )
+
+    assert created and deleted
+    assert row.price == 3
+    assert [p.id for p in user_products(user_id)] == [row.id]
+
+
+def test_idempotency_key_replays_the_first_response(auth_user, new_user):
+    user_id, headers = auth_user
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+
+    first = client.post("/product", json=product(), headers={**headers, **key})
+    retry = client.post("/product", json=product(), headers={**headers, **key})
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert len(user_products(user_id)) == 1
+
+    reused = client.post("/product", json=product("Rice"), headers={**headers, **key})
+    assert reused.status_code == 422
+
+    # the keys are per user
+    other_id, other_headers = new_user()
+    other = client.post("/product", json=product(), headers={**other_headers, **key})
+    assert other.status_code == 200
+    assert other.json()["fk_user"] == other_id
+    assert "Idempotent-Replayed" not in other.headers
+
+
+def test_concurrent_retries_with_the_same_key_create_once(auth_user):
+    user_id, headers = auth_user
+    headers = {**headers, "Idempotency-Key": uuid.uuid4().hex}
+
+    responses = post_concurrently([(product(), {}, headers)] * 10)
+
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["id"] for response in responses}) == 1
+    replays = [r for r in responses if r.headers.get("Idempotent-Replayed")]
+    assert len(replays) == 9
+    assert len(user_products(user_id)) == 1
+
+
+def test_concurrent_duplicates_insert_one_row(auth_user):
+    user_id, headers = auth_user
+
+    responses = post_concurrently([(product(), {}, headers)] * 10)
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] + [409] * 9
+
+    upserts = post_concurrently(
+        [(product(price=price), {"upsert": True}, headers) for price in range(1, 11)]
+    )
+    assert {response.status_code for response in upserts} == {200}
+    assert len({response.json()["id"] for response in upserts}) == 1
+
+    products = user_products(user_id)
+    assert len(products) == 1
+    summary = client.get(f"/user/{user_id}/summary", headers=headers).json()
+    assert summary["product_count"] == 1
+    assert summary["total_price"] == float(products[0].price)
+    with SessionLocal() as db:
+        assert SummaryService(db).check(user_id) == []
@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 from core.db_test import Basetest, enginetest
 from main import app
+from datetime import date, timedelta
 import pytest
 import uuid
 import os
@@ -8,6 +9,13 @@ import os
 client = TestClient(app)
 
 
+def future_date(days: int) -> str:
+    """
+    Products can't expire before today, so the tests build dates from today.
+    """
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
 @pytest.fixture(scope="session", autouse=True)
 def setup_test_database():
     """
@@ -29,55 +37,57 @@ def setup_test_database():
 
 
 @pytest.fixture
-def created_product():
+def created_product(auth_user):
     """
     Fixture to create a product.
 
-    Sends a POST request to create the Product and asserts success.
-    Returns the created Product's ID and use for tests.
+    Sends a POST request to create the Product of a new user and asserts success.
+    Returns the created Product's ID and the owner's headers for tests.
     """
-    unique_id = 5
+    _, headers = auth_user
     data = {
         "name": "Product1",
-        "fk_user": unique_id,
-        "date_expire": "2025-09-25",
+        "date_expire": future_date(7),
         "price": 154.44,
     }
-    response = client.post("/product", json=data)
+    response = client.post("/product", json=data, headers=headers)
     assert response.status_code == 200
-    return response.json()["id"], unique_id
+    return response.json()["id"], headers
 
 
-def test_get_products():
+def test_get_products(auth_user):
     """
     Test retrieving a list of products.
 
     Sends a GET request to /product and asserts that the response status code
-    is either 200 (OK) or 400 (Bad Request if no products exist).
+    is either 200 (OK) or 400 (Bad Request if no products exist), and 401
+    without a token.
     """
-    response = client.get("/product")
+    _, headers = auth_user
+    response = client.get("/product", headers=headers)
     assert response.status_code in [200, 400]
+    assert client.get("/product").status_code == 401
 
 
-def test_create_product():
+def test_create_product(auth_user):
     """
     Test product creation.
 
-    Generates a product and sends a POST request to create a product.
+    Sends a POST request to create a product, with the fk_user of another user.
     Asserts that the status code is 200 or 400.
-    If successful, checks that the returned JSON contains the user ID.
+    If successful, checks that the product belongs to the authenticated user.
     """
-    unique_fk = 5
+    user_id, headers = auth_user
     data = {
         "name": "Product1",
-        "fk_user": unique_fk,
-        "date_expire": "2025-09-25",
+        "fk_user": user_id + 1000,
+        "date_expire": future_date(7),
         "price": 154.44,
     }
-    response = client.post("/product", json=data)
+    response = client.post("/product", json=data, headers=headers)
     assert response.status_code in [200, 400]
     if response.status_code == 200:
-        assert "fk_user" in response.json()
+        assert response.json()["fk_user"] == user_id
 
 
 def test_update_product(created_product):
@@ -88,14 +98,14 @@ def test_update_product(created_product):
     Sends a PUT request to update the product's data.
     Asserts that the response status code is 200 or 400.
     """
-    product_id, _ = created_product
+    product_id, headers = created_product
 
     data = {
         "name": "product Atualizado",
         "price": 5.55555,
-        "date_expire": "2025-09-29",
+        "date_expire": future_date(11),
     }
-    response = client.put(f"/product/update/{product_id}", json=data)
+    response = client.put(f"/product/update/{product_id}", json=data, headers=headers)
     assert response.status_code in [200, 400]
 
 
@@ -107,6 +117,61 @@ def test_delete_product(created_product):
     Sends a DELETE request to remove the product.
     Asserts that the response status code is 200 or 400.
     """
-    user_product, _ = created_product
-    response = client.delete(f"/product/{user_product}")
+    user_product, headers = created_product
+    response = client.delete(f"/product/{user_product}", headers=headers)
     assert response.status_code in [200, 400]
+    assert client.delete(f"/product/{user_product}", headers=headers).status_code == 404
+
+
+def test_products_are_scoped_to_their_owner(created_product, new_user):
+    """
+    Test another user doesn't list, get, update or delete the product.
+    """
+    product_id, owner_headers = created_product
+    _, other_headers = new_user()
+
+    listed = client.get("/product", headers=owner_headers).json()["items"]
+    assert [item["id"] for item in listed] == [product_id]
+    assert client.get("/product", headers=other_headers).json()["items"] == []
+
+    response = client.get(f"/product/{product_id}", headers=owner_headers)
+    assert response.json()["id"] == product_id
+    response = client.get(f"/product/{product_id}", headers=other_headers)
+    assert response.status_code == 404
+
+    data = {"name": "Stolen", "price": 1.0, "date_expire": future_date(3)}
+    response = client.put(
+        f"/product/update/{product_id}", json=data, headers=other_headers
+    )
+    assert response.status_code == 404
+    response = client.delete(f"/product/{product_id}", headers=other_headers)
+    assert response.status_code == 404
+
+    response = client.get(f"/product/{product_id}", headers=owner_headers)
+    assert response.json()["name"] == "Product1"
+
+
+def test_cached_list_sees_the_owner_writes(created_product):
+    """
+    Test the cached page of the user is dropped by a create, an update and a
+    delete of one of its products.
+    """
+    product_id, headers = created_product
+
+    def names():
+        items = client.get("/product", headers=headers).json()["items"]
+        return [item["name"] for item in items]
+
+    assert names() == ["Product1"]
+    assert names() == ["Product1"]  # served from the list cache
+
+    data = {"name": "Product2", "date_expire": future_date(3), "price": 2.0}
+    client.post("/product", json=data, headers=headers)
+    assert names() == ["Product1", "Product2"]
+
+    data = {"name": "Renamed", "date_expire": future_date(3), "price": 2.0}
+    client.put(f"/product/update/{product_id}", json=data, headers=headers)
+    assert names() == ["Renamed", "Product2"]
+
+    client.delete(f"/product/{product_id}", headers=headers)
+    assert names() == ["Product2"]
@@ -0,0 +1,128 @@
+from fastapi.testclient import TestClient
+from core.search import NgramIndex, trigrams
+from main import app
+from datetime import date, timedelta
+import pytest
+
+client = TestClient(app)
+
+NAMES = [
+    "Milk",
+    "Milk powder",
+    "Almond milk",
+    "Chocolate milk bar",
+    "Bread",
+    "Mild cheese",
+]
+
+
+@pytest.fixture
+def searched_user(auth_user):
+    """
+    A user with a few products, returning the headers
+    """
+    _, headers = auth_user
+    for name in NAMES:
+        response = client.post(
+            "/product",
+            json={
+                "name": name,
+                "price": 5,
+                "date_expire": (date.today() + timedelta(days=10)).isoformat(),
+            },
+            headers=headers,
+        )
+        assert response.status_code == 200, response.text
+    return headers
+
+
+def search(headers, **params) -> dict:
+    response = client.get("/product/search", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def names(page: dict) -> list[str]:
+    return [item["name"] for item in page["items"]]
+
+
+def test_prefix_search(searched_user):
+    page = search(searched_user, q="MIL", mode="prefix")
+
+    assert names(page) == ["Mild cheese", "Milk", "Milk powder"]
+
+
+def test_fulltext_search_ranks_the_closest_names_first(searched_user):
+    page = search(searched_user, q="milk", mode="fulltext")
+
+    assert names(page)[0] == "Milk"
+    assert set(names(page)) == {
+        "Milk",
+        "Milk powder",
+        "Almond milk",
+        "Chocolate milk bar",
+    }
+    scores = [item["score"] for item in page["items"]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_fuzzy_search_finds_typos(searched_user):
+    # 2 of the 10 trigrams shared, under the 0.3 threshold
+    page = search(searched_user, q="brade", mode="fuzzy")
+    assert names(page) == []
+
+    page = search(searched_user, q="bred", mode="fuzzy")
+    assert names(page) == ["Bread"]
+    assert 0 < page["items"][0]["score"] < 1
+
+
+def test_search_pages(searched_user):
+    first = search(searched_user, q="milk", mode="fulltext", limit=3)
+    second = search(
+        searched_user, q="milk", mode="fulltext", offset=first["next_offset"]
+    )
+
+    assert first["next_offset"] == 3
+    assert second["next_offset"] is None
+    assert len(names(first) + names(second)) == 4
+
+
+def test_search_sees_the_owner_writes_only(searched_user, new_user):
+    _, other_headers = new_user()
+    assert search(other_headers, q="milk")["items"] == []
+
+    client.post(
+        "/product",
+        json={
+            "name": "Goat milk",
+            "price": 7,
+            "date_expire": (date.today() + timedelta(days=10)).isoformat(),
+        },
+        headers=searched_user,
+    )
+    assert "Goat milk" in names(search(searched_user, q="goat"))
+
+
+def test_search_validation(auth_user):
+    _, headers = auth_user
+    for params in ({"q": ""}, {"q": "milk", "mode": "regex"}, {"q": "a", "offset": -1}):
+        response = client.get("/product/search", params=params, headers=headers)
+        assert response.status_code == 422, params
+
+
+def test_trigrams_match_pg_trgm():
+    assert trigrams("Milk") == {"  m", " mi", "mil", "ilk", "lk "}
+    assert trigrams("a b") == {"  a", " a ", "  b", " b "}
+
+
+def test_ngram_index_similarity_matches_pg_trgm():
+    """
+    Test the fuzzy score is the pg_trgm similarity: shared trigrams over the
+    trigrams of both texts.
+    """
+    index = NgramIndex([(1, "word"), (2, "two words")])
+    [(key, score)] = index.search("wrd", "fuzzy", 10, threshold=0.2)
+
+    shared = trigrams("wrd") & trigrams("word")
+    assert key == 1
+    assert score == pytest.approx(len(shared) / len(trigrams("wrd") | trigrams("word")))
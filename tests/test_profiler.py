@@ -0,0 +1,109 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from core import profiler
+from core.db import Base, SessionLocal
+from core.profiler import capture_queries
+from main import app
+from middlewares.profiler import QueryProfilerMiddleware
+from models.product import Product
+from models.user import User
+from datetime import date, timedelta
+import pytest
+import uuid
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def db():
+    """
+    In-memory database with 6 users owning a product each.
+    """
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(6):
+        user = User(name=f"user{i}", email=f"user{i}@example.com", hashed_password="x")
+        user.products.append(
+            Product(name="Milk", date_expire=date.today() + timedelta(days=1), price=1)
+        )
+        session.add(user)
+    session.commit()
+    session.expunge_all()
+
+    yield session
+
+    session.close()
+    engine.dispose()
+
+
+def test_budget_flags_lazy_loads_as_n_plus_one(db, query_budget):
+    """
+    Test reading a relationship per row fails the budget as an N+1, while the
+    same data in one query passes.
+    """
+    with pytest.raises(AssertionError, match="N\\+1: ran 6 times"):
+        with query_budget(100):
+            [user.products for user in db.query(User).all()]
+
+    db.expunge_all()
+    with query_budget(1):
+        db.execute(select(User.name, Product.name).join(User.products)).all()
+
+
+def test_endpoints_stay_within_budget(query_budget):
+    email = f"budget_{uuid.uuid4().hex[:8]}@example.com"
+    client.post(
+        "/user", json={"name": "Budget", "email": email, "password": "senha123"}
+    )
+    token = client.post("/login", json={"email": email, "password": "senha123"})
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+    client.get("/alert", headers=headers)
+
+    with query_budget(2):
+        client.get("/product", params={"limit": 20}, headers=headers)
+    with query_budget(1):
+        client.get("/user", params={"limit": 20})
+    with query_budget(1):
+        client.get("/alert", headers=headers)  # the user comes from the caches
+
+
+def test_profiler_headers_and_n_plus_one_warning(caplog):
+    profiled = FastAPI()
+
+    @profiled.get("/loop")
+    def loop():
+        with SessionLocal() as session:
+            for i in range(5):
+                session.execute(select(User.id).where(User.id == i)).all()
+        return {}
+
+    profiled_client = TestClient(QueryProfilerMiddleware(profiled))
+    with caplog.at_level("WARNING", logger="core.profiler"):
+        response = profiled_client.get("/loop")
+
+    assert response.headers["x-db-queries"] == "5"
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert response.headers["x-db-n-plus-one"] == "1"
+    assert "N+1 on GET /loop: ran 5 times" in caplog.text
+
+
+def test_slow_queries_are_logged_with_params(monkeypatch, caplog):
+    monkeypatch.setattr(profiler.settings, "SQL_SLOW_QUERY_MS", 1e-6)
+
+    with caplog.at_level("WARNING", logger="core.profiler"):
+        with SessionLocal() as session:
+            session.execute(text("SELECT :marker"), {"marker": "slow-marker"})
+
+    assert "slow query" in caplog.text
+    assert "slow-marker" in caplog.text
+
+
+def test_capture_sees_other_threads():
+    with capture_queries() as log:
+        client.get("/user")
+
+    assert log.count >= 1
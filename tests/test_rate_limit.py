@@ -0,0 +1,217 @@
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from core import ratelimit
+from core.config import Settings
+from core.ratelimit import (
+    FakeSharedBucketStore,
+    RateLimit,
+    RateLimitExceeded,
+    RateLimiter,
+    ShardedBucketStore,
+)
+from core.security.hashing import hashing_stats
+from main import app
+from middlewares import ratelimit as ratelimit_middleware
+from middlewares.ratelimit import client_ip
+from api.v1.routes import user_route
+from services.user_service import AsyncUserService
+import asyncio
+import pytest
+import threading
+import uuid
+
+client = TestClient(app)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.mark.parametrize("store", [ShardedBucketStore, FakeSharedBucketStore])
+def test_bucket_allows_the_burst_then_refills(store, clock):
+    limiter = RateLimiter(store())
+    limit = RateLimit("test", rate=2, burst=3)
+
+    for _ in range(3):
+        limiter.check(limit, "1.2.3.4")
+    with pytest.raises(RateLimitExceeded) as exc:
+        limiter.check(limit, "1.2.3.4")
+    assert exc.value.retry_after == pytest.approx(0.5)
+
+    # another key has its own bucket
+    limiter.check(limit, "5.6.7.8")
+
+    clock.now += 0.5
+    limiter.check(limit, "1.2.3.4")
+    with pytest.raises(RateLimitExceeded):
+        limiter.check(limit, "1.2.3.4")
+    assert (limiter.allowed, limiter.rejected) == (5, 2)
+
+
+def test_sharded_store_is_bounded(clock):
+    store = ShardedBucketStore(shards=4, max_keys=100)
+    for i in range(1000):
+        store.take(f"key{i}", rate=1, burst=1)
+
+    assert len(store) <= 100
+    assert store.evictions >= 900
+
+
+def login(email: str, password: str = "wrong-password", ip: str = None):
+    headers = {"X-Forwarded-For": ip} if ip else {}
+    return client.post(
+        "/login", json={"email": email, "password": password}, headers=headers
+    )
+
+
+@pytest.fixture
+def spied_lookups(monkeypatch):
+    """
+    Count the user lookups of the login
+    """
+    calls = []
+    lookup = AsyncUserService.get_user_by_email
+
+    async def spy(self, email):
+        calls.append(email)
+        return await lookup(self, email)
+
+    monkeypatch.setattr(AsyncUserService, "get_user_by_email", spy)
+    return calls
+
+
+def test_login_is_throttled_per_email_before_any_work(spied_lookups):
+    email = f"stuffing_{uuid.uuid4().hex[:8]}@example.com"
+    burst = ratelimit.LOGIN_EMAIL_LIMIT.burst
+
+    for _ in range(burst):
+        assert login(email).status_code == 400
+    lookups, hashes = len(spied_lookups), hashing_stats()["calls"]
+
+    response = login(email)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # rejected before the user lookup and before bcrypt
+    assert len(spied_lookups) == lookups
+    assert hashing_stats()["calls"] == hashes
+
+    # the limit is per email
+    assert login(f"other_{uuid.uuid4().hex[:8]}@example.com").status_code == 400
+
+
+def test_login_is_throttled_per_ip(monkeypatch):
+    monkeypatch.setattr(
+        ratelimit_middleware.settings, "RATE_LIMIT_TRUST_FORWARDED", True
+    )
+    monkeypatch.setattr(
+        user_route, "LOGIN_IP_LIMIT", RateLimit("login_ip_test", rate=0.01, burst=3)
+    )
+
+    for _ in range(3):
+        response = login(f"{uuid.uuid4().hex[:8]}@example.com", ip="10.0.0.1")
+        assert response.status_code == 400
+    response = login(f"{uuid.uuid4().hex[:8]}@example.com", ip="10.0.0.1")
+    assert response.status_code == 429
+
+    response = login(f"{uuid.uuid4().hex[:8]}@example.com", ip="10.0.0.2")
+    assert response.status_code == 400
+
+
+def test_forwarded_ip_is_the_one_the_proxies_appended(monkeypatch):
+    monkeypatch.setattr(
+        ratelimit_middleware.settings, "RATE_LIMIT_TRUST_FORWARDED", True
+    )
+
+    def scope(*values):
+        return {
+            "client": ("10.0.0.9", 443),
+            "headers": [(b"x-forwarded-for", value.encode()) for value in values],
+        }
+
+    # the client sends its own X-Forwarded-For, the proxy appends the real IP
+    assert client_ip(scope("1.2.3.4, 203.0.113.7")) == "203.0.113.7"
+    assert client_ip(scope("1.2.3.4", "203.0.113.7")) == "203.0.113.7"
+    assert client_ip(scope()) == "10.0.0.9"
+
+    monkeypatch.setattr(ratelimit_middleware.settings, "RATE_LIMIT_TRUSTED_PROXIES", 2)
+    assert client_ip(scope("1.2.3.4, 203.0.113.7, 10.0.0.2")) == "203.0.113.7"
+    assert client_ip(scope("203.0.113.7")) == "203.0.113.7"
+    with pytest.raises(ValidationError):
+        Settings(RATE_LIMIT_TRUSTED_PROXIES=0)
+
+
+def test_unknown_email_costs_a_password_check():
+    """
+    Test an unknown email runs bcrypt like a wrong password, so the response
+    time doesn't reveal which emails have an account.
+    """
+    hashes = hashing_stats()["calls"]
+    response = login(f"nobody_{uuid.uuid4().hex[:8]}@example.com")
+
+    assert response.status_code == 400
+    assert hashing_stats()["calls"] == hashes + 1
+
+
+def test_requests_are_throttled_per_ip_before_the_app(monkeypatch):
+    monkeypatch.setattr(
+        ratelimit_middleware, "IP_LIMIT", RateLimit("ip_test", rate=0.01, burst=2)
+    )
+    headers = {"Authorization": "Bearer not-a-token"}
+
+    assert client.get("/product", headers=headers).status_code == 401
+    assert client.get("/product", headers=headers).status_code == 401
+    response = client.get("/product", headers=headers)
+
+    # rejected before the token verification
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Too many requests, try again in 100s"}
+    assert response.headers["Retry-After"] == "100"
+
+
+class RecordingStore(FakeSharedBucketStore):
+    """
+    A shared store doing "network IO", recording the threads calling it
+    """
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        self.threads.add(threading.get_ident())
+        return super().take(key, rate, burst, cost)
+
+
+def test_blocking_store_is_called_off_the_event_loop():
+    store = RecordingStore()
+    limiter = RateLimiter(store)
+
+    async def check():
+        await limiter.check_async(RateLimit("test", rate=1, burst=5), "1.2.3.4")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(check())
+    assert store.threads and loop_thread not in store.threads
+    assert limiter.allowed == 1
+
+
+def test_rates_must_be_positive():
+    with pytest.raises(ValueError):
+        RateLimit("test", rate=0, burst=5)
+    with pytest.raises(ValidationError):
+        Settings(RATE_LIMIT_IP_PER_SECOND=0)
+    with pytest.raises(ValidationError):
+        Settings(LOGIN_LIMIT_EMAIL_PER_MINUTE=-1)
@@ -0,0 +1,141 @@
+from fastapi.testclient import TestClient
+from core.db import SessionLocal, engine
+from main import app
+from models.product import Product
+from models.summary import UserProductSummary
+from services.summary_service import SummaryService
+from utils.sql import UPDATE_OLD_VALUES_DIALECTS
+from datetime import date, timedelta
+import pytest
+import uuid
+
+client = TestClient(app)
+
+
+def future_date(days: int) -> str:
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+def table_statements(log, table: str) -> list[str]:
+    """
+    the statements of the log reading or writing `table`
+    """
+    return [
+        statement
+        for statement in log.statements.elements()
+        if f" {table} " in f" {' '.join(statement.split())} "
+    ]
+
+
+@pytest.fixture
+def product(auth_user):
+    """
+    A product of a new user, returning the product, the user id and headers
+    """
+    user_id, headers = auth_user
+    data = {"name": "Milk", "price": 4.5, "date_expire": future_date(3)}
+    response = client.post("/product", json=data, headers=headers)
+    assert response.status_code == 200
+    client.get(f"/product/{response.json()['id']}", headers=headers)  # cached
+    return response.json(), user_id, headers
+
+
+def test_update_is_one_statement(product, query_budget):
+    product, user_id, headers = product
+    data = {"name": "Oat milk", "price": 4.5, "date_expire": product["date_expire"]}
+
+    with query_budget(10) as log:
+        response = client.put(
+            f"/product/update/{product['id']}", json=data, headers=headers
+        )
+    assert response.status_code == 200
+    assert response.json() == {**product, "name": "Oat milk"}
+
+    # the price and the date are set again, their old values are read for the
+    # aggregates: in the UPDATE itself where the dialect returns them
+    statements = table_statements(log, "products")
+    assert statements[-1].startswith("UPDATE products")
+    assert "RETURNING" in statements[-1]
+    expected = 1 if engine.dialect.name in UPDATE_OLD_VALUES_DIALECTS else 2
+    assert len(statements) == expected
+
+    # the cached product and summary follow
+    response = client.get(f"/product/{product['id']}", headers=headers)
+    assert response.json()["name"] == "Oat milk"
+    with SessionLocal() as db:
+        assert SummaryService(db).check(user_id) == []
+
+
+def test_update_changes_the_aggregates(product):
+    product, user_id, headers = product
+    data = {"name": "Milk", "price": 10, "date_expire": future_date(20)}
+
+    response = client.put(
+        f"/product/update/{product['id']}", json=data, headers=headers
+    )
+    assert response.json()["price"] == 10
+
+    summary = client.get(f"/user/{user_id}/summary", headers=headers).json()
+    assert (summary["total_price"], summary["expiring_count"]) == (10, 0)
+    assert [
+        item["price"]
+        for item in client.get("/product", headers=headers).json()["items"]
+    ] == [10]
+    with SessionLocal() as db:
+        assert SummaryService(db).check(user_id) == []
+
+
+def test_delete_is_one_statement(product, query_budget):
+    product, user_id, headers = product
+
+    with query_budget(10) as log:
+        response = client.delete(f"/product/{product['id']}", headers=headers)
+    assert response.status_code == 200
+
+    [statement] = table_statements(log, "products")
+    assert statement.startswith("DELETE FROM products") and "RETURNING" in statement
+
+    assert client.get(f"/product/{product['id']}", headers=headers).status_code == 404
+    with SessionLocal() as db:
+        assert db.get(UserProductSummary, user_id).product_count == 0
+        assert SummaryService(db).check(user_id) == []
+
+
+def test_missing_or_foreign_products_are_not_found(product, new_user):
+    product, _, headers = product
+    _, other_headers = new_user()
+    data = {"name": "Stolen", "price": 1, "date_expire": future_date(3)}
+
+    for product_id, request_headers in (
+        (product["id"], other_headers),
+        (10**9, headers),
+    ):
+        url = f"/product/update/{product_id}"
+        assert client.put(url, json=data, headers=request_headers).status_code == 404
+        url = f"/product/{product_id}"
+        assert client.delete(url, headers=request_headers).status_code == 404
+
+    assert client.get(f"/product/{product['id']}", headers=headers).json() == product
+
+
+def test_user_update_and_delete(product, query_budget):
+    product, user_id, _ = product
+    email = f"renamed_{uuid.uuid4().hex[:8]}@example.com"
+    data = {"name": "Renamed", "email": email, "password": ""}
+
+    with query_budget(2) as log:
+        response = client.put(f"/user/update/{user_id}", json=data)
+    assert response.status_code == 200
+    assert (response.json()["name"], response.json()["email"]) == ("Renamed", email)
+    assert table_statements(log, "users")[-1].startswith("UPDATE users")
+
+    with query_budget(4) as log:
+        response = client.delete(f"/user/{user_id}")
+    assert response.status_code == 200
+    assert [s.split()[0] for s in log.statements.elements()] == ["DELETE"] * 4
+
+    with SessionLocal() as db:
+        assert db.get(Product, product["id"]) is None
+        assert db.get(UserProductSummary, user_id) is None
+    assert client.put(f"/user/update/{user_id}", json=data).status_code == 404
+    assert client.delete(f"/user/{user_id}").status_code == 404
@@ -0,0 +1,127 @@
+from fastapi.testclient import TestClient
+from core.db import SessionLocal
+from main import app
+from models.summary import UserProductSummary
+from services.summary_service import SummaryService
+from tasks import summary
+from datetime import date, timedelta
+import pytest
+
+client = TestClient(app)
+
+
+def future_date(days: int) -> str:
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def summary_user(auth_user):
+    """
+    A user with three products, returning the user id, the headers and the
+    product ids
+    """
+    user_id, headers = auth_user
+    ids = []
+    for name, price, days in (("Milk", 4.5, 1), ("Bread", 3.25, 3), ("Rice", 10, 30)):
+        response = client.post(
+            "/product",
+            json={"name": name, "price": price, "date_expire": future_date(days)},
+            headers=headers,
+        )
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return user_id, headers, ids
+
+
+def get_summary(user_id, headers, **params) -> dict:
+    response = client.get(f"/user/{user_id}/summary", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def check(user_id) -> list:
+    with SessionLocal() as db:
+        return SummaryService(db).check(user_id)
+
+
+def test_summary_of_the_created_products(summary_user):
+    user_id, headers, _ = summary_user
+
+    assert get_summary(user_id, headers, days=7) == {
+        "user_id": user_id,
+        "product_count": 3,
+        "total_price": 17.75,
+        "soonest_expiry": future_date(1),
+        "horizon_days": 7,
+        "expiring_count": 2,
+        "expiring_value": 7.75,
+    }
+    assert check(user_id) == []
+
+
+def test_summary_follows_updates_and_deletes(summary_user):
+    user_id, headers, (milk, bread, _) = summary_user
+
+    response = client.put(
+        f"/product/update/{milk}",
+        json={"name": "Milk", "price": 6, "date_expire": future_date(60)},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    response = client.delete(f"/product/{bread}", headers=headers)
+    assert response.status_code == 200, response.text
+
+    result = get_summary(user_id, headers, days=7)
+    assert result["product_count"] == 2
+    assert result["total_price"] == 16
+    assert result["soonest_expiry"] == future_date(30)
+    assert result["expiring_count"] == 0
+    assert result["expiring_value"] == 0
+    assert check(user_id) == []
+
+
+def test_summary_follows_the_bulk_import(auth_user):
+    user_id, headers = auth_user
+    rows = [
+        {"name": "Milk", "fk_user": user_id, "date_expire": future_date(2), "price": 5},
+        {"name": "Rice", "fk_user": user_id, "date_expire": future_date(2), "price": 8},
+    ]
+    response = client.post("/product/bulk", json=rows, headers=headers)
+    assert response.status_code == 200, response.text
+
+    result = get_summary(user_id, headers)
+    assert (result["product_count"], result["expiring_value"]) == (2, 13)
+    assert check(user_id) == []
+
+
+def test_summary_of_another_user_is_forbidden(summary_user, new_user):
+    user_id, _, _ = summary_user
+    _, other_headers = new_user()
+
+    response = client.get(f"/user/{user_id}/summary", headers=other_headers)
+    assert response.status_code == 403
+
+
+def test_check_finds_drift_and_rebuild_fixes_it(summary_user):
+    user_id, headers, _ = summary_user
+    with SessionLocal() as db:
+        db.get(UserProductSummary, user_id).product_count = 99
+        db.commit()
+
+    [mismatch] = check(user_id)
+    assert mismatch["table"] == "user_product_summaries"
+    assert mismatch["expected"][0] == 3 and mismatch["stored"][0] == 99
+    assert summary.main(["check", "--user", str(user_id)]) == 1
+
+    assert summary.main(["rebuild", "--user", str(user_id)]) == 0
+    assert summary.main(["check", "--user", str(user_id)]) == 0
+    assert get_summary(user_id, headers)["product_count"] == 3
+
+
+def test_deleted_user_has_no_summary(summary_user):
+    user_id, _, _ = summary_user
+
+    response = client.delete(f"/user/{user_id}")
+    assert response.status_code == 200, response.text
+    with SessionLocal() as db:
+        assert db.get(UserProductSummary, user_id) is None
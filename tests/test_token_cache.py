@@ -0,0 +1,147 @@
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from api.v1.dependencies import get_current_user
+from core.security import token_cache as token_cache_module
+from core.security.jwt import create_access_token
+from core.security.token_cache import TokenCache, token_cache
+from middlewares.middleware import AuthStateMiddleware, bearer_token
+from main import app
+from models.user import User
+import uuid
+
+client = TestClient(app)
+
+auth_app = FastAPI()
+auth_app.add_middleware(AuthStateMiddleware)
+
+
+@auth_app.get("/me")
+async def me(user: User = Depends(get_current_user)):
+    return {"id": user.id, "email": user.email}
+
+
+@auth_app.post("/echo")
+async def echo(request: Request):
+    body = await request.body()
+
+    async def chunks():
+        yield body
+        yield str(request.state.user is not None).encode()
+
+    return StreamingResponse(chunks(), media_type="application/octet-stream")
+
+
+auth_client = TestClient(auth_app)
+
+
+def test_cache_hits_and_expires_at_exp(monkeypatch):
+    """
+    Test a token is decoded once, then served from the cache until its `exp`.
+    """
+    cache = TokenCache(max_entries=10)
+    token = create_access_token({"sub": "cache@example.com"})
+
+    first = cache.verify(token)
+    second = cache.verify(token)
+    assert first is second
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    monkeypatch.setattr(token_cache_module.time, "time", lambda: first.expires_at)
+    monkeypatch.setattr(token_cache_module, "decode_access_token", lambda _: None)
+    assert cache.verify(token) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_cache_is_bounded():
+    """
+    Test the least recently used token is evicted past max_entries.
+    """
+    cache = TokenCache(max_entries=2)
+    tokens = [create_access_token({"sub": f"user{i}@example.com"}) for i in range(3)]
+
+    for token in tokens:
+        cache.verify(token)
+
+    assert cache.stats()["size"] == 2
+    cache.verify(tokens[0])
+    assert cache.stats()["misses"] == 4
+
+
+def test_current_user_is_resolved_once():
+    """
+    Test the dependency reuses the middleware entry and the cached user,
+    and forgets the user once it's updated.
+    """
+    email = f"cache_{uuid.uuid4().hex[:8]}@example.com"
+    response = client.post(
+        "/user", json={"name": "Cache", "email": email, "password": "senha123"}
+    )
+    user_id = response.json()["id"]
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+    before = token_cache.stats()
+    assert auth_client.get("/me", headers=headers).json() == {
+        "id": user_id,
+        "email": email,
+    }
+    assert auth_client.get("/me", headers=headers).status_code == 200
+    after = token_cache.stats()
+
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+    new_email = f"cache_{uuid.uuid4().hex[:8]}@example.com"
+    client.put(
+        f"/user/update/{user_id}",
+        json={"name": "Cache", "email": new_email, "password": "senha1234"},
+    )
+    assert auth_client.get("/me", headers=headers).status_code == 401
+
+
+def test_resolved_user_expires_after_the_ttl(monkeypatch):
+    """
+    Test the user of a token is only kept `user_ttl` seconds, so a user
+    changed by another process is resolved again.
+    """
+    now = [100.0]
+    monkeypatch.setattr(token_cache_module.time, "monotonic", lambda: now[0])
+    cache = TokenCache(max_entries=10, user_ttl=30)
+    entry = cache.verify(create_access_token({"sub": "ttl@example.com"}))
+
+    cache.remember_user(entry, User(id=1, name="Ttl", email="ttl@example.com"))
+    assert cache.cached_user(entry).email == "ttl@example.com"
+
+    now[0] += 30
+    assert cache.cached_user(entry) is None
+
+
+def test_bearer_token_is_parsed_from_the_raw_headers():
+    """
+    Test only a well formed `Bearer <token>` Authorization header gives a token.
+    """
+    assert bearer_token([(b"authorization", b"Bearer abc.def")]) == "abc.def"
+    assert bearer_token([(b"authorization", b"bearer  abc.def ")]) == "abc.def"
+    assert bearer_token([(b"authorization", b"Basic dXNlcjpwdw==")]) is None
+    assert bearer_token([(b"authorization", b"Bearer")]) is None
+    assert bearer_token([(b"authorization", b"abc.def")]) is None
+    assert bearer_token([(b"accept", b"*/*")]) is None
+
+
+def test_middleware_passes_body_and_stream_through():
+    """
+    Test the request body and a streamed response go through the middleware
+    untouched, with or without a valid token.
+    """
+    token = create_access_token({"sub": "stream@example.com"})
+    payload = b"x" * 100_000
+
+    response = auth_client.post(
+        "/echo", content=payload, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.content == payload + b"True"
+
+    response = auth_client.post(
+        "/echo", content=payload, headers={"Authorization": "Bearer"}
+    )
+    assert response.content == payload + b"False"
@@ -0,0 +1,181 @@
+from decimal import Decimal
+from typing import Any, AsyncIterator, Optional
+import codecs
+import csv
+import io
+import json
+
+# content types accepted by the bulk endpoints
+JSON_TYPES = ("application/json",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+class UnsupportedImportFormat(ValueError):
+    """
+    Raised when the upload content type isn't JSON, NDJSON or CSV
+    """
+
+
+class InvalidImportBody(ValueError):
+    """
+    Raised when the upload can't be read at all, bad rows are reported per row
+    """
+
+
+class RowError:
+    """
+    A row that couldn't be parsed, reported back instead of aborting the import
+    """
+
+    __slots__ = ("message",)
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+def media_type(content_type: Optional[str]) -> str:
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    iter_lines
+
+    Split a byte stream into text lines as it arrives, the body is never held
+    in memory as a whole.
+
+    parameters:
+    - chunks (AsyncIterator[bytes]): the request body stream
+
+    return:
+    - the lines without the line break, blank lines included
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(
+    chunks: AsyncIterator[bytes], content_type: Optional[str]
+) -> AsyncIterator[tuple[int, Any]]:
+    """
+    iter_records
+
+    Read the records of a bulk upload. JSON arrays are parsed at once, NDJSON
+    and CSV are parsed line by line while the body streams in, one record per
+    line.
+
+    parameters:
+    - chunks (AsyncIterator[bytes]): the request body stream
+    - content_type (str): the Content-Type header
+
+    return:
+    - (row, record) pairs, row counting from 1 without the CSV header, the
+      record being a RowError when the row can't be parsed
+
+    raises:
+    - UnsupportedImportFormat: if the content type isn't supported
+    - InvalidImportBody: if a JSON body isn't an array
+    """
+    kind = media_type(content_type)
+
+    if kind in JSON_TYPES:
+        body = b"".join([chunk async for chunk in chunks])
+        try:
+            records = json.loads(body)
+        except ValueError as exc:
+            raise InvalidImportBody("Invalid JSON body") from exc
+        if not isinstance(records, list):
+            raise InvalidImportBody("The JSON body must be an array")
+        for row, record in enumerate(records, start=1):
+            yield row, record
+
+    elif kind in NDJSON_TYPES:
+        row = 0
+        async for line in iter_lines(chunks):
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                yield row, json.loads(line)
+            except ValueError:
+                yield row, RowError("Invalid JSON line")
+
+    elif kind in CSV_TYPES:
+        header = None
+        row = 0
+        async for line in iter_lines(chunks):
+            if not line.strip():
+                continue
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            if len(values) != len(header):
+                yield row, RowError(f"Expected {len(header)} columns")
+            else:
+                yield row, dict(zip(header, values))
+
+    else:
+        raise UnsupportedImportFormat(
+            "Use application/json, application/x-ndjson or text/csv"
+        )
+
+
+# formats written by the exports
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_value(value: Any) -> Any:
+    """
+    the JSON value of the column types json doesn't know: dates as ISO strings,
+    decimals as floats
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} can't be exported")
+
+
+json_encoder = json.JSONEncoder(separators=(",", ":"), default=export_value)
+
+
+def format_rows(rows: list, columns: list[str], kind: str, header: bool) -> str:
+    """
+    format_rows
+
+    Write a batch of exported rows.
+
+    parameters:
+    - rows (list): the rows, values in `columns` order
+    - columns (list[str]): the column names
+    - kind (str): "ndjson" or "csv"
+    - header (bool): write the CSV header before the rows
+
+    return:
+    - the text of the batch, every line ending with a line break
+    """
+    if kind == "ndjson":
+        lines = map(json_encoder.encode, (dict(zip(columns, row)) for row in rows))
+        return "".join(line + "\n" for line in lines)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue()
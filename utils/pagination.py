@@ -0,0 +1,208 @@
+from typing import Any, Optional, Sequence
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import and_, or_
+import base64
+import json
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor can't be decoded or belongs to another sort order
+    """
+
+
+def cursor_value(value: Any) -> Any:
+    """
+    The JSON value of a sort key value: dates as ISO strings and decimals as
+    strings, so a price is read back without a float rounding
+    """
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any], order_by: str, direction: str) -> str:
+    """
+    encode_cursor
+
+    Build the opaque cursor pointing at a row of a page.
+
+    parameters:
+    - values (Sequence): the sort key values of the row, primary key last
+    - order_by (str): the sort order the cursor belongs to
+    - direction (str): "next" to read after the row, "prev" to read before it
+
+    return:
+    - urlsafe base64 string
+    """
+    payload = {
+        "o": order_by,
+        "d": direction,
+        "v": [cursor_value(value) for value in values],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, columns: Sequence[Any], order_by: str
+) -> tuple[list, str]:
+    """
+    decode_cursor
+
+    Read a cursor built by encode_cursor.
+
+    parameters:
+    - cursor (str): the opaque cursor
+    - columns (Sequence): the sort key columns, used to parse the values back
+    - order_by (str): the sort order requested
+
+    return:
+    - (values, direction)
+
+    raises:
+    - InvalidCursor: if the cursor is malformed or from another sort order
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values, direction = payload["v"], payload["d"]
+    except (ValueError, KeyError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+    if payload.get("o") != order_by or direction not in ("next", "prev"):
+        raise InvalidCursor("Cursor doesn't match the requested order")
+    if len(values) != len(columns):
+        raise InvalidCursor("Invalid cursor")
+
+    parsed = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        if value is not None and hasattr(python_type, "fromisoformat"):
+            try:
+                value = python_type.fromisoformat(value)
+            except (TypeError, ValueError) as exc:
+                raise InvalidCursor("Invalid cursor") from exc
+        elif value is not None and python_type is Decimal:
+            try:
+                value = Decimal(value)
+            except (TypeError, ValueError, InvalidOperation) as exc:
+                raise InvalidCursor("Invalid cursor") from exc
+        parsed.append(value)
+
+    return parsed, direction
+
+
+def after(columns: Sequence[Any], values: Sequence[Any]):
+    """
+    Rows strictly after `values` in columns ASC order, written as
+    `a >= x AND (a > x OR ...)` so the leading column is an index range.
+    """
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column > value
+    return and_(column >= value, or_(column > value, after(columns[1:], values[1:])))
+
+
+def before(columns: Sequence[Any], values: Sequence[Any]):
+    """
+    Rows strictly before `values` in columns ASC order, see `after`
+    """
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column < value
+    return and_(column <= value, or_(column < value, before(columns[1:], values[1:])))
+
+
+def segments(columns: Sequence[Any], values: Optional[list], forward: bool) -> list:
+    """
+    segments
+
+    The filters to read, in reading order. Rows are sorted with NULLS LAST on a
+    nullable leading column; instead of an `OR column IS NULL` that disables the
+    index range, the non-null rows and the null rows are read as two segments.
+    Only the leading column may be nullable.
+
+    parameters:
+    - columns (Sequence): the sort key columns
+    - values (list): the cursor values, None for the first page
+    - forward (bool): reading after (True) or before (False) the cursor
+
+    return:
+    - list of filters, None meaning no filter
+    """
+    lead, rest = columns[0], columns[1:]
+
+    if not lead.nullable:
+        if values is None:
+            return [None]
+        return [after(columns, values) if forward else before(columns, values)]
+
+    if values is None:
+        return [lead.is_not(None), lead.is_(None)]
+
+    if forward:
+        if values[0] is None:
+            return [and_(lead.is_(None), after(rest, values[1:]))]
+        return [after(columns, values), lead.is_(None)]
+
+    if values[0] is None:
+        return [and_(lead.is_(None), before(rest, values[1:])), lead.is_not(None)]
+    return [before(columns, values)]
+
+
+def paginate(
+    query,
+    columns: Sequence[Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+) -> tuple[list, Optional[str], Optional[str]]:
+    """
+    paginate
+
+    Keyset pagination: the page is found through the sort key index, so the
+    cost doesn't grow with the page number like OFFSET does.
+
+    parameters:
+    - query (Query): the query to paginate, without ORDER BY/LIMIT
+    - columns (Sequence): the sort key columns, a unique column last
+    - limit (int): the page size
+    - cursor (str): the cursor received from a previous page
+    - order_by (str): the name of the sort order, kept inside the cursors
+
+    return:
+    - (rows, next_cursor, prev_cursor)
+    """
+    values, forward = None, True
+    if cursor:
+        values, direction = decode_cursor(cursor, columns, order_by)
+        forward = direction == "next"
+
+    order = [column.asc() if forward else column.desc() for column in columns]
+
+    rows = []
+    for segment in segments(columns, values, forward):
+        segment_query = query if segment is None else query.filter(segment)
+        rows += segment_query.order_by(*order).limit(limit + 1 - len(rows)).all()
+        if len(rows) > limit:
+            break
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+
+    def key(row):
+        return [getattr(row, column.key) for column in columns]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or not forward:
+            next_cursor = encode_cursor(key(rows[-1]), order_by, "next")
+        if cursor and (forward or has_more):
+            prev_cursor = encode_cursor(key(rows[0]), order_by, "prev")
+
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,62 @@
+from typing import Any, Iterable, Optional
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy.engine import Row
+
+
+def dump_list(adapter: TypeAdapter, rows: Iterable[Any]) -> list[dict]:
+    """
+    dump_list
+
+    Validate a list of rows into their response schema in one call and dump them
+    as dicts. ORM entities are read through their attributes (from_attributes);
+    column rows are zipped with their field names first, which pydantic
+    validates several times faster than Row attributes. The date and datetime
+    values are kept as is, orjson writes them itself.
+
+    parameters:
+    - adapter (TypeAdapter): the adapter of `list[<Response schema>]`
+    - rows (Iterable): the column rows, the ORM entities or any objects with the
+      schema attributes
+
+    return:
+    - list of dicts
+    """
+    rows = list(rows)
+    if rows and isinstance(rows[0], Row):
+        fields = rows[0]._fields
+        values = adapter.validate_python([dict(zip(fields, row)) for row in rows])
+    else:
+        values = adapter.validate_python(rows, from_attributes=True)
+    return adapter.dump_python(values)
+
+
+def page_response(
+    adapter: TypeAdapter,
+    rows: Iterable[Any],
+    next_cursor: Optional[str] = None,
+    prev_cursor: Optional[str] = None,
+) -> ORJSONResponse:
+    """
+    page_response
+
+    The response of a page of rows. It's returned as a Response, so FastAPI
+    doesn't validate and encode the page again through the route response_model
+    (which is kept for the docs).
+
+    parameters:
+    - adapter (TypeAdapter): the adapter of `list[<Response schema>]`
+    - rows (Iterable): the rows of the page
+    - next_cursor (str): the cursor of the next page
+    - prev_cursor (str): the cursor of the previous page
+
+    return:
+    - ORJSONResponse with `items`, `next_cursor` and `prev_cursor`
+    """
+    return ORJSONResponse(
+        {
+            "items": dump_list(adapter, rows),
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+        }
+    )
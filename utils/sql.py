@@ -0,0 +1,208 @@
+from typing import Optional, Tuple
+from sqlalchemy import and_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+# the dialects returning the old values of an UPDATE from the statement itself
+# (UPDATE ... FROM a locked copy of the row), SQLite can't return FROM columns
+UPDATE_OLD_VALUES_DIALECTS = ("postgresql",)
+
+
+def dialect_insert(db, table):
+    """
+    dialect_insert
+
+    INSERT construct of the session dialect, so ON CONFLICT / RETURNING are
+    available on both PostgreSQL and SQLite.
+
+    parameters:
+    - db (Session): the session, used to find the dialect
+    - table: the model or table to insert into
+
+    return:
+    - the dialect Insert
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
+
+
+def update_returning(
+    db, model, conditions: list, values: dict, columns: tuple, old_columns: tuple = ()
+) -> Optional[Tuple[Row, dict]]:
+    """
+    update_returning
+
+    UPDATE ... RETURNING of one row: the update and the read of the new values
+    in one statement, without loading the entity first. The writes needing the
+    values replaced (aggregates, cache keys) ask for `old_columns`:
+    PostgreSQL returns them from the same statement, updating FROM a copy of
+    the row locked FOR UPDATE; the other dialects read them first, in the same
+    transaction.
+
+    parameters:
+    - db (Session): the session, the caller commits
+    - model: the mapped class
+    - conditions (list): the filters matching the row, its primary key first
+    - values (dict): the columns to set
+    - columns (tuple): the columns returned
+    - old_columns (tuple): the columns whose old values are returned
+
+    return:
+    - (the new row, dict of the old values), None when no row matched
+    """
+    primary_key = model.__mapper__.primary_key[0]
+    statement = update(model).values(**values)
+
+    if not old_columns:
+        row = db.execute(statement.where(*conditions).returning(*columns)).first()
+        return (row, {}) if row is not None else None
+
+    if db.get_bind().dialect.name in UPDATE_OLD_VALUES_DIALECTS:
+        old = (
+            select(primary_key, *old_columns)
+            .where(*conditions)
+            .with_for_update()
+            .subquery("old")
+        )
+        row = db.execute(
+            statement.where(primary_key == old.c[primary_key.key]).returning(
+                *columns,
+                *(
+                    old.c[column.key].label(f"old_{column.key}")
+                    for column in old_columns
+                ),
+            )
+        ).first()
+        if row is None:
+            return None
+        return row, {
+            column.key: row._mapping[f"old_{column.key}"] for column in old_columns
+        }
+
+    old_row = db.execute(select(*old_columns).where(*conditions)).first()
+    if old_row is None:
+        return None
+    row = db.execute(statement.where(*conditions).returning(*columns)).one()
+    return row, dict(old_row._mapping)
+
+
+# plan steps that read through an index, per dialect
+INDEX_PLAN_MARKERS = {
+    "sqlite": ("USING INDEX", "USING COVERING INDEX", "USING INTEGER PRIMARY KEY"),
+    "postgresql": ("Index Scan", "Index Only Scan", "Bitmap Index Scan"),
+}
+
+
+def query_plan(db, statement) -> list[str]:
+    """
+    query_plan
+
+    Ask the database how it runs a statement, used to check the hot queries
+    are served by an index.
+
+    parameters:
+    - db (Session | Connection): where the statement would run
+    - statement: a select, ORM queries are given through `.statement`
+
+    return:
+    - list of plan lines, "EXPLAIN QUERY PLAN" details on SQLite and
+      "EXPLAIN" lines on PostgreSQL
+    """
+    bind = db.get_bind() if hasattr(db, "get_bind") else db
+    dialect = bind.dialect
+    compiled = statement.compile(
+        dialect=dialect, compile_kwargs={"literal_binds": True}
+    )
+
+    if dialect.name == "sqlite":
+        rows = db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+        return [row[-1] for row in rows]
+    if dialect.name == "postgresql":
+        return list(db.execute(text(f"EXPLAIN {compiled}")).scalars())
+    raise NotImplementedError(f"Query plans are not supported on {dialect.name}")
+
+
+def uses_index(plan: list[str], index_name: str) -> bool:
+    """
+    True when a step of the plan reads through `index_name`
+    """
+    markers = [marker for dialect in INDEX_PLAN_MARKERS.values() for marker in dialect]
+    return any(
+        index_name in line and any(marker in line for marker in markers)
+        for line in plan
+    )
+
+
+def sequential_scans(plan: list[str]) -> list[str]:
+    """
+    The steps of the plan reading a whole table (or a whole index on SQLite)
+    instead of an index range
+    """
+    return [line for line in plan if "Seq Scan" in line or line.startswith("SCAN ")]
+
+
+# the highest code point, and the UTF-16 surrogates no text can hold
+MAX_CHAR = "\U0010ffff"
+SURROGATES = range(0xD800, 0xE000)
+
+
+class byte_order(ColumnElement):
+    """
+    A text expression compared in code point order, whatever the collation of
+    the database: COLLATE "C" on PostgreSQL, whose usual collations (en_US,
+    ICU) sort case, punctuation and accents their own way. SQLite compares
+    text in byte order already.
+    """
+
+    inherit_cache = True
+    _traverse_internals = [("operand", InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, operand):
+        self.operand = operand
+        self.type = operand.type
+
+
+@compiles(byte_order)
+def compile_byte_order(element, compiler, **kw):
+    return compiler.process(element.operand, **kw)
+
+
+@compiles(byte_order, "postgresql")
+def compile_byte_order_postgresql(element, compiler, **kw):
+    return f'{compiler.process(element.operand, **kw)} COLLATE "C"'
+
+
+def prefix_range(column, prefix: str):
+    """
+    prefix_range
+
+    `column` starting with `prefix`, written as a range so an index on the
+    column serves it (LIKE 'prefix%' needs a special collation or operator
+    class for that). The bounds are compared in code point order (byte_order),
+    the order the index on PostgreSQL must use too.
+
+    parameters:
+    - column: the column or expression, e.g. func.lower(Product.name)
+    - prefix (str): the prefix, not empty
+
+    return:
+    - the filter
+    """
+    column = byte_order(column)
+    # every text starting with "ab" + MAX_CHAR is below "ac" too
+    stem = prefix.rstrip(MAX_CHAR)
+    if not stem:
+        return column >= prefix
+
+    following = ord(stem[-1]) + 1
+    if following in SURROGATES:
+        following = SURROGATES.stop
+    upper = stem[:-1] + chr(following)
+    return and_(column >= prefix, column < upper)